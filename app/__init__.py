@@ -4,24 +4,35 @@ from flask_migrate import Migrate
 from flask_login import LoginManager
 from config import Config
 from flask_mail import Mail
+from app.tareas import ColaTareas
+from app.cache import CacheDatos
+from app import conexiones
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': conexiones.SesionRuteada})
 migrate = Migrate()
 login_manager = LoginManager()
 login_manager.login_view = 'auth.login'
 login_manager.login_message = 'Por favor, inicie sesión para acceder a esta página.'
 login_manager.login_message_category = 'info'
 mail = Mail()
+cola = ColaTareas()
+cache = CacheDatos()
 
 def create_app(config_class=Config):
     """Crea y configura una instancia de la aplicación Flask."""
     app = Flask(__name__)
     app.config.from_object(config_class)
 
+    conexiones.init_app(app) # opciones del pool, antes de crear el engine
     db.init_app(app)
+    with app.app_context():
+        for engine in db.engines.values():
+            conexiones.preparar_engine(engine, app.config)
     migrate.init_app(app, db)
     login_manager.init_app(app)
     mail.init_app(app) 
+    cola.init_app(app)
+    cache.init_app(app)
 
     # Registrar Blueprints (módulos de la aplicación)
     from app.auth import bp as auth_bp
@@ -30,4 +41,14 @@ def create_app(config_class=Config):
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
+    from app.comandos import bp as comandos_bp
+    app.register_blueprint(comandos_bp)
+
+    from app import reservas
+    reservas.init_app(app)
+
+    if app.config.get('INSTRUMENTACION'):
+        from app import instrumentacion
+        instrumentacion.init_app(app)
+
     return app
\ No newline at end of file
@@ -0,0 +1,180 @@
+"""Sugerencias por prefijo para el RUT del cliente y la patente en la nota de venta.
+
+Cada proceso guarda en memoria dos listas ordenadas:
+
+    clientes   RUT normalizado ("123456785") de todos los clientes
+    vehiculos  patente de los vehículos disponibles
+
+y responde con bisect (O(log n) + las sugerencias), sin consultar la base en
+cada tecla. Las listas se cargan en la primera consulta y se mantienen al día
+con los eventos de la sesión: al confirmar (commit) un alta, cambio o baja de
+un Cliente o Vehiculo se actualiza la entrada correspondiente. Las sentencias
+masivas (importación) marcan el índice para recargarlo completo.
+
+Los cambios hechos por otros procesos (otro worker de gunicorn, un comando
+de `flask`) se ven al recargar, cada AUTOCOMPLETAR_REFRESCO_SEG segundos.
+"""
+import threading
+import time
+from bisect import bisect_left, insort
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from app import db
+from .models import Cliente, Vehiculo
+from .rut import normalizar as normalizar_rut, formatear as formatear_rut
+
+LIMITE = 10
+
+
+class _Indice:
+    """Claves ordenadas y el texto que se muestra para cada una."""
+
+    def __init__(self, pares=()):
+        pares = sorted(pares)
+        self._claves = [clave for clave, _ in pares]
+        self._etiquetas = dict(pares)
+        self._bloqueo = threading.Lock()
+
+    def __len__(self):
+        return len(self._claves)
+
+    def poner(self, clave, etiqueta):
+        with self._bloqueo:
+            if clave not in self._etiquetas:
+                insort(self._claves, clave)
+            self._etiquetas[clave] = etiqueta
+
+    def quitar(self, clave):
+        with self._bloqueo:
+            if self._etiquetas.pop(clave, None) is not None:
+                del self._claves[bisect_left(self._claves, clave)]
+
+    def buscar(self, prefijo, limite=LIMITE):
+        with self._bloqueo:
+            inicio = bisect_left(self._claves, prefijo)
+            claves = [c for c in self._claves[inicio:inicio + limite] if c.startswith(prefijo)]
+            return [(clave, self._etiquetas[clave]) for clave in claves]
+
+
+class _Indices:
+    def __init__(self):
+        self.clientes = None
+        self.vehiculos = None
+        self.cargado = 0 # time.monotonic() de la última carga
+        self.recargar = True
+        self.bloqueo = threading.Lock()
+
+
+# --- TEXTO DE CADA ENTRADA ---
+def _entrada(obj):
+    """(índice, clave, etiqueta); etiqueta None si el objeto no debe sugerirse."""
+    if isinstance(obj, Cliente):
+        return 'clientes', obj.rut, _etiqueta_cliente(obj.rut, obj.nombre, obj.apellido)
+    etiqueta = _etiqueta_vehiculo(obj.marca, obj.modelo, obj.ano) if obj.estado == 'disponible' else None
+    return 'vehiculos', obj.patente, etiqueta
+
+
+def _etiqueta_cliente(rut, nombre, apellido):
+    return f'{formatear_rut(rut)} {nombre} {apellido}'
+
+
+def _etiqueta_vehiculo(marca, modelo, ano):
+    return f'{marca} {modelo} {ano}'
+
+
+# --- CARGA ---
+def _indices():
+    return current_app.extensions.setdefault('autocompletar', _Indices())
+
+
+def _cargar(indices):
+    clientes = _Indice((rut, _etiqueta_cliente(rut, nombre, apellido)) for rut, nombre, apellido in
+                       db.session.execute(select(Cliente.rut, Cliente.nombre, Cliente.apellido)))
+    vehiculos = _Indice((patente, _etiqueta_vehiculo(marca, modelo, ano)) for patente, marca, modelo, ano in
+                        db.session.execute(select(Vehiculo.patente, Vehiculo.marca, Vehiculo.modelo, Vehiculo.ano)
+                                           .where(Vehiculo.estado == 'disponible')))
+    indices.clientes, indices.vehiculos = clientes, vehiculos
+    indices.cargado = time.monotonic()
+    indices.recargar = False
+
+
+def _al_dia():
+    """Índices del proceso, cargándolos si faltan o ya pasó el intervalo de refresco."""
+    indices = _indices()
+    refresco = current_app.config.get('AUTOCOMPLETAR_REFRESCO_SEG', 300)
+    if indices.recargar or time.monotonic() - indices.cargado > refresco:
+        with indices.bloqueo:
+            # Otro hilo pudo cargarlos mientras se esperaba el bloqueo
+            if indices.recargar or time.monotonic() - indices.cargado > refresco:
+                _cargar(indices)
+    return indices
+
+
+# --- CONSULTAS ---
+def sugerir_clientes(q, limite=LIMITE):
+    """[(rut con formato, etiqueta)] de los clientes cuyo RUT empieza con q."""
+    prefijo = normalizar_rut(q)
+    if not prefijo:
+        return []
+    return [(formatear_rut(rut), etiqueta) for rut, etiqueta in _al_dia().clientes.buscar(prefijo, limite)]
+
+
+def sugerir_vehiculos(q, limite=LIMITE):
+    """[(patente, etiqueta)] de los vehículos disponibles cuya patente empieza con q."""
+    prefijo = q.strip().upper()
+    if not prefijo:
+        return []
+    return _al_dia().vehiculos.buscar(prefijo, limite)
+
+
+# --- MANTENCIÓN DESDE LA SESIÓN ---
+def _claves_anteriores(obj):
+    attr = 'rut' if isinstance(obj, Cliente) else 'patente'
+    return [c for c in (inspect(obj).attrs[attr].history.deleted or ()) if c]
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_cambios(session, flush_context):
+    cambios = [o for o in session.new | session.dirty | session.deleted if isinstance(o, (Cliente, Vehiculo))]
+    if not cambios:
+        return
+    pendientes = session.info.setdefault('autocompletar', [])
+    for obj in cambios:
+        nombre, clave, etiqueta = _entrada(obj)
+        for anterior in _claves_anteriores(obj):
+            pendientes.append((nombre, anterior, None))
+        pendientes.append((nombre, clave, None if obj in session.deleted else etiqueta))
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _sentencia_masiva(estado):
+    if (estado.is_insert or estado.is_update or estado.is_delete) and estado.bind_mapper \
+            and issubclass(estado.bind_mapper.class_, (Cliente, Vehiculo)):
+        estado.session.info['autocompletar_recargar'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _aplicar_cambios(session):
+    pendientes = session.info.pop('autocompletar', None)
+    recargar = session.info.pop('autocompletar_recargar', False)
+    if not (pendientes or recargar) or not has_app_context():
+        return
+    indices = current_app.extensions.get('autocompletar')
+    if indices is None or indices.clientes is None:
+        return # aún no se carga: la primera consulta lo hará completo
+    if recargar:
+        indices.recargar = True
+        return
+    for nombre, clave, etiqueta in pendientes:
+        indice = getattr(indices, nombre)
+        if etiqueta is None:
+            indice.quitar(clave)
+        else:
+            indice.poner(clave, etiqueta)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _descartar_cambios(session):
+    session.info.pop('autocompletar', None)
+    session.info.pop('autocompletar_recargar', None)
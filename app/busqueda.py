@@ -0,0 +1,246 @@
+"""Búsqueda de texto sobre clientes y vehículos (y notas de venta a través de ellos).
+
+- SQLite: tabla virtual FTS5 `busqueda_fts` (entidad, clave, texto), mantenida
+  desde los eventos de la sesión cada vez que se inserta, borra o cambia el
+  texto indexado de un Cliente o un Vehiculo. Como FTS5 no indexa entidad ni
+  clave, `busqueda_fts_claves` guarda el rowid de cada (entidad, clave): así
+  cada cambio borra su fila por rowid en vez de recorrer el índice completo.
+- MySQL: índices FULLTEXT sobre las tablas base y MATCH ... AGAINST en modo
+  booleano, que InnoDB mantiene solo.
+- Cualquier otro caso (p. ej. las tablas FTS aún no se crean): LIKE como antes.
+
+Todas las búsquedas son por prefijo de palabra ("toy" encuentra "Toyota",
+"12345" encuentra el RUT 12.345.678-9). Un RUT completo se resuelve además
+por la clave primaria normalizada.
+"""
+import re
+from sqlalchemy import event, inspect, or_, select, text, true, false, table, column
+from sqlalchemy.dialects.mysql import match
+from sqlalchemy.orm import Session
+from app import db
+from .models import Cliente, Vehiculo, NotaVenta
+from .rut import normalizar as normalizar_rut
+
+TABLA_FTS = 'busqueda_fts'
+TABLA_CLAVES = 'busqueda_fts_claves' # (entidad, clave) -> id, que es el rowid de su fila en busqueda_fts
+_fts = table(TABLA_FTS, column('entidad'), column('clave'), column('texto'))
+
+# Atributos que forman el texto indexado de cada modelo (la clave primero)
+INDEXADOS = {Cliente: ('rut', 'nombre', 'apellido'), Vehiculo: ('patente', 'marca', 'modelo')}
+
+ESTADOS_NOTA = ('completada', 'pendiente', 'anulada', 'reservada')
+
+_RE_RUT = re.compile(r'^\d{1,2}\.?\d{3}\.?\d{3}-?[\dkK]$')
+_RE_TERMINOS = re.compile(r'\w+', re.UNICODE)
+
+# Por motor: ¿existen las tablas FTS5? Se consulta una sola vez por proceso.
+_fts_disponible = {}
+
+
+# --- NORMALIZACIÓN DE LA CONSULTA ---
+def es_rut(texto):
+    return bool(_RE_RUT.match(texto.strip()))
+
+
+def terminos(q):
+    """Palabras de la consulta en minúsculas; un RUT con puntos cuenta como una sola."""
+    q = q.strip()
+    if re.fullmatch(r'[\d.\-kK]+', q):
+        q = normalizar_rut(q)
+    return [t.lower() for t in _RE_TERMINOS.findall(q)]
+
+
+def _expresion_fts(palabras):
+    # Entre comillas para que ningún carácter se interprete como sintaxis FTS5
+    return ' '.join(f'"{p}"*' for p in palabras)
+
+
+def _expresion_mysql(palabras):
+    return ' '.join(f'+{p}*' for p in palabras)
+
+
+# --- DETECCIÓN DEL MOTOR ---
+def _motor(bind):
+    if bind.dialect.name == 'mysql':
+        return 'mysql'
+    if bind.dialect.name == 'sqlite':
+        engine = getattr(bind, 'engine', bind)
+        if engine not in _fts_disponible:
+            # TABLA_CLAVES se crea después de TABLA_FTS; con la misma conexión si bind lo es
+            _fts_disponible[engine] = inspect(bind).has_table(TABLA_CLAVES)
+        if _fts_disponible[engine]:
+            return 'fts'
+    return 'like'
+
+
+# --- CLAVES QUE COINCIDEN ---
+def _claves(entidad, palabras):
+    """SELECT con las claves (rut o patente) que coinciden con todas las palabras."""
+    if entidad == 'cliente':
+        columnas = (Cliente.rut, Cliente.nombre, Cliente.apellido)
+    else:
+        columnas = (Vehiculo.patente, Vehiculo.marca, Vehiculo.modelo)
+    clave = columnas[0]
+    motor = _motor(db.session.get_bind())
+
+    if motor == 'fts':
+        return select(_fts.c.clave).where(
+            _fts.c.entidad == entidad,
+            text(f'{TABLA_FTS} MATCH :expr').bindparams(expr=_expresion_fts(palabras))
+        )
+
+    if motor == 'mysql':
+        return select(clave).where(
+            match(*columnas, against=_expresion_mysql(palabras)).in_boolean_mode()
+        )
+
+    condiciones = [or_(*[c.like(f'%{p}%') for c in columnas]) for p in palabras]
+    return select(clave).where(*condiciones)
+
+
+def _filtro_entidad(entidad, columna_clave, q):
+    palabras = terminos(q)
+    if not palabras:
+        return true()
+    condicion = columna_clave.in_(_claves(entidad, palabras))
+    if entidad == 'cliente' and es_rut(q):
+        # Camino exacto por clave primaria para RUT completos
+        condicion = or_(columna_clave == normalizar_rut(q), condicion)
+    return condicion
+
+
+# --- FILTROS PARA LAS VISTAS ---
+def filtro_clientes(q):
+    return _filtro_entidad('cliente', Cliente.rut, q)
+
+
+def filtro_vehiculos(q):
+    return _filtro_entidad('vehiculo', Vehiculo.patente, q)
+
+
+def filtro_notas(q, campo='todos'):
+    """Filtro para NotaVenta según el selector de campo del listado."""
+    q = q.strip()
+    condiciones = []
+    if campo in ('folio', 'todos'):
+        condiciones.append(NotaVenta.id == int(q) if q.isdigit() else false())
+    if campo in ('cliente', 'todos'):
+        condiciones.append(_filtro_entidad('cliente', NotaVenta.cliente_rut, q))
+    if campo in ('vehiculo', 'todos'):
+        condiciones.append(_filtro_entidad('vehiculo', NotaVenta.vehiculo_patente, q))
+    if campo in ('estado', 'todos'):
+        estados = [e for e in ESTADOS_NOTA if e.startswith(q.lower())]
+        condiciones.append(NotaVenta.estado.in_(estados) if estados else false())
+    return or_(*condiciones)
+
+
+# --- MANTENCIÓN DEL ÍNDICE FTS5 (solo SQLite) ---
+_BORRAR = text(f'DELETE FROM {TABLA_FTS} WHERE rowid IN '
+               f'(SELECT id FROM {TABLA_CLAVES} WHERE entidad = :e AND clave = :c)')
+_OLVIDAR = text(f'DELETE FROM {TABLA_CLAVES} WHERE entidad = :e AND clave = :c')
+_REGISTRAR = text(f'INSERT OR IGNORE INTO {TABLA_CLAVES} (entidad, clave) VALUES (:e, :c)')
+_AGREGAR = text(f'INSERT INTO {TABLA_FTS} (rowid, entidad, clave, texto) '
+                f'SELECT id, entidad, clave, :t FROM {TABLA_CLAVES} WHERE entidad = :e AND clave = :c')
+
+
+def _quitar(conn, filas):
+    """Saca del índice las claves de `filas` ({'e': entidad, 'c': clave})."""
+    conn.execute(_BORRAR, filas)
+    conn.execute(_OLVIDAR, filas)
+
+
+def _poner(conn, filas):
+    """Indexa `filas` ({'e', 'c', 't': texto}), reemplazando la fila de una clave ya indexada."""
+    conn.execute(_BORRAR, filas)
+    conn.execute(_REGISTRAR, filas)
+    conn.execute(_AGREGAR, filas)
+
+
+def _documento(obj):
+    if isinstance(obj, Cliente):
+        return 'cliente', obj.rut, f"{obj.rut} {obj.nombre} {obj.apellido}"
+    return 'vehiculo', obj.patente, f"{obj.patente} {obj.marca} {obj.modelo}"
+
+
+def _texto_cambio(obj):
+    """¿Cambió alguno de los atributos que forman el texto indexado?"""
+    estado = inspect(obj)
+    return any(estado.attrs[attr].history.has_changes() for attr in INDEXADOS[type(obj)])
+
+
+def _claves_anteriores(obj):
+    """Claves con las que el objeto estaba indexado y ya no tiene (la PK se puede editar)."""
+    return [c for c in (inspect(obj).attrs[INDEXADOS[type(obj)][0]].history.deleted or ()) if c]
+
+
+@event.listens_for(Session, 'after_flush')
+def _sincronizar_fts(session, flush_context):
+    modelos = tuple(INDEXADOS)
+    cambios = [o for o in session.new | session.deleted if isinstance(o, modelos)]
+    # Un cambio de estado (venta, reserva) no toca el texto: no se reindexa
+    cambios += [o for o in session.dirty if isinstance(o, modelos) and _texto_cambio(o)]
+    if not cambios:
+        return
+    # La conexión de la transacción en curso: pedir otra al pool mientras se tiene
+    # el bloqueo de escritura puede quedar esperando a los que esperan ese bloqueo
+    conn = session.connection()
+    if _motor(conn) != 'fts':
+        return
+    quitar, poner = [], []
+    for obj in cambios:
+        entidad, clave, texto = _documento(obj)
+        quitar.extend({'e': entidad, 'c': c} for c in _claves_anteriores(obj))
+        if obj in session.deleted:
+            quitar.append({'e': entidad, 'c': clave})
+        else:
+            poner.append({'e': entidad, 'c': clave, 't': texto})
+    if quitar:
+        _quitar(conn, quitar)
+    if poner:
+        _poner(conn, poner)
+
+
+def indexar(entidad, documentos):
+    """Agrega al índice filas insertadas sin pasar por la sesión (importación masiva).
+
+    `documentos` es una lista de (clave, texto). Solo hace algo con FTS5.
+    """
+    if not documentos or _motor(db.session.get_bind()) != 'fts':
+        return
+    _poner(db.session.connection(), [{'e': entidad, 'c': clave, 't': texto} for clave, texto in documentos])
+
+
+def reconstruir_indice():
+    """Crea (si faltan) y repuebla las tablas FTS5. En MySQL no hace nada: FULLTEXT se mantiene solo."""
+    engine = db.engine
+    if engine.dialect.name != 'sqlite':
+        return 0
+    with engine.begin() as conn:
+        conn.execute(text(
+            f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLA_FTS} USING fts5('
+            'entidad UNINDEXED, clave UNINDEXED, texto, tokenize="unicode61 remove_diacritics 2")'
+        ))
+        conn.execute(text(
+            f'CREATE TABLE IF NOT EXISTS {TABLA_CLAVES} ('
+            'id INTEGER PRIMARY KEY, entidad VARCHAR(10) NOT NULL, clave VARCHAR(10) NOT NULL, '
+            'UNIQUE (entidad, clave))'
+        ))
+        conn.execute(text(f'DELETE FROM {TABLA_FTS}'))
+        conn.execute(text(f'DELETE FROM {TABLA_CLAVES}'))
+        conn.execute(text(
+            f"INSERT INTO {TABLA_CLAVES} (entidad, clave) "
+            "SELECT 'cliente', rut FROM clientes UNION ALL SELECT 'vehiculo', patente FROM vehiculos"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {TABLA_FTS} (rowid, entidad, clave, texto) "
+            f"SELECT k.id, k.entidad, k.clave, rut || ' ' || nombre || ' ' || apellido "
+            f"FROM {TABLA_CLAVES} k JOIN clientes ON k.entidad = 'cliente' AND k.clave = clientes.rut"
+        ))
+        conn.execute(text(
+            f"INSERT INTO {TABLA_FTS} (rowid, entidad, clave, texto) "
+            f"SELECT k.id, k.entidad, k.clave, patente || ' ' || marca || ' ' || modelo "
+            f"FROM {TABLA_CLAVES} k JOIN vehiculos ON k.entidad = 'vehiculo' AND k.clave = vehiculos.patente"
+        ))
+        total = conn.execute(text(f'SELECT count(*) FROM {TABLA_FTS}')).scalar()
+    _fts_disponible[engine] = True
+    return total
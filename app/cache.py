@@ -0,0 +1,256 @@
+"""Caché de resultados de corta duración (dashboard, conteos de inventario).
+
+    from app import cache
+
+    @cache.memorizar('ventas')
+    def resumen_ventas(fecha_inicio, fecha_fin): ...
+
+    cache.depende_de(VentaDiaria, 'ventas')
+
+Cada resultado se guarda en un espacio ('ventas', 'inventario') con una clave
+armada a partir de los argumentos, y vence a los CACHE_TTL_SEG segundos. Los
+espacios se vacían solos cuando se confirma (commit) una transacción que
+insertó, modificó o borró filas de un modelo del que dependen: por la unidad
+de trabajo del ORM o por sentencias masivas (insert(Modelo), query.delete()).
+
+Backends (CACHE_BACKEND):
+
+    'memoria'  LRU en el proceso, hasta CACHE_MAX_ENTRADAS. Con varios workers
+               de gunicorn cada uno tiene la suya y solo ve sus propias
+               invalidaciones; las de otros workers llegan al vencer el TTL.
+    'sqlite'   tabla en el archivo CACHE_DB, compartida por todos los workers
+               (invalidar un espacio lo vacía para todos).
+    'ninguno'  sin caché.
+
+Los valores se guardan como JSON. Los contadores de aciertos y fallos son por
+proceso y se ven con `flask cache-estado` y en /metricas.
+"""
+import functools
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter, OrderedDict
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Modelo -> espacios que dependen de él (ver depende_de)
+DEPENDENCIAS = {}
+
+
+# --- BACKENDS ---
+class _Memoria:
+    def __init__(self, maximo):
+        self._maximo = maximo
+        self._datos = OrderedDict() # (espacio, clave) -> (vence, valor)
+        self._bloqueo = threading.Lock()
+
+    def obtener(self, espacio, clave):
+        with self._bloqueo:
+            entrada = self._datos.get((espacio, clave))
+            if entrada is None:
+                return None
+            if entrada[0] < time.monotonic():
+                del self._datos[(espacio, clave)]
+                return None
+            self._datos.move_to_end((espacio, clave))
+            return entrada[1]
+
+    def guardar(self, espacio, clave, valor, ttl):
+        with self._bloqueo:
+            self._datos[(espacio, clave)] = (time.monotonic() + ttl, valor)
+            self._datos.move_to_end((espacio, clave))
+            while len(self._datos) > self._maximo:
+                self._datos.popitem(last=False)
+
+    def invalidar(self, espacio):
+        with self._bloqueo:
+            for llave in [llave for llave in self._datos if llave[0] == espacio]:
+                del self._datos[llave]
+
+    def entradas(self):
+        return len(self._datos)
+
+
+class _SQLite:
+    """Tabla `cache` en un archivo SQLite compartido por todos los workers del servidor."""
+
+    def __init__(self, ruta, maximo):
+        self._ruta = ruta
+        self._maximo = maximo
+        self._local = threading.local()
+        self._escrituras = 0
+        conn = self._conexion()
+        conn.execute("""CREATE TABLE IF NOT EXISTS cache (
+            espacio TEXT NOT NULL,
+            clave TEXT NOT NULL,
+            valor TEXT NOT NULL,
+            vence REAL NOT NULL,
+            PRIMARY KEY (espacio, clave))""")
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_cache_vence ON cache (vence)')
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Una conexión por hilo, en autocommit
+            conn = sqlite3.connect(self._ruta, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def obtener(self, espacio, clave):
+        fila = self._conexion().execute('SELECT valor FROM cache WHERE espacio = ? AND clave = ? AND vence >= ?',
+                                        (espacio, clave, time.time())).fetchone()
+        return fila[0] if fila else None
+
+    def guardar(self, espacio, clave, valor, ttl):
+        conn = self._conexion()
+        conn.execute('INSERT OR REPLACE INTO cache (espacio, clave, valor, vence) VALUES (?, ?, ?, ?)',
+                     (espacio, clave, valor, time.time() + ttl))
+        self._escrituras += 1
+        if self._escrituras % 50 == 0:
+            # Limpieza ocasional: vencidas y, si sobra, las que vencen antes
+            conn.execute('DELETE FROM cache WHERE vence < ?', (time.time(),))
+            conn.execute('DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY vence DESC LIMIT -1 OFFSET ?)',
+                         (self._maximo,))
+
+    def invalidar(self, espacio):
+        self._conexion().execute('DELETE FROM cache WHERE espacio = ?', (espacio,))
+
+    def entradas(self):
+        return self._conexion().execute('SELECT count(*) FROM cache WHERE vence >= ?', (time.time(),)).fetchone()[0]
+
+
+class _Ninguno:
+    def obtener(self, espacio, clave):
+        return None
+
+    def guardar(self, espacio, clave, valor, ttl):
+        pass
+
+    def invalidar(self, espacio):
+        pass
+
+    def entradas(self):
+        return 0
+
+
+# --- CACHÉ DE UNA APLICACIÓN ---
+class _Cache:
+    def __init__(self, app):
+        backend = app.config.get('CACHE_BACKEND', 'memoria')
+        maximo = app.config.get('CACHE_MAX_ENTRADAS', 500)
+        if backend == 'sqlite' and app.config.get('CACHE_DB'):
+            self.backend = _SQLite(app.config['CACHE_DB'], maximo)
+        elif backend == 'ninguno':
+            self.backend = _Ninguno()
+        else:
+            self.backend = _Memoria(maximo)
+        self.ttl = app.config.get('CACHE_TTL_SEG', 30)
+        self._bloqueo = threading.Lock()
+        self._contadores = Counter() # (evento, espacio) -> cantidad
+
+    def _contar(self, evento, espacio):
+        with self._bloqueo:
+            self._contadores[(evento, espacio)] += 1
+
+    def obtener_o_calcular(self, espacio, clave, calcular, ttl=None):
+        guardado = self.backend.obtener(espacio, clave)
+        if guardado is not None:
+            self._contar('aciertos', espacio)
+            return json.loads(guardado)
+        self._contar('fallos', espacio)
+        valor = calcular()
+        self.backend.guardar(espacio, clave, json.dumps(valor, default=str), ttl or self.ttl)
+        return valor
+
+    def invalidar(self, *espacios):
+        for espacio in espacios:
+            self.backend.invalidar(espacio)
+            self._contar('invalidaciones', espacio)
+
+    def metricas(self):
+        with self._bloqueo:
+            contadores = dict(self._contadores)
+        total = Counter()
+        for (evento, _), cantidad in contadores.items():
+            total[evento] += cantidad
+        consultas = total['aciertos'] + total['fallos']
+        metricas = {
+            'aciertos': total['aciertos'],
+            'fallos': total['fallos'],
+            'invalidaciones': total['invalidaciones'],
+            'tasa_aciertos': round(total['aciertos'] / consultas, 3) if consultas else 0,
+            'entradas': self.backend.entradas(),
+        }
+        for (evento, espacio), cantidad in contadores.items():
+            metricas[f'{espacio}_{evento}'] = cantidad
+        return metricas
+
+
+def _clave(argumentos, nombrados):
+    return json.dumps([argumentos, sorted(nombrados.items())], default=str, separators=(',', ':'))
+
+
+# --- INVALIDACIÓN POR EVENTOS DE LA SESIÓN ---
+def _marcar(session, clases):
+    espacios = session.info.setdefault('cache_espacios', set())
+    for clase in clases:
+        for modelo, dependientes in DEPENDENCIAS.items():
+            if issubclass(clase, modelo):
+                espacios.update(dependientes)
+
+
+@event.listens_for(Session, 'after_flush')
+def _despues_de_flush(session, flush_context):
+    if DEPENDENCIAS:
+        _marcar(session, {type(obj) for obj in session.new | session.dirty | session.deleted})
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _sentencia_masiva(estado):
+    # insert(Modelo), update(Modelo), query.delete()... no pasan por el flush
+    if DEPENDENCIAS and (estado.is_insert or estado.is_update or estado.is_delete) and estado.bind_mapper:
+        _marcar(estado.session, {estado.bind_mapper.class_})
+
+
+@event.listens_for(Session, 'after_commit')
+def _despues_de_commit(session):
+    espacios = session.info.pop('cache_espacios', None)
+    if espacios and has_app_context() and 'cache' in current_app.extensions:
+        current_app.extensions['cache'].invalidar(*sorted(espacios))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _despues_de_rollback(session):
+    session.info.pop('cache_espacios', None)
+
+
+class CacheDatos:
+    """Extensión de Flask; el estado de cada aplicación vive en app.extensions['cache']."""
+
+    def init_app(self, app):
+        app.extensions['cache'] = _Cache(app)
+
+    def memorizar(self, espacio, ttl=None):
+        """Decorador: guarda el resultado de la función por sus argumentos (deben ser serializables)."""
+        def decorador(funcion):
+            @functools.wraps(funcion)
+            def envoltura(*argumentos, **nombrados):
+                return current_app.extensions['cache'].obtener_o_calcular(
+                    espacio, f'{funcion.__name__}:{_clave(argumentos, nombrados)}',
+                    lambda: funcion(*argumentos, **nombrados), ttl)
+            return envoltura
+        return decorador
+
+    def depende_de(self, modelo, *espacios):
+        """Los espacios se invalidan al confirmar cambios en filas de `modelo`."""
+        DEPENDENCIAS.setdefault(modelo, set()).update(espacios)
+
+    def invalidar(self, *espacios):
+        current_app.extensions['cache'].invalidar(*espacios)
+
+    def metricas(self):
+        return current_app.extensions['cache'].metricas()
@@ -0,0 +1,317 @@
+import json
+import os
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+import click
+from flask import Blueprint, current_app
+from .reportes import reconstruir_ventas_diarias
+from .busqueda import reconstruir_indice
+from . import plantillas_pdf
+from app import db, cola, cache, conexiones
+from .pdfs import render_nota_venta, render_devolucion, render_consignacion
+from . import rendimiento
+from . import importacion
+from . import historial
+from . import reservas
+from . import eventos
+
+# Comandos de mantención: `flask <comando>` (cli_group=None los deja en el nivel superior)
+bp = Blueprint('comandos', __name__, cli_group=None)
+
+
+@bp.cli.command('reconstruir-ventas-diarias')
+def reconstruir_ventas_diarias_cmd():
+    """Recalcula la tabla ventas_diarias a partir de las notas de venta existentes."""
+    filas = reconstruir_ventas_diarias()
+    click.echo(f'ventas_diarias reconstruida: {filas} filas.')
+
+
+@bp.cli.command('reconstruir-busqueda')
+def reconstruir_busqueda_cmd():
+    """Crea y repuebla el índice FTS5 de búsqueda (solo SQLite)."""
+    total = reconstruir_indice()
+    click.echo(f'Índice de búsqueda reconstruido: {total} documentos.')
+
+
+@bp.cli.command('archivar-historial')
+@click.option('--dias', type=int, help='Antigüedad mínima en días (por defecto HISTORIAL_ARCHIVAR_DIAS).')
+@click.option('--lote', default=historial.LOTE, show_default=True, help='Rango de ids por transacción.')
+def archivar_historial_cmd(dias, lote):
+    """Mueve los eventos de historial antiguos a registro_historial_archivo."""
+    dias = dias if dias is not None else current_app.config['HISTORIAL_ARCHIVAR_DIAS']
+    antes_de = datetime.now() - timedelta(days=dias)
+    movidos = historial.archivar_historial(antes_de, lote, avance=lambda n: click.echo(f'  {n} movidos', err=True))
+    click.echo(f'Historial archivado: {movidos} eventos anteriores al {antes_de:%d-%m-%Y}.')
+
+
+@bp.cli.command('vencer-reservas')
+@click.option('--lote', default=reservas.LOTE, show_default=True, help='Notas por transacción.')
+@click.option('--simular', is_flag=True, help='Solo cuenta las reservas vencidas, sin modificarlas.')
+def vencer_reservas_cmd(lote, simular):
+    """Anula las reservas vencidas y deja disponibles sus vehículos."""
+    if simular:
+        click.echo(f'Reservas vencidas: {reservas.contar_vencidas()}.')
+        return
+    conteo = reservas.vencer_reservas(lote=lote, avance=lambda c: click.echo(f"  {c['notas']} anuladas", err=True))
+    click.echo(f"Reservas vencidas: {conteo['notas']} notas anuladas, {conteo['vehiculos']} vehículos "
+               f"liberados, en {conteo['lotes']} lotes.")
+
+
+@bp.cli.command('tiempo-en-estados')
+@click.option('--patente', help='Solo este vehículo.')
+def tiempo_en_estados_cmd(patente):
+    """Días que los vehículos pasan en cada estado, según la bitácora de eventos."""
+    if patente:
+        for estado, tiempo in eventos.tiempo_en_estados(patente).get(patente, {}).items():
+            click.echo(f'{estado:<16}{tiempo.total_seconds() / 86400:>10.1f} días')
+        return
+    click.echo(f"{'estado':<16}{'vehículos':>10}{'promedio':>10}{'máximo':>10}")
+    for estado, r in eventos.resumen_tiempo_en_estados().items():
+        click.echo(f"{estado:<16}{r['vehiculos']:>10}{r['promedio_dias']:>10}{r['maximo_dias']:>10}")
+
+
+@bp.cli.command('tareas-estado')
+def tareas_estado_cmd():
+    """Profundidad de la cola de tareas (con TAREAS_DB incluye las de todos los workers)."""
+    for clave, valor in sorted(cola.metricas().items()):
+        click.echo(f'{clave:<20}{valor}')
+
+
+@bp.cli.command('cache-estado')
+def cache_estado_cmd():
+    """Entradas de la caché de datos y aciertos de este proceso."""
+    for clave, valor in cache.metricas().items():
+        click.echo(f'{clave:<28}{valor}')
+
+
+@bp.cli.command('cache-vaciar')
+@click.argument('espacios', nargs=-1)
+def cache_vaciar_cmd(espacios):
+    """Vacía los espacios indicados de la caché (por defecto, 'ventas' e 'inventario')."""
+    espacios = espacios or ('ventas', 'inventario')
+    cache.invalidar(*espacios)
+    click.echo(f"Caché vaciada: {', '.join(espacios)}.")
+
+
+@bp.cli.command('copiar-replica')
+def copiar_replica_cmd():
+    """Copia la base SQLite primaria sobre la réplica (DATABASE_REPLICA_URL), para probar en local."""
+    primaria, replica = db.engines[None], db.engines.get(conexiones.REPLICA)
+    if replica is None:
+        raise click.ClickException('DATABASE_REPLICA_URL no está definida.')
+    if primaria.dialect.name != 'sqlite' or replica.dialect.name != 'sqlite':
+        raise click.ClickException('Solo sirve con dos archivos SQLite; en MySQL la réplica la mantiene el servidor.')
+    replica.dispose()
+    with sqlite3.connect(primaria.url.database) as origen, sqlite3.connect(replica.url.database) as destino:
+        origen.backup(destino)
+    click.echo(f'{primaria.url.database} copiada en {replica.url.database}.')
+
+
+def _documentos_de_ejemplo():
+    nota = {
+        'id': 1, 'fecha_venta': '01-03-2026', 'estado': 'completada', 'monto_final': 8990000,
+        'monto_reserva': 0, 'dias_vigencia': 0, 'observaciones': None, 'metodo_pago': 'contado',
+        'nombre_cliente': 'Juan Perez', 'rut_cliente': '12.345.678-5', 'telefono_cliente': '912345678',
+        'direccion_cliente': 'Av. Principal 123, Talca', 'vendedor_nombre': 'Vendedor', 'vendedor_email': 'ventas@automotora.cl',
+        'patente': 'ABCD12', 'marca': 'Toyota', 'modelo': 'Yaris', 'ano': 2020, 'chasis_n': 'CH123', 'motor_n': 'MO123',
+    }
+    devolucion = {
+        'id': 1, 'fecha_emision': '01-03-2026', 'monto_reserva': 500000, 'nombre_cliente': 'Juan Perez',
+        'rut_cliente': '12.345.678-5', 'marca_modelo': 'Toyota Yaris', 'patente': 'ABCD12',
+    }
+    consignacion = {
+        'propietario_nombre': 'Juan Perez', 'propietario_rut': '12.345.678-5', 'propietario_direccion': 'Av. Principal 123, Talca',
+        'propietario_telefono': '912345678', 'marca': 'Toyota', 'modelo': 'Yaris', 'ano': 2020, 'color': 'Rojo',
+        'patente': 'ABCD12', 'kilometraje': 85000, 'chasis_n': 'CH123', 'motor_n': 'MO123', 'precio_acordado': 8990000,
+    }
+    return [
+        ('nota de venta', render_nota_venta, nota),
+        ('nota reservada', render_nota_venta, dict(nota, estado='reservada', monto_reserva=500000, dias_vigencia=5)),
+        ('devolución', render_devolucion, devolucion),
+        ('consignación', render_consignacion, consignacion),
+    ]
+
+
+@bp.cli.command('medir-pdf')
+@click.option('--n', default=50, show_default=True, help='Documentos por tipo.')
+def medir_pdf_cmd(n):
+    """Documentos por segundo de cada PDF, sin y con los recursos precargados."""
+    click.echo(f"{'documento':<16}{'sin precarga':>14}{'con precarga':>14}")
+    for nombre, render, datos in _documentos_de_ejemplo():
+        resultados = []
+        for precargar in (False, True):
+            plantillas_pdf.PRECARGAR = precargar
+            render(datos) # calentamiento: la primera llamada carga el logo
+            inicio = time.perf_counter()
+            for _ in range(n):
+                render(datos)
+            resultados.append(n / (time.perf_counter() - inicio))
+        click.echo(f'{nombre:<16}{resultados[0]:>10.1f} d/s{resultados[1]:>10.1f} d/s')
+    plantillas_pdf.PRECARGAR = True
+
+
+
+@bp.cli.command('importar')
+@click.argument('tipo', type=click.Choice(importacion.TIPOS))
+@click.argument('archivo', type=click.Path(exists=True, dir_okay=False))
+@click.option('--lote', type=int, help='Filas por transacción (por defecto IMPORTACION_LOTE).')
+@click.option('--informe', type=click.Path(dir_okay=False), help='CSV de errores (por defecto <archivo>.errores.csv).')
+def importar_cmd(tipo, archivo, lote, informe):
+    """Importa clientes o vehículos desde un CSV o Excel (.xlsx)."""
+    inicio = time.perf_counter()
+    try:
+        resultado = importacion.importar_archivo(tipo, archivo, lote)
+    except importacion.ErrorImportacion as e:
+        raise click.ClickException(str(e))
+    segundos = time.perf_counter() - inicio
+    click.echo(f'{resultado.insertadas} de {resultado.filas} filas importadas en {segundos:.1f} s '
+               f'({resultado.filas / segundos if segundos else 0:,.0f} filas/s).')
+    if resultado.errores:
+        informe = informe or f'{archivo}.errores.csv'
+        resultado.informe_csv(informe)
+        click.echo(f'{resultado.rechazadas} filas con errores; detalle en {informe}.')
+        raise SystemExit(1)
+
+def _base_rendimiento(ruta):
+    return ruta or os.path.join(current_app.instance_path, 'rendimiento.db')
+
+
+@bp.cli.command('sembrar-rendimiento')
+@click.option('--db', 'ruta', help='Archivo SQLite (por defecto instance/rendimiento.db).')
+@click.option('--clientes', default=100000, show_default=True)
+@click.option('--vehiculos', default=200000, show_default=True)
+@click.option('--notas', default=500000, show_default=True)
+@click.option('--registros', default=400000, show_default=True, help='Filas de historial.')
+@click.option('--semilla', default=1, show_default=True)
+@click.option('--reemplazar', is_flag=True, help='Borra la base si ya existe.')
+def sembrar_rendimiento_cmd(ruta, clientes, vehiculos, notas, registros, semilla, reemplazar):
+    """Crea una base SQLite aparte con datos sintéticos para `flask medir-rendimiento`."""
+    ruta = _base_rendimiento(ruta)
+    if os.path.exists(ruta):
+        if not reemplazar:
+            raise click.ClickException(f'{ruta} ya existe; use --reemplazar para volver a generarla.')
+        os.remove(ruta)
+    os.makedirs(os.path.dirname(os.path.abspath(ruta)), exist_ok=True)
+    app = rendimiento.crear_app(ruta)
+    inicio = time.perf_counter()
+    with app.app_context():
+        conteo = rendimiento.sembrar(clientes, vehiculos, notas, registros, semilla,
+                                     avance=lambda mensaje: click.echo(f'  {mensaje}'))
+    for tabla, filas in conteo.items():
+        click.echo(f'{tabla:<20}{filas:>10}')
+    click.echo(f'{ruta} lista en {time.perf_counter() - inicio:.0f} s.')
+
+
+@bp.cli.command('medir-rendimiento')
+@click.option('--db', 'ruta', help='Base creada con `flask sembrar-rendimiento`.')
+@click.option('--repeticiones', default=30, show_default=True, help='Requests medidos por escenario.')
+@click.option('--semilla', default=1, show_default=True)
+@click.option('--solo', multiple=True, help='Prefijo de escenario (se puede repetir).')
+@click.option('--cache-pdf', is_flag=True, help='Mide los PDF con la caché en disco activa.')
+@click.option('--salida', type=click.Path(dir_okay=False), help='Guarda el resultado en JSON.')
+@click.option('--comparar', type=click.Path(exists=True, dir_okay=False), help='JSON de una corrida anterior.')
+@click.option('--umbral', default=10.0, show_default=True, help='% de aumento de p50/p95 que cuenta como regresión.')
+def medir_rendimiento_cmd(ruta, repeticiones, semilla, solo, cache_pdf, salida, comparar, umbral):
+    """p50/p95, consultas por request y RSS máximo de las vistas principales."""
+    ruta = _base_rendimiento(ruta)
+    if not os.path.exists(ruta):
+        raise click.ClickException(f'{ruta} no existe; ejecute antes `flask sembrar-rendimiento`.')
+    app = rendimiento.crear_app(ruta, cache_pdf)
+    resultado = rendimiento.medir(app, repeticiones, semilla=semilla, solo=solo,
+                                  avance=lambda nombre: click.echo(f'  {nombre}', err=True))
+
+    click.echo(f"{'escenario':<24}{'p50 ms':>10}{'p95 ms':>10}{'consultas':>11}{'RSS MB':>9}{'errores':>9}")
+    for nombre, r in resultado['escenarios'].items():
+        click.echo(f"{nombre:<24}{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['consultas_por_request']:>11.1f}"
+                   f"{r['rss_pico_mb'] or 0:>9.0f}{r['errores']:>9}")
+
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        click.echo(f'Resultado guardado en {salida}.')
+
+    if comparar:
+        with open(comparar, encoding='utf-8') as f:
+            base = json.load(f)
+        regresiones = 0
+        click.echo(f"\nComparación con {comparar} ({base.get('fecha')}):")
+        for nombre, metrica, antes, ahora, cambio, empeoro in rendimiento.comparar(resultado, base, umbral):
+            regresiones += empeoro
+            marca = 'PEOR ' if empeoro else '     '
+            click.echo(f'{marca}{nombre:<24}{metrica:<24}{antes:>10.1f} -> {ahora:>10.1f} ({cambio:+.0f}%)')
+        if regresiones:
+            raise SystemExit(1)
+
+
+@bp.cli.command('medir-concurrencia')
+@click.option('--db', 'ruta', help='Base creada con `flask sembrar-rendimiento`.')
+@click.option('--hilos', default=8, show_default=True, help='Hilos que hacen requests a la vez.')
+@click.option('--segundos', default=10, show_default=True)
+@click.option('--pool', type=int, help='DB_POOL_SIZE para la corrida (por defecto el de la configuración).')
+@click.option('--overflow', type=int, help='DB_MAX_OVERFLOW para la corrida.')
+@click.option('--sin-wal', is_flag=True, help='Sin journal_mode=WAL, para comparar.')
+@click.option('--sin-escrituras', is_flag=True, help='Solo lecturas.')
+@click.option('--salida', type=click.Path(dir_okay=False), help='Guarda el resultado en JSON.')
+def medir_concurrencia_cmd(ruta, hilos, segundos, pool, overflow, sin_wal, sin_escrituras, salida):
+    """Lecturas concurrentes (y un escritor) contra la base SQLite del banco de pruebas."""
+    ruta = _base_rendimiento(ruta)
+    if not os.path.exists(ruta):
+        raise click.ClickException(f'{ruta} no existe; ejecute antes `flask sembrar-rendimiento`.')
+    extra = {'SQLITE_WAL': not sin_wal}
+    if pool is not None:
+        extra['DB_POOL_SIZE'] = pool
+    if overflow is not None:
+        extra['DB_MAX_OVERFLOW'] = overflow
+    if sin_wal:
+        # journal_mode=WAL queda guardado en el archivo: se vuelve a DELETE para la comparación
+        with sqlite3.connect(ruta) as conn:
+            conn.execute('PRAGMA journal_mode=DELETE')
+    app = rendimiento.crear_app(ruta, **extra)
+    resultado = rendimiento.medir_concurrencia(app, hilos, segundos, escrituras=not sin_escrituras)
+
+    for clave in ('journal_mode', 'hilos', 'requests', 'requests_por_segundo', 'p50_ms', 'p95_ms', 'escrituras', 'errores'):
+        click.echo(f'{clave:<24}{resultado[clave]}')
+    for clave, valor in resultado['pool'].items():
+        click.echo(f'{"pool_" + clave:<24}{valor}')
+    for ejemplo in resultado['ejemplos_error']:
+        click.echo(f'  {ejemplo}')
+
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        click.echo(f'Resultado guardado en {salida}.')
+
+
+@bp.cli.command('probar-ventas-concurrentes')
+@click.option('--db', 'ruta', help='Base del banco de pruebas (por defecto una base temporal pequeña).')
+@click.option('--vehiculos', default=4, show_default=True, help='Vehículos disputados.')
+@click.option('--hilos', default=8, show_default=True, help='Vendedores por vehículo, todos a la vez.')
+@click.option('--salida', type=click.Path(dir_okay=False), help='Guarda el resultado en JSON.')
+def probar_ventas_concurrentes_cmd(ruta, vehiculos, hilos, salida):
+    """Ventas simultáneas del mismo vehículo: por vehículo debe ganar exactamente una."""
+    with tempfile.TemporaryDirectory() as temporal:
+        if ruta is None:
+            ruta = os.path.join(temporal, 'ventas.db')
+            with rendimiento.crear_app(ruta).app_context():
+                rendimiento.sembrar(clientes=100, vehiculos=vehiculos, notas=0, registros=0)
+        elif not os.path.exists(ruta):
+            raise click.ClickException(f'{ruta} no existe; ejecute antes `flask sembrar-rendimiento`.')
+        app = rendimiento.crear_app(ruta, WTF_CSRF_ENABLED=False)
+        resultado = rendimiento.carrera_de_ventas(app, vehiculos, hilos)
+
+    click.echo(f"{'vehículo':<12}{'vendidas':>10}{'rechazadas':>12}{'errores':>9}{'notas nuevas':>14}  estado")
+    for patente, r in resultado['por_vehiculo'].items():
+        click.echo(f"{patente:<12}{r['vendidas']:>10}{r['rechazadas']:>12}{r['errores']:>9}{r['notas_nuevas']:>14}  {r['estado']}")
+    click.echo(f"{resultado['motor']}: {vehiculos * hilos} ventas en {resultado['segundos']} s, "
+               f"p50 {resultado['p50_ms']} ms, p95 {resultado['p95_ms']} ms")
+    for ejemplo in resultado['ejemplos_error']:
+        click.echo(f'  {ejemplo}')
+
+    if salida:
+        with open(salida, 'w', encoding='utf-8') as f:
+            json.dump(resultado, f, indent=2, ensure_ascii=False)
+        click.echo(f'Resultado guardado en {salida}.')
+    if not resultado['ok']:
+        raise SystemExit(1)
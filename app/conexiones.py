@@ -0,0 +1,253 @@
+"""Opciones del engine de SQLAlchemy y medición del pool de conexiones.
+
+MySQL (producción, PyMySQL detrás de gunicorn), por worker:
+
+    DB_POOL_SIZE      conexiones que el pool mantiene abiertas; por defecto
+                      una por hilo de gunicorn más los trabajadores de la
+                      cola de tareas (ver gunicorn.conf.py)
+    DB_MAX_OVERFLOW   conexiones extra en picos, se cierran al devolverse
+    DB_POOL_TIMEOUT   segundos que un request espera una conexión libre
+    DB_POOL_RECYCLE   edad máxima de una conexión; debe ser menor que el
+                      wait_timeout de MySQL, que cierra del lado del servidor
+                      las conexiones inactivas ("MySQL server has gone away")
+    DB_POOL_PRE_PING  verifica la conexión al sacarla del pool y la reemplaza
+                      si el servidor la cerró
+
+    El total hacia MySQL es workers x (DB_POOL_SIZE + DB_MAX_OVERFLOW) y tiene
+    que quedar bajo max_connections.
+
+SQLite (desarrollo y banco de pruebas): cada conexión nueva activa WAL (las
+lecturas no esperan a la escritura en curso), busy_timeout (una escritura
+espera al otro escritor en vez de fallar con "database is locked"),
+synchronous=NORMAL y el tamaño de la caché de páginas.
+
+Con un pool en cola (todo salvo SQLite en memoria) se mide cuánto espera cada
+checkout; las cifras salen en /metricas como automotora_pool_*.
+
+Si la configuración ya define SQLALCHEMY_ENGINE_OPTIONS, sus claves prevalecen.
+
+Réplica de lectura (opcional, DATABASE_REPLICA_URL): se registra como el bind
+'replica' y la sesión (SesionRuteada) manda a ella los SELECT de los requests
+GET/HEAD: dashboard, listados, exportaciones y PDFs. Todo lo demás va al
+primario: escrituras, requests POST, la cola de tareas y los comandos. Después
+de confirmar una escritura, las lecturas de ese usuario siguen en el primario
+durante DB_REPLICA_PEGAJOSO_SEG segundos (marca en la cookie de sesión), para
+que vea sus propios cambios aunque la réplica venga atrasada.
+
+Para probarlo en local con dos archivos SQLite:
+
+    DATABASE_URL=sqlite:////ruta/app.db
+    DATABASE_REPLICA_URL=sqlite:////ruta/replica.db
+    flask copiar-replica         # copia app.db en replica.db (la "replicación")
+
+Ventas concurrentes: la nota de venta lee el vehículo y lo marca vendido o
+reservado en la misma transacción, con el bloqueo tomado desde la lectura.
+En MySQL es SELECT ... FOR UPDATE sobre esas filas (ventas de otros vehículos
+no esperan); en SQLite, que no bloquea filas, la transacción parte con BEGIN
+IMMEDIATE (iniciar_escritura). La columna version de Vehiculo y NotaVenta
+cubre lo que quede fuera de ese bloqueo: un UPDATE con una versión vieja
+falla con StaleDataError.
+"""
+import threading
+import time
+from flask import current_app, g, has_request_context, request, session as sesion_web
+from flask_sqlalchemy.session import Session as SesionFlask
+from sqlalchemy import Select, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import QueuePool
+
+ESPERA_LENTA = 0.01 # segundos; checkouts más lentos que esto se cuentan aparte
+REPLICA = 'replica' # clave del bind en SQLALCHEMY_BINDS
+
+
+class _Estadisticas:
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.checkouts = 0
+        self.espera_total = 0.0
+        self.espera_max = 0.0
+        self.esperas_lentas = 0
+        self.agotado = 0 # checkouts que vencieron DB_POOL_TIMEOUT
+
+    def registrar(self, segundos, agotado=False):
+        with self._bloqueo:
+            self.checkouts += 1
+            self.espera_total += segundos
+            self.espera_max = max(self.espera_max, segundos)
+            self.esperas_lentas += segundos > ESPERA_LENTA
+            self.agotado += agotado
+
+
+class PoolMedido(QueuePool):
+    """QueuePool que registra el tiempo de espera de cada checkout."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.estadisticas = _Estadisticas()
+
+    def recreate(self):
+        # engine.dispose() crea un pool nuevo; se conservan las cifras
+        pool = super().recreate()
+        pool.estadisticas = self.estadisticas
+        return pool
+
+    def _do_get(self):
+        inicio = time.perf_counter()
+        agotado = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            agotado = True
+            raise
+        finally:
+            self.estadisticas.registrar(time.perf_counter() - inicio, agotado)
+
+
+def _es_sqlite_en_memoria(url):
+    return url.get_backend_name() == 'sqlite' and url.database in (None, '', ':memory:')
+
+
+def opciones_engine(config, uri=None):
+    """Opciones del engine según el motor de `uri` (por defecto SQLALCHEMY_DATABASE_URI) y la sección 12 de config.py."""
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    if _es_sqlite_en_memoria(url):
+        return {} # Flask-SQLAlchemy usa StaticPool: una sola conexión, nada que medir
+    opciones = {
+        'poolclass': PoolMedido,
+        'pool_size': config.get('DB_POOL_SIZE', 5),
+        'max_overflow': config.get('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': config.get('DB_POOL_TIMEOUT', 30),
+    }
+    if url.get_backend_name() != 'sqlite':
+        opciones['pool_recycle'] = config.get('DB_POOL_RECYCLE', 280)
+        opciones['pool_pre_ping'] = config.get('DB_POOL_PRE_PING', True)
+    return opciones
+
+
+def _pragmas(config):
+    pragmas = [
+        f"busy_timeout = {config.get('SQLITE_BUSY_TIMEOUT_MS', 5000)}",
+        'synchronous = NORMAL',
+        f"cache_size = -{config.get('SQLITE_CACHE_MB', 32) * 1024}", # negativo = KiB
+        'temp_store = MEMORY',
+    ]
+    if config.get('SQLITE_WAL', True):
+        pragmas.insert(0, 'journal_mode = WAL')
+    return pragmas
+
+
+def init_app(app):
+    """Completa SQLALCHEMY_ENGINE_OPTIONS y el bind de la réplica; create_app la llama antes de db.init_app."""
+    opciones = opciones_engine(app.config)
+    opciones.update(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones
+
+    replica = app.config.get('DATABASE_REPLICA_URL')
+    if replica:
+        binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+        binds.setdefault(REPLICA, dict(opciones_engine(app.config, replica), url=replica))
+        app.config['SQLALCHEMY_BINDS'] = binds
+
+
+def preparar_engine(engine, config):
+    """Pragmas de SQLite en cada conexión nueva; create_app la llama después de db.init_app."""
+    if engine.dialect.name != 'sqlite' or _es_sqlite_en_memoria(engine.url):
+        return
+    pragmas = _pragmas(config)
+
+    @event.listens_for(engine, 'connect')
+    def _al_conectar(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f'PRAGMA {pragma}')
+        cursor.close()
+
+
+def metricas(engine):
+    """Estado del pool del engine y tiempos de espera del proceso; vacío si no es un PoolMedido."""
+    pool = engine.pool
+    if not isinstance(pool, PoolMedido):
+        return {}
+    e = pool.estadisticas
+    with e._bloqueo:
+        return {
+            'tamano': pool.size(),
+            'en_uso': pool.checkedout(),
+            'libres': pool.checkedin(),
+            'desborde': max(pool.overflow(), 0),
+            'checkouts': e.checkouts,
+            'espera_media_ms': round(e.espera_total / e.checkouts * 1000, 3) if e.checkouts else 0,
+            'espera_max_ms': round(e.espera_max * 1000, 3),
+            'esperas_lentas': e.esperas_lentas,
+            'agotado': e.agotado,
+        }
+
+
+# --- RÉPLICA DE LECTURA ---
+def _primario_hasta():
+    return sesion_web.get('_primario_hasta', 0)
+
+
+def _lee_de_replica(session, clause):
+    """¿Esta sentencia puede ir a la réplica? Solo SELECT de un GET sin escrituras recientes."""
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    if session._flushing or g.get('escribio_primario') or not isinstance(clause, Select):
+        return False
+    return _primario_hasta() < time.time()
+
+
+class SesionRuteada(SesionFlask):
+    """Sesión de Flask-SQLAlchemy que manda las lecturas de los GET a la réplica, si hay una."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None:
+            replica = self._db.engines.get(REPLICA)
+            if replica is not None and _lee_de_replica(self, clause):
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _marcar_escritura(session):
+    session.info['escribio_primario'] = True
+    if has_request_context():
+        g.escribio_primario = True
+
+
+@event.listens_for(Session, 'after_flush')
+def _despues_de_flush(session, flush_context):
+    _marcar_escritura(session)
+
+
+@event.listens_for(Session, 'do_orm_execute')
+def _sentencia_de_escritura(estado):
+    if estado.is_insert or estado.is_update or estado.is_delete:
+        _marcar_escritura(estado.session)
+
+
+@event.listens_for(Session, 'after_commit')
+def _despues_de_commit(session):
+    escribio = session.info.pop('escribio_primario', False)
+    if escribio and has_request_context() and current_app.config.get('DATABASE_REPLICA_URL'):
+        # El usuario lee del primario hasta que la réplica alcance su escritura
+        sesion_web['_primario_hasta'] = time.time() + current_app.config.get('DB_REPLICA_PEGAJOSO_SEG', 10)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _despues_de_rollback(session):
+    session.info.pop('escribio_primario', None)
+
+
+# --- BLOQUEO DE ESCRITURA ---
+def iniciar_escritura(session):
+    """En SQLite, abre la transacción de `session` con BEGIN IMMEDIATE; en otros motores no hace nada.
+
+    Así lo que se lee a continuación no cambia hasta el commit: otro escritor
+    espera (busy_timeout) en vez de decidir con los mismos datos.
+    """
+    conn = session.connection()
+    if conn.dialect.name != 'sqlite':
+        return
+    if not conn.connection.driver_connection.in_transaction: # pysqlite abre la transacción recién al escribir
+        conn.exec_driver_sql('BEGIN IMMEDIATE')
@@ -0,0 +1,57 @@
+from sqlalchemy import literal, select
+from sqlalchemy.orm import aliased, contains_eager, joinedload
+from app import db
+from .models import NotaVenta, Vehiculo
+
+# Opciones de carga reutilizables para que las vistas no disparen un SELECT
+# extra por cada relación que lee la plantilla (problema N+1).
+# Se usan con query.options(*...) o db.session.get(..., options=...).
+
+
+def nota_con_cliente_y_vehiculo():
+    """Para consultas de NotaVenta que ya hacen outerjoin(Cliente).outerjoin(Vehiculo).
+
+    Reutiliza esos JOIN para poblar nota.cliente y nota.vehiculo en vez de
+    cargarlos fila por fila desde la plantilla.
+    """
+    return [contains_eager(NotaVenta.cliente), contains_eager(NotaVenta.vehiculo)]
+
+
+def nota_completa():
+    """Todo lo que usan los PDF de una nota: cliente, vehículo, vendedor y pago."""
+    return [
+        joinedload(NotaVenta.cliente),
+        joinedload(NotaVenta.vehiculo),
+        joinedload(NotaVenta.vendedor),
+        joinedload(NotaVenta.pago)
+    ]
+
+
+def vehiculo_con_propietario():
+    """Propietario junto al vehículo (historial y contrato de consignación)."""
+    return [joinedload(Vehiculo.propietario)]
+
+
+def cargar_referencias(bloquear=False, **buscadas):
+    """{nombre: objeto o None} para cada nombre=(Modelo.columna_unica, valor), con un solo SELECT.
+
+    Cada búsqueda es un LEFT JOIN sobre una fila fija, así la consulta devuelve
+    siempre una fila aunque falten objetos. Los formularios la usan para validar
+    todas sus referencias de una vez, y la vista reutiliza los mismos objetos.
+
+    Con bloquear=True es un SELECT ... FOR UPDATE (las filas quedan bloqueadas
+    hasta el commit; SQLite lo ignora) y los objetos que ya estaban en la
+    sesión se actualizan con lo leído.
+    """
+    referencias = dict.fromkeys(buscadas)
+    buscadas = {nombre: (columna, valor) for nombre, (columna, valor) in buscadas.items() if valor not in (None, '')}
+    if not buscadas:
+        return referencias
+    alias = {nombre: aliased(columna.class_) for nombre, (columna, _) in buscadas.items()}
+    consulta = select(*alias.values()).select_from(select(literal(1).label('uno')).subquery())
+    for nombre, (columna, valor) in buscadas.items():
+        consulta = consulta.outerjoin(alias[nombre], getattr(alias[nombre], columna.key) == valor)
+    if bloquear:
+        consulta = consulta.with_for_update().execution_options(populate_existing=True)
+    referencias.update(zip(buscadas, db.session.execute(consulta).one()))
+    return referencias
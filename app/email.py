@@ -1,14 +1,30 @@
-from threading import Thread
-from flask import current_app
 from flask_mail import Message
-from app import mail
+from app import mail, cola
+from app.tareas import tarea
+
+
+@tarea('correo', lote=True)
+def enviar_correos(lista):
+    """Envía un lote de correos por una sola conexión SMTP (ver app/tareas.py)."""
+    errores = []
+    with mail.connect() as conexion:
+        for datos in lista:
+            msg = Message(datos['subject'], sender=datos['sender'], recipients=datos['recipients'])
+            msg.body = datos['text_body']
+            msg.html = datos['html_body']
+            try:
+                conexion.send(msg)
+                errores.append(None)
+            except Exception as e:
+                errores.append(e)
+    return errores
 
-def send_async_email(app, msg):
-    with app.app_context():
-        mail.send(msg)
 
 def send_email(subject, sender, recipients, text_body, html_body):
-    msg = Message(subject, sender=sender, recipients=recipients)
-    msg.body = text_body
-    msg.html = html_body
-    Thread(target=send_async_email, args=(current_app._get_current_object(), msg)).start()
\ No newline at end of file
+    cola.encolar('correo', {
+        'subject': subject,
+        'sender': sender,
+        'recipients': list(recipients),
+        'text_body': text_body,
+        'html_body': html_body
+    })
@@ -0,0 +1,175 @@
+"""Eventos tipados de la bitácora de vehículos y notas de venta.
+
+Cada evento es una fila de registro_historial con un código entero y sus datos
+en JSON (la nota, el estado anterior y el nuevo...). El texto que muestra la
+bitácora se arma al leerla (describir); las filas anteriores a los códigos
+quedan con código TEXTO y su descripcion.
+
+Los escribe la sesión: en cada flush, _registrar_eventos revisa las notas y
+vehículos nuevos, modificados o borrados y agrega sus eventos en la misma
+transacción, así ninguna ruta tiene que acordarse de anotarlos. Las
+sentencias masivas (importación, vencimiento de reservas) no pasan por el
+flush e insertan los suyos con evento().
+
+La bitácora solo crece: los eventos no se modifican; se mueven al archivo o se
+borran junto con el vehículo (ver app/historial.py).
+
+Tiempo en cada estado: INGRESO, CAMBIO_VEHICULO y REPUBLICADO llevan en `a` el
+estado del vehículo desde ese momento, así cada vehículo es una secuencia de
+tramos (estado, desde, hasta) que se lee en orden por el índice
+(vehiculo_patente, fecha). Cuenta desde que existen estos eventos: un vehículo
+ingresado antes parte en su primer cambio de estado.
+
+    flask tiempo-en-estados
+"""
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, inspect, insert, select, union_all
+from sqlalchemy.orm import Session
+from app import db
+from .models import NotaVenta, RegistroHistorial, RegistroHistorialArchivo, Vehiculo
+
+# Códigos (columna codigo) y sus datos
+TEXTO = 0           # registro de texto libre, en descripcion
+INGRESO = 1         # vehículo nuevo: a, [origen]
+NOTA_CREADA = 2     # nota, estado
+CAMBIO_NOTA = 3     # nota, de, a, [vencio_el]
+NOTA_ELIMINADA = 4  # nota, estado
+CAMBIO_VEHICULO = 5 # de, a (salvo volver a 'disponible')
+REPUBLICADO = 6     # de, a: el vehículo vuelve a 'disponible'
+
+TRANSICIONES = (INGRESO, CAMBIO_VEHICULO, REPUBLICADO)
+EN_INVENTARIO = ('disponible', 'reservado') # días en inventario = tiempo en estos estados
+
+FILAS_POR_LECTURA = 1000
+
+PLANTILLAS = {
+    INGRESO: "Vehículo ingresado al inventario en estado '{a}'.",
+    NOTA_CREADA: "Se creó la Nota de Venta #{nota} en estado '{estado}'.",
+    CAMBIO_NOTA: "Nota de Venta #{nota} cambió de '{de}' a '{a}'.",
+    NOTA_ELIMINADA: "Nota de Venta #{nota} fue eliminada.",
+    CAMBIO_VEHICULO: "Vehículo pasa de '{de}' a '{a}'.",
+    REPUBLICADO: "Vehículo vuelve a estado 'disponible' (estaba '{de}').",
+}
+RESERVA_VENCIDA = "Nota de Venta #{nota} cambió de '{de}' a '{a}': la reserva venció el {vencio_el}."
+IMPORTADO = "Vehículo ingresado por importación masiva."
+
+
+def evento(patente, codigo, fecha=None, **datos):
+    """Fila de registro_historial para insertar con una sentencia masiva."""
+    return {'vehiculo_patente': patente, 'fecha': fecha or datetime.now(), 'codigo': codigo, 'datos': datos}
+
+
+def describir(registro):
+    """Texto de la bitácora para una fila con codigo, datos y descripcion."""
+    if registro.codigo == TEXTO:
+        return registro.descripcion
+    datos = registro.datos or {}
+    if registro.codigo == INGRESO and datos.get('origen') == 'importacion':
+        return IMPORTADO
+    if registro.codigo == CAMBIO_NOTA and datos.get('vencio_el'):
+        return RESERVA_VENCIDA.format(**dict(datos, vencio_el=f"{date.fromisoformat(datos['vencio_el']):%d-%m-%Y}"))
+    return PLANTILLAS[registro.codigo].format(**datos)
+
+
+# --- ESCRITURA DESDE LA SESIÓN ---
+def _cambio_de_estado(obj):
+    """(anterior, nuevo) si el flush cambió el estado de `obj`, o None."""
+    historia = inspect(obj).attrs.estado.history
+    if not historia.added:
+        return None
+    anterior = historia.deleted[0] if historia.deleted else None
+    nuevo = historia.added[0]
+    return None if anterior == nuevo else (anterior, nuevo)
+
+
+def _eventos_de_nota(nota, grupo, ahora):
+    if grupo == 'new':
+        return [evento(nota.vehiculo_patente, NOTA_CREADA, ahora, nota=nota.id, estado=nota.estado)]
+    if grupo == 'deleted':
+        return [evento(nota.vehiculo_patente, NOTA_ELIMINADA, ahora, nota=nota.id, estado=nota.estado)]
+    cambio = _cambio_de_estado(nota)
+    if cambio is None:
+        return []
+    return [evento(nota.vehiculo_patente, CAMBIO_NOTA, ahora, nota=nota.id, de=cambio[0], a=cambio[1])]
+
+
+def _eventos_de_vehiculo(vehiculo, grupo, ahora):
+    if grupo == 'deleted':
+        return [] # su historial se borra con él
+    if grupo == 'new':
+        return [evento(vehiculo.patente, INGRESO, ahora, a=vehiculo.estado)]
+    cambio = _cambio_de_estado(vehiculo)
+    if cambio is None:
+        return []
+    codigo = REPUBLICADO if cambio[1] == 'disponible' else CAMBIO_VEHICULO
+    return [evento(vehiculo.patente, codigo, ahora, de=cambio[0], a=cambio[1])]
+
+
+@event.listens_for(Session, 'after_flush')
+def _registrar_eventos(session, flush_context):
+    grupos = {'new': session.new, 'dirty': session.dirty, 'deleted': session.deleted}
+    borrados = {obj.patente for obj in grupos['deleted'] if isinstance(obj, Vehiculo)}
+    ahora = datetime.now()
+    eventos = []
+    # Primero las notas: en la bitácora (más reciente arriba) el cambio del vehículo queda sobre la nota que lo causó
+    for modelo, eventos_de in ((NotaVenta, _eventos_de_nota), (Vehiculo, _eventos_de_vehiculo)):
+        for grupo, objetos in grupos.items():
+            for obj in objetos:
+                if isinstance(obj, modelo):
+                    eventos.extend(eventos_de(obj, grupo, ahora))
+    eventos = [e for e in eventos if e['vehiculo_patente'] and e['vehiculo_patente'] not in borrados]
+    if eventos:
+        session.connection().execute(insert(RegistroHistorial.__table__), eventos)
+
+
+# --- TIEMPO EN CADA ESTADO ---
+def consulta_transiciones(patente=None):
+    """Cambios de estado de los vehículos (vigentes y archivados) en orden (patente, fecha, id)."""
+    partes = []
+    for modelo in (RegistroHistorial, RegistroHistorialArchivo):
+        parte = select(modelo.vehiculo_patente, modelo.fecha, modelo.id, modelo.datos).where(
+            modelo.codigo.in_(TRANSICIONES))
+        if patente is not None:
+            parte = parte.where(modelo.vehiculo_patente == patente)
+        partes.append(parte)
+    return union_all(*partes).order_by('vehiculo_patente', 'fecha', 'id')
+
+
+def tramos(filas, hasta):
+    """(patente, estado, desde, hasta) por cada período que un vehículo pasó en un estado.
+
+    `filas` son las de consulta_transiciones; el último tramo de cada vehículo
+    termina en `hasta`.
+    """
+    actual = None
+    for patente, fecha, _, datos in filas:
+        if actual is not None:
+            yield (*actual, fecha if actual[0] == patente else hasta)
+        actual = (patente, datos.get('a'), fecha)
+    if actual is not None:
+        yield (*actual, hasta)
+
+
+def tiempo_en_estados(patente=None, hasta=None):
+    """{patente: {estado: timedelta}} con el tiempo que cada vehículo pasó en cada estado hasta `hasta`."""
+    hasta = hasta or datetime.now()
+    filas = db.session.execute(consulta_transiciones(patente).execution_options(yield_per=FILAS_POR_LECTURA))
+    tiempos = defaultdict(lambda: defaultdict(timedelta))
+    for patente_i, estado, desde, fin in tramos(filas, hasta):
+        tiempos[patente_i][estado] += fin - desde
+    return tiempos
+
+
+def resumen_tiempo_en_estados(hasta=None):
+    """Por estado (y 'en_inventario'): vehículos que pasaron por él, días promedio y máximo."""
+    dias = defaultdict(list)
+    for por_estado in tiempo_en_estados(hasta=hasta).values():
+        for estado, tiempo in por_estado.items():
+            dias[estado].append(tiempo.total_seconds() / 86400)
+        if any(estado in por_estado for estado in EN_INVENTARIO):
+            en_inventario = sum((por_estado.get(e, timedelta()) for e in EN_INVENTARIO), timedelta())
+            dias['en_inventario'].append(en_inventario.total_seconds() / 86400)
+    return {estado: {'vehiculos': len(valores), 'promedio_dias': round(sum(valores) / len(valores), 1),
+                     'maximo_dias': round(max(valores), 1)}
+            for estado, valores in sorted(dias.items())}
@@ -0,0 +1,316 @@
+"""Exportación masiva: notas de venta en PDF y listados en planilla.
+
+Contabilidad pide todas las notas de un mes de una vez. Hay dos formatos:
+
+    'zip'  un PDF por nota. Se renderizan en paralelo en un pool de procesos
+           (el armado con FPDF es CPU puro) y el ZIP se va enviando a medida
+           que salen los PDF, sin armar el archivo completo en memoria.
+    'pdf'  un solo PDF con todas las notas seguidas. FPDF arma el documento
+           entero en memoria y no permite unir PDFs hechos en otro proceso,
+           así que se dibuja en este proceso y tiene un máximo de notas
+           (PDF_EXPORT_MAX_NOTAS).
+
+Las notas se leen por lotes con sus relaciones (consultas.nota_completa) y
+los PDF que ya están en la caché de app/pdf_cache.py no se vuelven a renderizar.
+
+Los listados (notas de venta, inventario, vendidos y clientes) se exportan
+en CSV o XLSX con los mismos filtros de búsqueda de cada vista. La consulta
+trae solo las columnas de la planilla, en una sola sentencia con sus JOIN,
+y se recorre con yield_per (cursor del lado del servidor en MySQL), así la
+memoria no crece con la cantidad de filas:
+
+    'csv'   se envía a medida que se leen las filas
+    'xlsx'  openpyxl en modo write_only escribe las filas a un archivo
+            temporal; al terminar el archivo se envía por partes
+
+El texto que ingresan los usuarios (nombres, observaciones...) no se puede
+convertir en fórmula al abrir la planilla: en CSV las celdas que empiezan con
+=, +, -, @, tabulación o retorno de carro van precedidas de un apóstrofo, y en
+XLSX se guardan explícitamente como texto.
+"""
+import csv
+import io
+import multiprocessing
+import os
+import tempfile
+import threading
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import case, select
+from app import db
+from .models import NotaVenta, Cliente, Vehiculo, Pago, User
+from .reportes import ingreso_real_expr, _numero
+from .rut import formatear as formatear_rut
+from .consultas import nota_completa
+from .pdfs import PDF, datos_nota_venta, render_nota_venta, dibujar_nota_venta
+from . import pdf_cache
+from .instrumentacion import medir_pdf
+
+FORMATOS = ('zip', 'pdf')
+FORMATOS_PLANILLA = ('csv', 'xlsx')
+LOTE = 200 # notas por SELECT
+FILAS_POR_LECTURA = 1000 # yield_per de las planillas
+FILAS_POR_ENVIO = 500 # filas de CSV por parte de la respuesta
+INICIO_DE_FORMULA = ('=', '+', '-', '@', '\t', '\r')
+
+_pool = None
+_bloqueo_pool = threading.Lock()
+
+
+def _cantidad_procesos():
+    return current_app.config.get('PDF_EXPORT_PROCESOS') or os.cpu_count() or 1
+
+
+def _procesos():
+    """Pool compartido por todas las exportaciones de este worker (se crea al primer uso)."""
+    global _pool
+    with _bloqueo_pool:
+        if _pool is None:
+            # 'spawn' para no heredar conexiones de la base de datos ni hilos del servidor
+            _pool = ProcessPoolExecutor(max_workers=_cantidad_procesos(),
+                                        mp_context=multiprocessing.get_context('spawn'))
+        return _pool
+
+
+def _datos_notas(ids):
+    """Datos de cada nota en el orden de `ids`, leyendo LOTE notas por consulta."""
+    for inicio in range(0, len(ids), LOTE):
+        lote = ids[inicio:inicio + LOTE]
+        notas = NotaVenta.query.options(*nota_completa()).filter(NotaVenta.id.in_(lote)).all()
+        por_id = {nota.id: nota for nota in notas}
+        for id_nota in lote:
+            if id_nota in por_id:
+                yield datos_nota_venta(por_id[id_nota])
+
+
+def _renderizar(datos, pool, activo):
+    """Future con los bytes del PDF: inmediato si está en caché, si no en el pool."""
+    if activo:
+        contenido = pdf_cache.obtener('nota_venta', datos['id'], pdf_cache.clave('nota_venta', datos))
+        if contenido is not None:
+            futuro = Future()
+            futuro.set_result(contenido)
+            return futuro
+    return pool.submit(render_nota_venta, datos)
+
+
+def pdfs_en_paralelo(ids):
+    """Genera (id, bytes) en el orden de `ids`.
+
+    Se mantienen a lo más 2 renders por proceso en curso, así los PDF listos
+    que todavía no se envían no se acumulan en memoria.
+    """
+    pool = _procesos()
+    activo = current_app.config.get('PDF_CACHE_ACTIVO', True)
+    en_curso = 2 * _cantidad_procesos()
+    pendientes = deque()
+    for datos in _datos_notas(ids):
+        pendientes.append((datos['id'], _renderizar(datos, pool, activo)))
+        if len(pendientes) >= en_curso:
+            id_nota, futuro = pendientes.popleft()
+            yield id_nota, futuro.result()
+    while pendientes:
+        id_nota, futuro = pendientes.popleft()
+        yield id_nota, futuro.result()
+
+
+class _Salida:
+    """Destino de escritura sin seek para ZipFile: guarda lo escrito hasta que se vacía.
+
+    Al no poder volver atrás, ZipFile escribe el tamaño y CRC de cada archivo
+    después de sus datos (data descriptor), que es lo que permite enviarlo por partes.
+    """
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        self._partes.append(bytes(datos))
+        self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def vaciar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+def zip_notas(ids):
+    """Genera el ZIP por partes: cada parte es un PDF (o el índice final del archivo)."""
+    salida = _Salida()
+    # Los PDF ya vienen comprimidos; ZIP_STORED evita gastar CPU en volver a comprimirlos
+    with zipfile.ZipFile(salida, 'w', zipfile.ZIP_STORED) as archivo:
+        for id_nota, contenido in pdfs_en_paralelo(ids):
+            info = zipfile.ZipInfo(f'nota_venta_{id_nota}.pdf', datetime.now().timetuple()[:6])
+            archivo.writestr(info, contenido)
+            yield salida.vaciar()
+    yield salida.vaciar()
+
+
+def pdf_unico(ids):
+    """Un solo PDF con todas las notas, una tras otra."""
+    with medir_pdf('nota_venta_unico'):
+        pdf = PDF()
+        for datos in _datos_notas(ids):
+            dibujar_nota_venta(pdf, datos)
+        return bytes(pdf.output())
+
+
+# --- PLANILLAS (CSV / XLSX) ---
+class Columna(namedtuple('Columna', 'titulo expresion formato', defaults=(None,))):
+    """Columna de planilla: título, expresión SQL y función opcional para el valor."""
+
+
+def _nombre_completo(entidad):
+    return entidad.nombre + ' ' + entidad.apellido
+
+
+def _formatear_rut(valor):
+    return formatear_rut(valor) if valor else valor
+
+
+def _sin_microsegundos(valor):
+    return valor.replace(microsecond=0) if valor else valor
+
+
+def _ingreso(valor):
+    # Vacío en las notas no completadas, que no cuentan como ingreso
+    return None if valor is None else _numero(valor)
+
+
+def planilla_notas(*filtros):
+    """Notas de venta con cliente, vehículo, pago, vendedor e ingreso real (solo completadas)."""
+    columnas = [
+        Columna('Folio', NotaVenta.id),
+        Columna('Fecha venta', NotaVenta.fecha_venta),
+        Columna('Estado', NotaVenta.estado),
+        Columna('RUT cliente', NotaVenta.cliente_rut, _formatear_rut),
+        Columna('Cliente', _nombre_completo(Cliente)),
+        Columna('Teléfono cliente', Cliente.telefono),
+        Columna('Patente', NotaVenta.vehiculo_patente),
+        Columna('Marca', Vehiculo.marca),
+        Columna('Modelo', Vehiculo.modelo),
+        Columna('Año', Vehiculo.ano),
+        Columna('Tipo adquisición', Vehiculo.tipo_adquisicion),
+        Columna('Método de pago', Pago.metodo_pago),
+        Columna('Monto final', NotaVenta.monto_final),
+        Columna('Monto reserva', NotaVenta.monto_reserva),
+        Columna('Ingreso real', case((NotaVenta.estado == 'completada', ingreso_real_expr()), else_=None), _ingreso),
+        Columna('Vendedor', User.name),
+        Columna('Observaciones', NotaVenta.observaciones),
+    ]
+    consulta = select(*[c.expresion for c in columnas]).select_from(NotaVenta) \
+        .outerjoin(Cliente, NotaVenta.cliente_rut == Cliente.rut) \
+        .outerjoin(Vehiculo, NotaVenta.vehiculo_patente == Vehiculo.patente) \
+        .outerjoin(Pago, NotaVenta.pago_id == Pago.id) \
+        .outerjoin(User, NotaVenta.user_id == User.id) \
+        .where(*filtros).order_by(NotaVenta.id.desc())
+    return columnas, consulta
+
+
+def planilla_vehiculos(*filtros, orden=None):
+    columnas = [
+        Columna('Patente', Vehiculo.patente),
+        Columna('Marca', Vehiculo.marca),
+        Columna('Modelo', Vehiculo.modelo),
+        Columna('Año', Vehiculo.ano),
+        Columna('Color', Vehiculo.color),
+        Columna('Kilometraje', Vehiculo.kilometraje),
+        Columna('Valor', Vehiculo.valor),
+        Columna('Estado', Vehiculo.estado),
+        Columna('Tipo adquisición', Vehiculo.tipo_adquisicion),
+        Columna('Precio acordado', Vehiculo.precio_acordado),
+        Columna('Costo compra', Vehiculo.costo_compra),
+        Columna('RUT propietario', Vehiculo.propietario_rut, _formatear_rut),
+        Columna('Propietario', _nombre_completo(Cliente)),
+        Columna('N° chasis', Vehiculo.chasis_n),
+        Columna('N° motor', Vehiculo.motor_n),
+        Columna('Ingresado', Vehiculo.created_at, _sin_microsegundos),
+    ]
+    consulta = select(*[c.expresion for c in columnas]).select_from(Vehiculo) \
+        .outerjoin(Cliente, Vehiculo.propietario_rut == Cliente.rut) \
+        .where(*filtros).order_by(*(orden or [Vehiculo.marca, Vehiculo.patente]))
+    return columnas, consulta
+
+
+def planilla_clientes(*filtros):
+    columnas = [
+        Columna('RUT', Cliente.rut, _formatear_rut),
+        Columna('Nombre', Cliente.nombre),
+        Columna('Apellido', Cliente.apellido),
+        Columna('Teléfono', Cliente.telefono),
+        Columna('Dirección', Cliente.direccion),
+        Columna('Ciudad', Cliente.ciudad),
+        Columna('Registrado', Cliente.created_at, _sin_microsegundos),
+    ]
+    consulta = select(*[c.expresion for c in columnas]).where(*filtros).order_by(Cliente.nombre, Cliente.rut)
+    return columnas, consulta
+
+
+def filas_planilla(columnas, consulta):
+    """Genera las filas ya formateadas, leyendo FILAS_POR_LECTURA por vez."""
+    formatos = [(i, c.formato) for i, c in enumerate(columnas) if c.formato]
+    resultado = db.session.execute(consulta.execution_options(yield_per=FILAS_POR_LECTURA))
+    for fila in resultado:
+        fila = list(fila)
+        for i, formato in formatos:
+            fila[i] = formato(fila[i])
+        yield fila
+
+
+def parece_formula(valor):
+    """¿Excel interpretaría la celda como fórmula?"""
+    return isinstance(valor, str) and valor.startswith(INICIO_DE_FORMULA)
+
+
+def planilla_csv(columnas, consulta):
+    """CSV por partes. Separador ';' y BOM UTF-8 para que Excel en español lo abra directo."""
+    salida = io.StringIO()
+    escritor = csv.writer(salida, delimiter=';')
+    escritor.writerow([c.titulo for c in columnas])
+    yield '\ufeff' + salida.getvalue()
+    salida.seek(0)
+    salida.truncate()
+    for numero, fila in enumerate(filas_planilla(columnas, consulta), start=1):
+        escritor.writerow(["'" + v if parece_formula(v) else v for v in fila])
+        if numero % FILAS_POR_ENVIO == 0:
+            yield salida.getvalue()
+            salida.seek(0)
+            salida.truncate()
+    yield salida.getvalue()
+
+
+def planilla_xlsx(columnas, consulta, hoja='Datos'):
+    from openpyxl import Workbook
+    from openpyxl.cell import WriteOnlyCell
+    libro = Workbook(write_only=True)
+    destino = libro.create_sheet(hoja)
+
+    def texto(valor):
+        # openpyxl guarda como fórmula todo texto que empieza con '='
+        celda = WriteOnlyCell(destino, value=valor)
+        celda.data_type = 's'
+        return celda
+
+    destino.append([c.titulo for c in columnas])
+    for fila in filas_planilla(columnas, consulta):
+        destino.append([texto(v) if parece_formula(v) else v for v in fila])
+    with tempfile.TemporaryFile() as archivo:
+        libro.save(archivo)
+        archivo.seek(0)
+        while True:
+            parte = archivo.read(64 * 1024)
+            if not parte:
+                break
+            yield parte
+
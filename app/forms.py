@@ -1,13 +1,24 @@
 from flask_wtf import FlaskForm
-from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, DateField, TextAreaField, IntegerField
+from flask_wtf.file import FileField, FileRequired, FileAllowed
+from wtforms import StringField, PasswordField, BooleanField, SubmitField, SelectField, DateField, TextAreaField, IntegerField, HiddenField
 from wtforms.validators import DataRequired, Email, EqualTo, ValidationError, Length
-from app.models import User, Cliente, Vehiculo
+from app.models import User, Cliente, Vehiculo, NotaVenta
+from app.consultas import cargar_referencias
+from app.rut import normalizar as normalizar_rut, separar as separar_rut, digito_verificador
 from wtforms.validators import DataRequired, Length, Optional
 
 # ... dentro de tu VehiculoForm ...
 propietario_rut = StringField('RUT Propietario', validators=[Optional(), Length(max=12)])
 precio_acordado = IntegerField('Precio Acordado con Dueño $', validators=[Optional()], default=0)
 costo_compra = IntegerField('Costo de Compra Propia $', validators=[Optional()], default=0)
+
+def validar_version(campo, objeto):
+    """Rechaza el envío si `objeto` cambió desde que se abrió el formulario (campo oculto `version`)."""
+    if objeto is not None and campo.data and str(campo.data) != str(objeto.version):
+        campo.data = objeto.version # el siguiente envío se guarda sobre la versión actual
+        raise ValidationError('Otro usuario modificó este registro mientras usted lo editaba. '
+                              'Revise los datos y vuelva a guardar.')
+
 class ClienteForm(FlaskForm):
     rut = StringField('RUT (ej: 12345678-9)', validators=[DataRequired(), Length(max=12)])
     nombre = StringField('Nombre', validators=[DataRequired(), Length(max=100)])
@@ -18,40 +29,21 @@ class ClienteForm(FlaskForm):
     submit = SubmitField('Guardar Cliente')
 
     def validate_rut(self, rut):
-        # Limpia el RUT para la validación (Módulo 11)
-        rut_limpio = rut.data.replace(".", "").replace("-", "").upper()
+        # Limpia el RUT para la validación (Módulo 11, ver app/rut.py)
+        rut_limpio = normalizar_rut(rut.data)
         if len(rut_limpio) < 2:
             raise ValidationError('RUT demasiado corto.')
-            
-        cuerpo = rut_limpio[:-1]
-        dv_ingresado = rut_limpio[-1]
 
-        if not cuerpo.isdigit() or dv_ingresado not in '0123456789K':
+        partes = separar_rut(rut_limpio)
+        if partes is None:
              raise ValidationError('RUT inválido. Use solo números y K si corresponde.')
-        
-        suma = 0
-        multiplo = 2
-        for caracter in reversed(cuerpo):
-            suma += int(caracter) * multiplo
-            multiplo += 1
-            if multiplo == 8:
-                multiplo = 2
-                
-        resto = suma % 11
-        dv_calculado = 11 - resto
-        
-        if dv_calculado == 11:
-            dv_esperado = '0'
-        elif dv_calculado == 10:
-            dv_esperado = 'K'
-        else:
-            dv_esperado = str(dv_calculado)
-
-        if dv_ingresado != dv_esperado:
+
+        cuerpo, dv_ingresado = partes
+        if dv_ingresado != digito_verificador(cuerpo):
             raise ValidationError('RUT inválido. El dígito verificador no es correcto matemáticamente.')
 
         # Valida contra la base de datos (tu BD guarda en minúsculas)
-        cliente = Cliente.query.get(rut_limpio.lower())
+        cliente = Cliente.query.get(rut_limpio)
         if cliente:
             raise ValidationError('Este RUT ya está registrado en el sistema.')
 
@@ -73,26 +65,47 @@ class VehiculoForm(FlaskForm):
     motor_n = StringField('N° Motor', validators=[DataRequired(), Length(max=100)])
     valor = IntegerField('Valor de Venta en Automotora ($)', validators=[DataRequired()])
     descripcion = TextAreaField('Descripción')
+    version = HiddenField()
     submit = SubmitField('Guardar Vehículo')
 
+    def __init__(self, *args, **kwargs):
+        # Al editar, el propio vehículo no cuenta como duplicado
+        self.original_patente = kwargs.pop('original_patente', None)
+        super(VehiculoForm, self).__init__(*args, **kwargs)
+        self.referencias = {}
+
+    def validate(self, extra_validators=None):
+        # Un solo SELECT para todos los validate_* (ver cargar_referencias)
+        self.referencias = cargar_referencias(
+            patente=(Vehiculo.patente, self.patente.data),
+            chasis=(Vehiculo.chasis_n, self.chasis_n.data),
+            motor=(Vehiculo.motor_n, self.motor_n.data),
+            propietario=(Cliente.rut, normalizar_rut(self.propietario_rut.data or '')),
+            original=(Vehiculo.patente, self.original_patente),
+        )
+        return super(VehiculoForm, self).validate(extra_validators)
+
+    def validate_version(self, version):
+        validar_version(version, self.referencias.get('original'))
+
+    def _registrado(self, nombre):
+        vehiculo = self.referencias.get(nombre)
+        return vehiculo is not None and vehiculo.patente != self.original_patente
+
     def validate_patente(self, patente):
-        vehiculo = Vehiculo.query.get(patente.data)
-        if vehiculo:
+        if self._registrado('patente'):
             raise ValidationError('Esta patente ya está registrada.')
 
     def validate_chasis_n(self, chasis_n):
-        vehiculo = Vehiculo.query.filter_by(chasis_n=chasis_n.data).first()
-        if vehiculo:
+        if self._registrado('chasis'):
             raise ValidationError('Este número de chasis ya está registrado.')
 
     def validate_motor_n(self, motor_n):
-        vehiculo = Vehiculo.query.filter_by(motor_n=motor_n.data).first()
-        if vehiculo:
+        if self._registrado('motor'):
             raise ValidationError('Este número de motor ya está registrado.')
             
     def validate_propietario_rut(self, propietario_rut):
-        rut_limpio = propietario_rut.data.replace(".", "").replace("-", "").lower()
-        if not Cliente.query.get(rut_limpio):
+        if not self.referencias.get('propietario'):
             raise ValidationError('Este RUT no está en la base de datos. Por favor, registre al Cliente primero.')
 
 class LoginForm(FlaskForm):
@@ -134,19 +147,36 @@ class NotaVentaForm(FlaskForm):
         ('reservada', 'Reservada')
     ], validators=[DataRequired()])
     observaciones = TextAreaField('Observaciones')
+    version = HiddenField()
     submit = SubmitField('Guardar Nota de Venta')
 
     def __init__(self, *args, **kwargs):
         self.nota_id = kwargs.pop('nota_id', None)
         super(NotaVentaForm, self).__init__(*args, **kwargs)
+        self.referencias = {}
+
+    def validate(self, extra_validators=None):
+        # Cliente, vehículo y nota en un solo SELECT; la vista reutiliza referencias['vehiculo'].
+        # Las filas quedan bloqueadas hasta el commit (la vista abre la transacción de
+        # escritura antes de validar): dos ventas del mismo vehículo no pueden ver ambas
+        # 'disponible' (ver app/conexiones.py)
+        self.referencias = cargar_referencias(
+            bloquear=True,
+            cliente=(Cliente.rut, normalizar_rut(self.cliente_rut.data or '')),
+            vehiculo=(Vehiculo.patente, self.vehiculo_patente.data),
+            nota=(NotaVenta.id, self.nota_id),
+        )
+        return super(NotaVentaForm, self).validate(extra_validators)
+
+    def validate_version(self, version):
+        validar_version(version, self.referencias.get('nota'))
 
     def validate_cliente_rut(self, cliente_rut):
-        rut_limpio = cliente_rut.data.replace(".", "").replace("-", "").lower()
-        if not Cliente.query.get(rut_limpio):
+        if not self.referencias.get('cliente'):
             raise ValidationError('Este RUT de cliente no existe en la base de datos.')
 
     def validate_vehiculo_patente(self, vehiculo_patente):
-        vehiculo = Vehiculo.query.get(vehiculo_patente.data)
+        vehiculo = self.referencias.get('vehiculo')
         if not vehiculo:
             raise ValidationError('Esta patente de vehículo no existe en la base de datos.')
         
@@ -156,9 +186,7 @@ class NotaVentaForm(FlaskForm):
             
         # Si NO está disponible, revisamos si es el vehículo de la nota que estamos editando
         if self.nota_id:
-            from app.models import NotaVenta # Importación local
-            from app import db
-            nota_actual = db.session.get(NotaVenta, self.nota_id)
+            nota_actual = self.referencias.get('nota')
 
             if nota_actual and nota_actual.vehiculo_patente == vehiculo.patente:
                 return 
@@ -173,4 +201,15 @@ class ResetPasswordForm(FlaskForm):
     password = PasswordField('Nueva Contraseña', validators=[DataRequired()])
     password2 = PasswordField(
         'Repetir Nueva Contraseña', validators=[DataRequired(), EqualTo('password')])
-    submit = SubmitField('Resetear Contraseña')
\ No newline at end of file
+    submit = SubmitField('Resetear Contraseña')
+
+class ImportacionForm(FlaskForm):
+    tipo = SelectField('Importar', choices=[
+        ('clientes', 'Clientes'),
+        ('vehiculos', 'Vehículos')
+    ], validators=[DataRequired()])
+    archivo = FileField('Archivo CSV o Excel (.xlsx)', validators=[
+        FileRequired('Seleccione un archivo.'),
+        FileAllowed(['csv', 'txt', 'xlsx'], 'Use un archivo CSV o Excel (.xlsx).')
+    ])
+    submit = SubmitField('Importar')
@@ -0,0 +1,90 @@
+"""Bitácora de eventos por vehículo: lectura por páginas, archivo y borrado masivo.
+
+La bitácora se lee de a POR_PAGINA eventos, del más reciente al más antiguo,
+con un cursor (fecha, id) sobre el índice (vehiculo_patente, fecha): cada
+página cuesta lo mismo sin importar cuántos eventos tenga el vehículo. Los
+eventos tienen código y datos (ver app/eventos.py); el texto de cada uno se
+arma al leer la página.
+
+    flask archivar-historial --dias 365
+
+mueve los eventos más antiguos a registro_historial_archivo, una tabla
+compacta (sin FK ni índices secundarios). La bitácora los sigue mostrando al
+final, marcados como archivados: cada página mezcla ambas tablas.
+
+Al eliminar un vehículo su historial se borra con un DELETE por tabla, sin
+cargar los registros en la sesión.
+"""
+from collections import namedtuple
+from sqlalchemy import delete, func, insert, literal, select
+from app import db
+from .eventos import describir
+from .models import RegistroHistorial, RegistroHistorialArchivo
+from .paginacion import _despues_de, codificar_cursor, decodificar_cursor
+
+POR_PAGINA = 50
+LOTE = 5000
+
+Evento = namedtuple('Evento', 'id fecha codigo datos descripcion archivado')
+
+
+# --- LECTURA ---
+def consulta_pagina(modelo, patente, valores=None, limite=POR_PAGINA + 1):
+    """SELECT de los eventos de `modelo` anteriores a la clave (fecha, id) `valores`."""
+    consulta = select(modelo.id, modelo.fecha, modelo.codigo, modelo.datos, modelo.descripcion,
+                      literal(modelo is RegistroHistorialArchivo).label('archivado')
+                      ).where(modelo.vehiculo_patente == patente)
+    if valores is not None:
+        consulta = consulta.where(_despues_de([modelo.fecha, modelo.id], valores, True))
+    return consulta.order_by(modelo.fecha.desc(), modelo.id.desc()).limit(limite)
+
+
+def pagina_historial(patente, cursor=None, por_pagina=POR_PAGINA):
+    """(eventos, cursor_siguiente) de la bitácora; cursor_siguiente es None en la última página."""
+    valores = decodificar_cursor(cursor, [RegistroHistorial.fecha, RegistroHistorial.id]) if cursor else None
+    eventos = []
+    for modelo in (RegistroHistorial, RegistroHistorialArchivo):
+        eventos.extend(db.session.execute(consulta_pagina(modelo, patente, valores, por_pagina + 1)).all())
+    eventos.sort(key=lambda e: (e.fecha, e.id), reverse=True)
+
+    hay_mas = len(eventos) > por_pagina
+    eventos = [Evento(e.id, e.fecha, e.codigo, e.datos, describir(e), e.archivado) for e in eventos[:por_pagina]]
+    siguiente = codificar_cursor([eventos[-1].fecha, eventos[-1].id]) if hay_mas else None
+    return eventos, siguiente
+
+
+# --- ARCHIVO ---
+def archivar_historial(antes_de, lote=LOTE, avance=None):
+    """Mueve a registro_historial_archivo los eventos con fecha anterior a `antes_de`.
+
+    Recorre la tabla por rangos de id: cada lote es un INSERT ... SELECT y un
+    DELETE con la misma condición, en su propia transacción. Devuelve cuántos
+    eventos se movieron.
+    """
+    avance = avance or (lambda movidos: None)
+    maximo = db.session.scalar(select(func.max(RegistroHistorial.id))) or 0
+    columnas = ['id', 'vehiculo_patente', 'fecha', 'codigo', 'datos', 'descripcion']
+    movidos = 0
+    for desde in range(0, maximo, lote):
+        condicion = (RegistroHistorial.id > desde, RegistroHistorial.id <= desde + lote,
+                     RegistroHistorial.fecha < antes_de)
+        db.session.execute(insert(RegistroHistorialArchivo).from_select(columnas, select(
+            RegistroHistorial.id, RegistroHistorial.vehiculo_patente, RegistroHistorial.fecha,
+            RegistroHistorial.codigo, RegistroHistorial.datos, RegistroHistorial.descripcion).where(*condicion)))
+        resultado = db.session.execute(delete(RegistroHistorial).where(*condicion),
+                                       execution_options={'synchronize_session': False})
+        db.session.commit()
+        if resultado.rowcount:
+            movidos += resultado.rowcount
+            avance(movidos)
+    return movidos
+
+
+# --- BORRADO ---
+def eliminar_historial(patente):
+    """Borra el historial del vehículo (vigente y archivado) con un DELETE por tabla. No hace commit."""
+    total = 0
+    for modelo in (RegistroHistorial, RegistroHistorialArchivo):
+        total += db.session.execute(delete(modelo).where(modelo.vehiculo_patente == patente),
+                                    execution_options={'synchronize_session': False}).rowcount
+    return total
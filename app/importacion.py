@@ -0,0 +1,329 @@
+"""Importación masiva de clientes y vehículos desde CSV o Excel (.xlsx).
+
+El archivo se lee fila a fila y se procesa en lotes de IMPORTACION_LOTE:
+
+1. Cada fila se convierte y valida por sí sola (obligatorios, largos,
+   números, RUT con app/rut.validar_lote para todo el lote).
+2. La unicidad se revisa con un SELECT ... IN por columna y por lote (RUT;
+   patente, chasis y motor) en vez de una consulta por fila, y contra las
+   filas anteriores del mismo archivo.
+3. Las filas válidas se insertan con executemany en una transacción por
+   lote, junto con el registro inicial de historial de cada vehículo y sus
+   entradas en el índice de búsqueda.
+
+Un lote que falla al guardar (p. ej. alguien creó la misma patente desde
+el formulario mientras tanto) se reintenta fila por fila, así solo quedan
+fuera las filas en conflicto. Las filas rechazadas se devuelven en
+`Resultado.errores` y se pueden escribir como informe CSV.
+"""
+import csv
+import io
+import os
+import unicodedata
+import uuid
+from collections import namedtuple
+from datetime import datetime
+from itertools import chain, islice
+from flask import current_app
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from app import db
+from .models import Cliente, Vehiculo, RegistroHistorial
+from .busqueda import indexar
+from .eventos import INGRESO, evento
+from .rut import normalizar as normalizar_rut, validar_lote
+
+TIPOS = ('clientes', 'vehiculos')
+TIPOS_ADQUISICION = ('consignacion', 'compra_directa')
+
+
+class Campo(namedtuple('Campo', 'nombre tipo requerido largo defecto')):
+    """Columna importable: tipo 'texto', 'entero' o 'rut'."""
+
+
+COLUMNAS = {
+    'clientes': (
+        Campo('rut', 'rut', True, 10, None),
+        Campo('nombre', 'texto', True, 100, None),
+        Campo('apellido', 'texto', True, 100, None),
+        Campo('telefono', 'texto', False, 15, None),
+        Campo('direccion', 'texto', False, 200, None),
+        Campo('ciudad', 'texto', False, 100, None),
+    ),
+    'vehiculos': (
+        Campo('patente', 'texto', True, 8, None),
+        Campo('marca', 'texto', True, 50, None),
+        Campo('modelo', 'texto', True, 50, None),
+        Campo('ano', 'entero', True, None, None),
+        Campo('color', 'texto', False, 30, None),
+        Campo('chasis_n', 'texto', True, 100, None),
+        Campo('motor_n', 'texto', True, 100, None),
+        Campo('valor', 'entero', True, None, None),
+        Campo('descripcion', 'texto', False, None, None),
+        Campo('kilometraje', 'entero', True, None, None),
+        Campo('tipo_adquisicion', 'texto', False, 50, 'consignacion'),
+        Campo('propietario_rut', 'rut', False, 10, None),
+        Campo('precio_acordado', 'entero', False, None, 0),
+        Campo('costo_compra', 'entero', False, None, 0),
+    ),
+}
+
+# Columnas únicas en la base: (campo de la fila, columna del modelo)
+UNICAS = {
+    'clientes': (('rut', Cliente.rut),),
+    'vehiculos': (('patente', Vehiculo.patente), ('chasis_n', Vehiculo.chasis_n), ('motor_n', Vehiculo.motor_n)),
+}
+
+# Otros nombres con que suelen venir los encabezados
+ALIAS = {
+    'ano': ('anio', 'año'), 'chasis_n': ('chasis', 'n_chasis', 'numero_chasis'),
+    'motor_n': ('motor', 'n_motor', 'numero_motor'), 'propietario_rut': ('rut_propietario', 'propietario'),
+    'tipo_adquisicion': ('tipo', 'adquisicion'), 'telefono': ('fono',),
+}
+
+
+class Resultado:
+    def __init__(self):
+        self.filas = 0
+        self.insertadas = 0
+        self.errores = [] # (fila, campo, mensaje)
+
+    @property
+    def rechazadas(self):
+        return len({fila for fila, _, _ in self.errores})
+
+    def informe_csv(self, destino):
+        """Escribe los errores (una línea por problema) en `destino`, ruta o archivo de texto."""
+        archivo = open(destino, 'w', newline='', encoding='utf-8-sig') if isinstance(destino, str) else destino
+        try:
+            escritor = csv.writer(archivo)
+            escritor.writerow(['fila', 'campo', 'error'])
+            escritor.writerows(self.errores)
+        finally:
+            if archivo is not destino:
+                archivo.close()
+
+
+class ErrorImportacion(Exception):
+    """El archivo no se puede leer (formato, encabezados)."""
+
+
+# --- LECTURA ---
+def _clave_encabezado(texto):
+    texto = unicodedata.normalize('NFKD', str(texto or '')).encode('ascii', 'ignore').decode()
+    texto = '_'.join(texto.strip().lower().replace('°', '').replace('.', ' ').split())
+    for nombre, alias in ALIAS.items():
+        if texto in alias:
+            return nombre
+    return texto
+
+
+def _mapear_encabezados(tipo, encabezados):
+    claves = [_clave_encabezado(e) for e in encabezados]
+    faltan = [c.nombre for c in COLUMNAS[tipo] if c.requerido and c.nombre not in claves]
+    if faltan:
+        raise ErrorImportacion(f"Faltan columnas obligatorias: {', '.join(faltan)}.")
+    return claves
+
+
+def _filas_csv(tipo, archivo):
+    texto = io.TextIOWrapper(archivo, encoding='utf-8-sig', errors='replace', newline='')
+    primera = texto.readline()
+    # Excel en español guarda con ';'
+    separador = ';' if primera.count(';') > primera.count(',') else ','
+    lector = csv.reader(chain([primera], texto), delimiter=separador)
+    claves = _mapear_encabezados(tipo, next(lector, []))
+    for numero, valores in enumerate(lector, start=2):
+        if any(v.strip() for v in valores):
+            yield numero, dict(zip(claves, valores))
+
+
+def _filas_xlsx(tipo, archivo):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ErrorImportacion('Para importar archivos .xlsx se necesita el paquete openpyxl.')
+    # read_only recorre la hoja sin cargarla entera en memoria
+    libro = load_workbook(archivo, read_only=True, data_only=True)
+    try:
+        filas = libro.active.iter_rows(values_only=True)
+        claves = _mapear_encabezados(tipo, next(filas, ()))
+        for numero, valores in enumerate(filas, start=2):
+            if any(v not in (None, '') for v in valores):
+                yield numero, dict(zip(claves, valores))
+    finally:
+        libro.close()
+
+
+def leer(tipo, archivo, nombre):
+    """Iterador de (número de fila, {columna: valor}) según la extensión de `nombre`."""
+    extension = nombre.rsplit('.', 1)[-1].lower() if '.' in nombre else ''
+    if extension == 'xlsx':
+        return _filas_xlsx(tipo, archivo)
+    if extension in ('csv', 'txt'):
+        return _filas_csv(tipo, archivo)
+    raise ErrorImportacion('Formato no soportado: use CSV o Excel (.xlsx).')
+
+
+# --- VALIDACIÓN ---
+def _entero(valor):
+    if isinstance(valor, (int, float)):
+        if isinstance(valor, float) and not valor.is_integer():
+            raise ValueError
+        return int(valor)
+    # "$8.990.000" o "8 990 000": los puntos son separadores de miles
+    return int(valor.replace('$', '').replace('.', '').replace(' ', ''))
+
+
+def _convertir(tipo, numero, crudo, errores):
+    """Fila lista para insertar, o None si tiene errores (que se agregan a `errores`)."""
+    fila = {}
+    valida = True
+    for campo in COLUMNAS[tipo]:
+        valor = crudo.get(campo.nombre)
+        if isinstance(valor, str) or valor is None:
+            valor = (valor or '').strip()
+        if valor == '':
+            if campo.requerido:
+                errores.append((numero, campo.nombre, 'Campo obligatorio.'))
+                valida = False
+            fila[campo.nombre] = campo.defecto
+            continue
+
+        if campo.tipo == 'entero':
+            try:
+                valor = _entero(valor)
+            except ValueError:
+                errores.append((numero, campo.nombre, f'"{valor}" no es un número entero.'))
+                valida = False
+                continue
+        else:
+            valor = str(valor)
+            if campo.tipo == 'rut':
+                valor = normalizar_rut(valor)
+            elif campo.nombre == 'patente':
+                valor = valor.upper().replace('-', '').replace(' ', '')
+            if campo.largo and len(valor) > campo.largo:
+                errores.append((numero, campo.nombre, f'Supera los {campo.largo} caracteres.'))
+                valida = False
+                continue
+        fila[campo.nombre] = valor
+
+    if tipo == 'vehiculos' and fila.get('tipo_adquisicion') not in TIPOS_ADQUISICION + (None,):
+        errores.append((numero, 'tipo_adquisicion', f"Debe ser {' o '.join(TIPOS_ADQUISICION)}."))
+        valida = False
+    return fila if valida else None
+
+
+def _validar_lote(tipo, lote, vistos, errores):
+    """Filtra el lote: RUT, duplicados en el archivo, en la base y propietarios inexistentes."""
+    candidatas = []
+    for numero, crudo in lote:
+        fila = _convertir(tipo, numero, crudo, errores)
+        if fila is not None:
+            candidatas.append((numero, fila))
+
+    campos_rut = [c.nombre for c in COLUMNAS[tipo] if c.tipo == 'rut']
+    for campo in campos_rut:
+        con_rut = [(numero, fila) for numero, fila in candidatas if fila[campo]]
+        validos = validar_lote([fila[campo] for _, fila in con_rut], normalizados=True)
+        malos = {numero for (numero, _), ok in zip(con_rut, validos) if not ok}
+        errores.extend((numero, campo, 'RUT inválido.') for numero in sorted(malos))
+        candidatas = [(numero, fila) for numero, fila in candidatas if numero not in malos]
+
+    rechazadas = set()
+    if tipo == 'vehiculos':
+        ruts = {fila['propietario_rut'] for _, fila in candidatas if fila['propietario_rut']}
+        registrados = set(db.session.scalars(select(Cliente.rut).where(Cliente.rut.in_(ruts)))) if ruts else set()
+        for numero, fila in candidatas:
+            if fila['propietario_rut'] and fila['propietario_rut'] not in registrados:
+                errores.append((numero, 'propietario_rut', 'El propietario no está registrado como cliente.'))
+                rechazadas.add(numero)
+
+    existentes = {}
+    for campo, columna in UNICAS[tipo]:
+        valores = {fila[campo] for _, fila in candidatas}
+        existentes[campo] = set(db.session.scalars(select(columna).where(columna.in_(valores)))) if valores else set()
+    for numero, fila in candidatas:
+        for campo, _ in UNICAS[tipo]:
+            if fila[campo] in existentes[campo]:
+                errores.append((numero, campo, f'"{fila[campo]}" ya está registrado.'))
+                rechazadas.add(numero)
+            elif fila[campo] in vistos[campo]:
+                errores.append((numero, campo, f'"{fila[campo]}" está repetido en el archivo.'))
+                rechazadas.add(numero)
+        if numero not in rechazadas:
+            for campo, _ in UNICAS[tipo]:
+                vistos[campo].add(fila[campo])
+
+    return [(numero, fila) for numero, fila in candidatas if numero not in rechazadas]
+
+
+# --- ESCRITURA ---
+def _guardar(tipo, filas):
+    if tipo == 'clientes':
+        db.session.execute(insert(Cliente), filas)
+        indexar('cliente', [(f['rut'], f"{f['rut']} {f['nombre']} {f['apellido']}") for f in filas])
+    else:
+        db.session.execute(insert(Vehiculo), filas)
+        db.session.execute(insert(RegistroHistorial), [ # sin flush: el evento de ingreso va aparte (app/eventos.py)
+            evento(f['patente'], INGRESO, a=f.get('estado', 'disponible'), origen='importacion') for f in filas])
+        indexar('vehiculo', [(f['patente'], f"{f['patente']} {f['marca']} {f['modelo']}") for f in filas])
+
+
+def _guardar_lote(tipo, validas, resultado):
+    try:
+        _guardar(tipo, [fila for _, fila in validas])
+        db.session.commit()
+        resultado.insertadas += len(validas)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    # Conflicto con datos que aparecieron durante la importación: fila por fila
+    for numero, fila in validas:
+        try:
+            with db.session.begin_nested():
+                _guardar(tipo, [fila])
+            resultado.insertadas += 1
+        except IntegrityError:
+            resultado.errores.append((numero, '', 'Conflicto con un registro guardado durante la importación.'))
+    db.session.commit()
+
+
+def importar(tipo, filas, lote=None):
+    """Valida e inserta `filas` (de leer()) por lotes. Devuelve un Resultado."""
+    if tipo not in TIPOS:
+        raise ErrorImportacion(f'Tipo de importación desconocido: {tipo}.')
+    lote = lote or current_app.config.get('IMPORTACION_LOTE', 500)
+    resultado = Resultado()
+    vistos = {campo: set() for campo, _ in UNICAS[tipo]}
+    filas = iter(filas)
+    while True:
+        bloque = list(islice(filas, lote))
+        if not bloque:
+            break
+        resultado.filas += len(bloque)
+        validas = _validar_lote(tipo, bloque, vistos, resultado.errores)
+        if validas:
+            _guardar_lote(tipo, validas, resultado)
+    resultado.errores.sort(key=lambda e: e[0])
+    return resultado
+
+
+def directorio_informes():
+    directorio = os.path.join(current_app.instance_path, 'importaciones')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def guardar_informe(tipo, resultado):
+    """Guarda el informe de errores en instance/importaciones y devuelve el nombre del archivo."""
+    nombre = f"errores_{tipo}_{datetime.now():%Y%m%d-%H%M%S}_{uuid.uuid4().hex[:8]}.csv"
+    resultado.informe_csv(os.path.join(directorio_informes(), nombre))
+    return nombre
+
+
+def importar_archivo(tipo, ruta, lote=None):
+    with open(ruta, 'rb') as archivo:
+        return importar(tipo, leer(tipo, archivo, os.path.basename(ruta)), lote)
@@ -0,0 +1,278 @@
+"""Instrumentación opcional por request (INSTRUMENTACION=1).
+
+Por cada request se mide el tiempo total, la cantidad y el tiempo de las
+sentencias SQL (eventos del engine de SQLAlchemy), el tiempo de render de las
+plantillas (señales de Flask) y el de los PDF (medir_pdf en pdf_cache). Con
+eso se obtiene:
+
+    /metricas                  texto en formato Prometheus, acumulado por
+                               endpoint desde que arrancó el proceso (con
+                               gunicorn, cada worker tiene sus propias cifras);
+                               exige INSTRUMENTACION_TOKEN o, sin él, solo
+                               responde a la máquina local
+    log de requests lentos     sobre INSTRUMENTACION_LENTO_MS, con las
+                               sentencias más lentas de ese request
+    INSTRUMENTACION_PERFIL_DIR un archivo cProfile (.prof) por request, para
+                               abrir con pstats o snakeviz
+
+Desactivada, ningún evento se registra y medir_pdf no hace nada.
+"""
+import cProfile
+import hmac
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from flask import Blueprint, Response, abort, current_app, g, has_request_context, request, template_rendered, before_render_template
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import db, cola, cache, conexiones
+
+BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+MAX_SENTENCIAS = 200 # por request, para el log de lentos
+SENTENCIAS_EN_LOG = 5
+LOCALES = ('127.0.0.1', '::1')
+
+bp = Blueprint('instrumentacion', __name__)
+
+_eventos_registrados = False
+
+
+class _Medicion:
+    """Lo medido durante un request (vive en g)."""
+
+    def __init__(self):
+        self.inicio = time.perf_counter()
+        self.sql_cantidad = 0
+        self.sql_segundos = 0.0
+        self.sentencias = []
+        self.plantillas = []
+        self.plantillas_segundos = 0.0
+        self.pdf_segundos = 0.0
+        self.perfil = None
+
+
+class Metricas:
+    """Acumulados del proceso, protegidos por un lock."""
+
+    def __init__(self):
+        self._bloqueo = threading.Lock()
+        self.requests = defaultdict(int)          # (endpoint, metodo, estado) -> cantidad
+        self.duracion = defaultdict(lambda: [0] * (len(BUCKETS) + 1)) # endpoint -> cuentas por bucket
+        self.duracion_suma = defaultdict(float)
+        self.duracion_cantidad = defaultdict(int)
+        self.sql_cantidad = defaultdict(int)
+        self.sql_segundos = defaultdict(float)
+        self.plantilla_cantidad = defaultdict(int)
+        self.plantilla_segundos = defaultdict(float)
+        self.pdf_cantidad = defaultdict(int)
+        self.pdf_segundos = defaultdict(float)
+
+    def registrar_request(self, endpoint, metodo, estado, m, segundos):
+        with self._bloqueo:
+            self.requests[(endpoint, metodo, estado)] += 1
+            cuentas = self.duracion[endpoint]
+            for i, limite in enumerate(BUCKETS):
+                if segundos <= limite:
+                    cuentas[i] += 1
+                    break
+            else:
+                cuentas[-1] += 1
+            self.duracion_suma[endpoint] += segundos
+            self.duracion_cantidad[endpoint] += 1
+            self.sql_cantidad[endpoint] += m.sql_cantidad
+            self.sql_segundos[endpoint] += m.sql_segundos
+            for nombre, duracion in m.plantillas:
+                self.plantilla_cantidad[nombre] += 1
+                self.plantilla_segundos[nombre] += duracion
+
+    def registrar_pdf(self, tipo, segundos):
+        with self._bloqueo:
+            self.pdf_cantidad[tipo] += 1
+            self.pdf_segundos[tipo] += segundos
+
+    def texto(self, extras=None):
+        """Formato de exposición de Prometheus (text/plain; version=0.0.4)."""
+        lineas = []
+
+        def serie(nombre, tipo, ayuda, valores):
+            lineas.append(f'# HELP {nombre} {ayuda}')
+            lineas.append(f'# TYPE {nombre} {tipo}')
+            for etiquetas, valor in valores:
+                lineas.append(f'{nombre}{_etiquetas(etiquetas)} {valor}')
+
+        with self._bloqueo:
+            serie('automotora_requests_total', 'counter', 'Requests atendidos.',
+                  [({'endpoint': e, 'metodo': m, 'estado': s}, n) for (e, m, s), n in sorted(self.requests.items())])
+
+            lineas.append('# HELP automotora_request_segundos Duración de los requests.')
+            lineas.append('# TYPE automotora_request_segundos histogram')
+            for endpoint in sorted(self.duracion):
+                acumulado = 0
+                for limite, cuenta in zip(BUCKETS + ('+Inf',), self.duracion[endpoint]):
+                    acumulado += cuenta
+                    lineas.append(f'automotora_request_segundos_bucket{_etiquetas({"endpoint": endpoint, "le": limite})} {acumulado}')
+                lineas.append(f'automotora_request_segundos_sum{_etiquetas({"endpoint": endpoint})} {self.duracion_suma[endpoint]:.6f}')
+                lineas.append(f'automotora_request_segundos_count{_etiquetas({"endpoint": endpoint})} {self.duracion_cantidad[endpoint]}')
+
+            serie('automotora_sql_sentencias_total', 'counter', 'Sentencias SQL ejecutadas por endpoint.',
+                  [({'endpoint': e}, n) for e, n in sorted(self.sql_cantidad.items())])
+            serie('automotora_sql_segundos_total', 'counter', 'Tiempo en SQL por endpoint.',
+                  [({'endpoint': e}, f'{s:.6f}') for e, s in sorted(self.sql_segundos.items())])
+            serie('automotora_plantilla_renders_total', 'counter', 'Plantillas renderizadas.',
+                  [({'plantilla': p}, n) for p, n in sorted(self.plantilla_cantidad.items())])
+            serie('automotora_plantilla_segundos_total', 'counter', 'Tiempo de render de plantillas.',
+                  [({'plantilla': p}, f'{s:.6f}') for p, s in sorted(self.plantilla_segundos.items())])
+            serie('automotora_pdf_renders_total', 'counter', 'PDFs renderizados (sin contar aciertos de caché).',
+                  [({'tipo': t}, n) for t, n in sorted(self.pdf_cantidad.items())])
+            serie('automotora_pdf_segundos_total', 'counter', 'Tiempo de render de PDFs con FPDF.',
+                  [({'tipo': t}, f'{s:.6f}') for t, s in sorted(self.pdf_segundos.items())])
+
+        for nombre, (ayuda, valor) in sorted((extras or {}).items()):
+            serie(nombre, 'gauge', ayuda, [({}, valor)])
+        return '\n'.join(lineas) + '\n'
+
+
+def _etiquetas(etiquetas):
+    if not etiquetas:
+        return ''
+    partes = []
+    for clave, valor in etiquetas.items():
+        valor = str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        partes.append(f'{clave}="{valor}"')
+    return '{' + ','.join(partes) + '}'
+
+
+def _medicion():
+    """Medición del request en curso, o None fuera de un request instrumentado."""
+    if has_request_context():
+        return g.get('instrumentacion')
+    return None
+
+
+# --- EVENTOS ---
+def _antes_de_sql(conn, cursor, statement, parameters, context, executemany):
+    if _medicion() is not None:
+        conn.info.setdefault('instrumentacion_inicio', []).append(time.perf_counter())
+
+
+def _despues_de_sql(conn, cursor, statement, parameters, context, executemany):
+    m = _medicion()
+    inicios = conn.info.get('instrumentacion_inicio')
+    if m is None or not inicios:
+        return
+    duracion = time.perf_counter() - inicios.pop()
+    m.sql_cantidad += 1
+    m.sql_segundos += duracion
+    if len(m.sentencias) < MAX_SENTENCIAS:
+        m.sentencias.append((duracion, statement))
+
+
+def _antes_de_plantilla(sender, template, context, **extra):
+    m = _medicion()
+    if m is not None:
+        g.setdefault('instrumentacion_plantillas', []).append(time.perf_counter())
+
+
+def _plantilla_renderizada(sender, template, context, **extra):
+    m = _medicion()
+    inicios = g.get('instrumentacion_plantillas') if m is not None else None
+    if inicios:
+        duracion = time.perf_counter() - inicios.pop()
+        m.plantillas.append((template.name, duracion))
+        if not inicios: # las plantillas anidadas ya están dentro de la externa
+            m.plantillas_segundos += duracion
+
+
+@contextmanager
+def medir_pdf(tipo):
+    """Mide un render de FPDF. No hace nada si la instrumentación está desactivada."""
+    metricas = current_app.extensions.get('instrumentacion')
+    if metricas is None:
+        yield
+        return
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        metricas.registrar_pdf(tipo, duracion)
+        m = _medicion()
+        if m is not None:
+            m.pdf_segundos += duracion
+
+
+# --- CICLO DEL REQUEST ---
+def _iniciar_request():
+    m = g.instrumentacion = _Medicion()
+    if current_app.config.get('INSTRUMENTACION_PERFIL_DIR'):
+        m.perfil = cProfile.Profile()
+        m.perfil.enable()
+
+
+def _terminar_request(response):
+    m = g.pop('instrumentacion', None)
+    if m is None:
+        return response
+    if m.perfil is not None:
+        m.perfil.disable()
+    segundos = time.perf_counter() - m.inicio
+    endpoint = request.endpoint or 'sin_endpoint'
+    if endpoint == 'instrumentacion.metricas':
+        return response
+
+    current_app.extensions['instrumentacion'].registrar_request(
+        endpoint, request.method, str(response.status_code), m, segundos)
+
+    if m.perfil is not None:
+        directorio = current_app.config['INSTRUMENTACION_PERFIL_DIR']
+        os.makedirs(directorio, exist_ok=True)
+        nombre = f"{time.strftime('%Y%m%d-%H%M%S')}_{endpoint}_{segundos * 1000:.0f}ms_{os.getpid()}.prof"
+        m.perfil.dump_stats(os.path.join(directorio, nombre))
+
+    if segundos * 1000 >= current_app.config.get('INSTRUMENTACION_LENTO_MS', 500):
+        lentas = sorted(m.sentencias, key=lambda s: s[0], reverse=True)[:SENTENCIAS_EN_LOG]
+        detalle = ''.join(f'\n    {d * 1000:8.1f} ms  {" ".join(sql.split())}' for d, sql in lentas)
+        current_app.logger.warning(
+            'Request lento: %s %s (%s) %.0f ms | SQL: %s sentencias, %.0f ms | plantillas: %.0f ms | PDF: %.0f ms%s',
+            request.method, request.full_path.rstrip('?'), endpoint, segundos * 1000,
+            m.sql_cantidad, m.sql_segundos * 1000, m.plantillas_segundos * 1000, m.pdf_segundos * 1000, detalle)
+    return response
+
+
+@bp.route('/metricas')
+def metricas():
+    token = current_app.config.get('INSTRUMENTACION_TOKEN')
+    if token:
+        enviado = request.args.get('token') or request.headers.get('Authorization', '').removeprefix('Bearer ')
+        if not hmac.compare_digest(enviado.encode(), token.encode()):
+            abort(403)
+    elif request.remote_addr not in LOCALES:
+        abort(403)
+    extras = {f'automotora_tareas_{clave}': ('Cola de tareas (app/tareas.py).', valor)
+              for clave, valor in cola.metricas().items()}
+    extras.update({f'automotora_cache_{clave}': ('Caché de datos (app/cache.py), contadores del proceso.', valor)
+                   for clave, valor in cache.metricas().items()})
+    for bind, engine in db.engines.items():
+        prefijo = 'automotora_pool_' + (f'{bind}_' if bind else '')
+        extras.update({f'{prefijo}{clave}': ('Pool de conexiones del worker (app/conexiones.py).', valor)
+                       for clave, valor in conexiones.metricas(engine).items()})
+    texto = current_app.extensions['instrumentacion'].texto(extras)
+    return Response(texto, mimetype='text/plain; version=0.0.4')
+
+
+def init_app(app):
+    """Activa la instrumentación en `app` (create_app la llama si INSTRUMENTACION está activo)."""
+    global _eventos_registrados
+    app.extensions['instrumentacion'] = Metricas()
+    app.before_request(_iniciar_request)
+    app.after_request(_terminar_request)
+    app.register_blueprint(bp)
+    if not _eventos_registrados:
+        # Los eventos son globales; solo registran algo dentro de un request instrumentado
+        event.listen(Engine, 'before_cursor_execute', _antes_de_sql)
+        event.listen(Engine, 'after_cursor_execute', _despues_de_sql)
+        before_render_template.connect(_antes_de_plantilla)
+        template_rendered.connect(_plantilla_renderizada)
+        _eventos_registrados = True
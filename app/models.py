@@ -4,6 +4,7 @@ from app import db, login_manager
 from datetime import datetime
 from itsdangerous import URLSafeTimedSerializer as Serializer
 from flask import current_app
+from app.rut import formatear as formatear_rut
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -37,6 +38,9 @@ def load_user(id):
 
 class Cliente(db.Model):
     __tablename__ = 'clientes'
+    __table_args__ = (
+        db.Index('ix_clientes_nombre_rut', 'nombre', 'rut'), # Listado ordenado por nombre
+    )
     rut = db.Column(db.String(10), primary_key=True)
     nombre = db.Column(db.String(100), nullable=False)
     apellido = db.Column(db.String(100), nullable=False)
@@ -49,16 +53,13 @@ class Cliente(db.Model):
     #FORMATEAR EL RUT
     def rut_formateado(self):
         """Devuelve el RUT con formato de puntos y guion."""
-        rut = self.rut.replace(".", "").replace("-", "")
-        if len(rut) < 2:
-            return self.rut
-        cuerpo = rut[:-1]
-        dv = rut[-1]
-        # Formatea el cuerpo del RUT con puntos
-        cuerpo_formateado = f"{int(cuerpo):,}".replace(",", ".")
-        return f"{cuerpo_formateado}-{dv}"
+        return formatear_rut(self.rut)
 class Vehiculo(db.Model):
     __tablename__ = 'vehiculos'
+    __table_args__ = (
+        db.Index('ix_vehiculos_estado_marca', 'estado', 'marca', 'patente'), # Disponibles por marca
+        db.Index('ix_vehiculos_estado_created_at', 'estado', 'created_at', 'patente'), # Vendidos, más recientes primero
+    )
     patente = db.Column(db.String(8), primary_key=True)
     marca = db.Column(db.String(50), nullable=False)
     modelo = db.Column(db.String(50), nullable=False)
@@ -71,7 +72,7 @@ class Vehiculo(db.Model):
     estado = db.Column(db.String(20), nullable=False, default='disponible')
     
     # --- NUEVOS CAMPOS DE CONSIGNACIÓN ---
-    propietario_rut = db.Column(db.String(10), db.ForeignKey('clientes.rut'), nullable=True)
+    propietario_rut = db.Column(db.String(10), db.ForeignKey('clientes.rut'), nullable=True, index=True)
     kilometraje = db.Column(db.Integer, nullable=True)
     precio_acordado = db.Column(db.Integer, nullable=True) # Precio que pide el dueño
     # -------------------------------------
@@ -81,6 +82,11 @@ class Vehiculo(db.Model):
 
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1') # Concurrencia optimista
+
+    # Cada UPDATE/DELETE exige la versión leída y la incrementa: si otra transacción
+    # la cambió antes, el commit falla con StaleDataError en vez de pisar sus datos
+    __mapper_args__ = {'version_id_col': version}
 
     # Relación para acceder a los datos del dueño fácilmente
     propietario = db.relationship('Cliente', backref=db.backref('vehiculos_consignados', lazy='dynamic'))
@@ -96,9 +102,13 @@ class Pago(db.Model):
 
 class NotaVenta(db.Model):
     __tablename__ = 'notas_de_venta'
+    __table_args__ = (
+        db.Index('ix_notas_de_venta_estado_fecha_venta', 'estado', 'fecha_venta'), # Dashboard y resumen diario
+        db.Index('ix_notas_de_venta_estado_vence_el', 'estado', 'vence_el'), # Reservas vencidas (app/reservas.py)
+    )
     id = db.Column(db.Integer, primary_key=True) # Folio
-    cliente_rut = db.Column(db.String(10), db.ForeignKey('clientes.rut'), nullable=False)
-    vehiculo_patente = db.Column(db.String(8), db.ForeignKey('vehiculos.patente'), nullable=False)
+    cliente_rut = db.Column(db.String(10), db.ForeignKey('clientes.rut'), nullable=False, index=True)
+    vehiculo_patente = db.Column(db.String(8), db.ForeignKey('vehiculos.patente'), nullable=False, index=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     pago_id = db.Column(db.Integer, db.ForeignKey('pagos.id'), unique=True, nullable=False)
     fecha_venta = db.Column(db.Date, nullable=False)
@@ -106,9 +116,13 @@ class NotaVenta(db.Model):
     estado = db.Column(db.Enum('completada', 'pendiente', 'anulada', 'reservada', name='estado_venta_enum'), default='pendiente', nullable=False)
     monto_reserva = db.Column(db.Integer, nullable=True) 
     dias_vigencia = db.Column(db.Integer, nullable=True)
+    vence_el = db.Column(db.Date, nullable=True) # fecha_venta + dias_vigencia de las reservas; lo mantiene app/reservas.py
     observaciones = db.Column(db.Text)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    version = db.Column(db.Integer, nullable=False, default=1, server_default='1') # Concurrencia optimista (ver Vehiculo)
+
+    __mapper_args__ = {'version_id_col': version}
 
     # Relaciones para acceder a los objetos relacionados fácilmente
     cliente = db.relationship('Cliente', backref=db.backref('notas_venta', lazy='dynamic'))
@@ -120,11 +134,48 @@ class NotaVenta(db.Model):
 
 
 class RegistroHistorial(db.Model):
+    """Evento de la bitácora: un código entero y sus datos en JSON (ver app/eventos.py)."""
     __tablename__ = 'registro_historial'
+    __table_args__ = (
+        db.Index('ix_registro_historial_patente_fecha', 'vehiculo_patente', 'fecha'), # Bitácora por vehículo
+        db.Index('ix_registro_historial_codigo_fecha', 'codigo', 'fecha'), # Eventos de un tipo en un período
+    )
     id = db.Column(db.Integer, primary_key=True)
     vehiculo_patente = db.Column(db.String(10), db.ForeignKey('vehiculos.patente'), nullable=False)
     fecha = db.Column(db.DateTime, default=datetime.now)
-    descripcion = db.Column(db.String(255), nullable=False)
+    codigo = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0') # 0 = texto libre en descripcion
+    datos = db.Column(db.JSON)
+    descripcion = db.Column(db.String(255)) # Solo en los registros de texto libre
     
     # Relación inversa (permite llamar vehiculo.registros)
-    vehiculo = db.relationship('Vehiculo', backref=db.backref('registros', lazy='dynamic', order_by='RegistroHistorial.fecha.desc()'))
\ No newline at end of file
+    vehiculo = db.relationship('Vehiculo', backref=db.backref('registros', lazy='dynamic', order_by='RegistroHistorial.fecha.desc()'))
+
+class RegistroHistorialArchivo(db.Model):
+    """Registros de historial antiguos, movidos desde registro_historial (ver app/historial.py).
+
+    Sin clave foránea ni índices secundarios: la clave primaria (patente,
+    fecha, id) es el mismo orden de la bitácora, y en SQLite la tabla es
+    WITHOUT ROWID, así que cada fila se guarda una sola vez.
+    """
+    __tablename__ = 'registro_historial_archivo'
+    __table_args__ = {'sqlite_with_rowid': False}
+    vehiculo_patente = db.Column(db.String(10), primary_key=True)
+    fecha = db.Column(db.DateTime, primary_key=True)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False) # el mismo id que tenía en registro_historial
+    codigo = db.Column(db.SmallInteger, nullable=False, default=0, server_default='0')
+    datos = db.Column(db.JSON)
+    descripcion = db.Column(db.String(255))
+
+class VentaDiaria(db.Model):
+    """Resumen diario de ventas completadas, usado por el dashboard.
+
+    Se mantiene desde las rutas de notas de venta (ver app/reportes.py) y se
+    puede reconstruir con `flask reconstruir-ventas-diarias`.
+    """
+    __tablename__ = 'ventas_diarias'
+    fecha = db.Column(db.Date, primary_key=True)
+    tipo_adquisicion = db.Column(db.String(50), primary_key=True)
+    marca = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    monto_total = db.Column(db.BigInteger, nullable=False, default=0) # Suma de monto_final
+    ingreso_real = db.Column(db.Numeric(14, 2, asdecimal=False), nullable=False, default=0)
@@ -0,0 +1,137 @@
+"""Paginación por cursor (keyset / seek) para los listados.
+
+En vez de OFFSET, cada página pide las filas cuya clave de orden va después
+(o antes) de la última fila vista, así que la página 1 y la 10.000 cuestan lo
+mismo usando el índice de esa clave. El total es opcional:
+
+    'exacto'     COUNT(*) completo, como paginate()
+    'aproximado' cuenta hasta TOTAL_MAXIMO filas y muestra "más de N"
+    'ninguno'    no cuenta
+"""
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import and_, or_, func, select
+from app import db
+
+TOTAL_MAXIMO = 1000
+MODOS_TOTAL = ('exacto', 'aproximado', 'ninguno')
+
+
+# --- CODIFICACIÓN DEL CURSOR ---
+def _serializar(valor):
+    if isinstance(valor, (datetime, date)):
+        return valor.isoformat()
+    return valor
+
+
+def _deserializar(valor, columna):
+    try:
+        tipo = columna.type.python_type
+    except NotImplementedError:
+        return valor
+    if valor is None:
+        return valor
+    if tipo is datetime:
+        return datetime.fromisoformat(valor)
+    if tipo is date:
+        return date.fromisoformat(valor)
+    return valor
+
+
+def codificar_cursor(valores):
+    datos = json.dumps([_serializar(v) for v in valores], separators=(',', ':'))
+    return base64.urlsafe_b64encode(datos.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(cursor, columnas):
+    """Devuelve los valores de la clave o None si el cursor no es válido."""
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno))
+        if not isinstance(valores, list) or len(valores) != len(columnas):
+            return None
+        return [_deserializar(v, c) for v, c in zip(valores, columnas)]
+    except (ValueError, TypeError):
+        return None
+
+
+# --- CONSULTA ---
+def _despues_de(columnas, valores, descendente):
+    """(a, b) > (x, y) expandido como a > x OR (a = x AND b > y), portable e indexable."""
+    condiciones = []
+    for i, columna in enumerate(columnas):
+        iguales = [c == v for c, v in zip(columnas[:i], valores[:i])]
+        mayor = columna < valores[i] if descendente else columna > valores[i]
+        condiciones.append(and_(*iguales, mayor))
+    return or_(*condiciones)
+
+
+def _contar(query, modo):
+    if modo == 'ninguno':
+        return None, False
+    consulta = query.order_by(None)
+    if modo == 'aproximado':
+        sub = consulta.limit(TOTAL_MAXIMO + 1).subquery()
+        total = db.session.execute(select(func.count()).select_from(sub)).scalar()
+        return min(total, TOTAL_MAXIMO), total > TOTAL_MAXIMO
+    return consulta.count(), False
+
+
+class PaginaCursor:
+    """Página de resultados con la misma forma básica que flask_sqlalchemy.Pagination.
+
+    Las plantillas distinguen este tipo por `es_cursor` y usan `cursor_siguiente`
+    / `cursor_anterior` para los enlaces.
+    """
+    es_cursor = True
+
+    def __init__(self, items, per_page, cursor_siguiente, cursor_anterior, total, total_truncado):
+        self.items = items
+        self.per_page = per_page
+        self.cursor_siguiente = cursor_siguiente
+        self.cursor_anterior = cursor_anterior
+        self.has_next = cursor_siguiente is not None
+        self.has_prev = cursor_anterior is not None
+        self.total = total
+        self.total_truncado = total_truncado
+
+
+def paginar_por_cursor(query, columnas, cursor=None, direccion='siguiente', per_page=20,
+                       descendente=False, total='exacto', consulta_total=None):
+    """Pagina `query` por la clave `columnas` (la última debe ser única, p. ej. la PK).
+
+    `cursor` es la clave de la última fila vista (o la primera, si
+    `direccion='anterior'`). Se piden per_page + 1 filas para saber si hay más.
+    El total se cuenta sobre `consulta_total` si se indica (la misma consulta
+    sin los JOIN que solo cargan relaciones), si no sobre `query`.
+    """
+    columnas = list(columnas)
+    valores = decodificar_cursor(cursor, columnas) if cursor else None
+    atras = valores is not None and direccion == 'anterior'
+
+    total_filas, total_truncado = _contar(query if consulta_total is None else consulta_total,
+                                          total if total in MODOS_TOTAL else 'exacto')
+
+    consulta = query
+    if valores is not None:
+        consulta = consulta.filter(_despues_de(columnas, valores, descendente != atras))
+    orden = [c.desc() if descendente != atras else c.asc() for c in columnas]
+    filas = consulta.order_by(*orden).limit(per_page + 1).all()
+
+    hay_mas = len(filas) > per_page
+    filas = filas[:per_page]
+    if atras:
+        filas.reverse()
+
+    def clave(fila):
+        return codificar_cursor([getattr(fila, c.key) for c in columnas])
+
+    if atras:
+        siguiente = clave(filas[-1]) if filas else None
+        anterior = clave(filas[0]) if filas and hay_mas else None
+    else:
+        siguiente = clave(filas[-1]) if filas and hay_mas else None
+        anterior = clave(filas[0]) if filas and valores is not None else None
+
+    return PaginaCursor(filas, per_page, siguiente, anterior, total_filas, total_truncado)
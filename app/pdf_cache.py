@@ -0,0 +1,129 @@
+"""Caché en disco de PDFs, direccionada por contenido.
+
+La clave de un documento es el SHA-256 de los datos que lo alimentan (ver
+app/pdfs.py), así que cualquier cambio en la nota, el vehículo, el cliente o
+el vendedor produce otra clave y el PDF viejo deja de servirse solo. Los
+archivos se llaman `<tipo>_<id>_<hash>.pdf`: al guardar una versión nueva se
+borran las anteriores del mismo documento, y `invalidar()` las borra todas
+cuando la fila se elimina.
+
+La clave también se usa como ETag, así un navegador que ya tiene el PDF
+recibe 304 sin que se lea el archivo.
+"""
+import glob
+import hashlib
+import json
+import os
+import threading
+from flask import current_app, make_response, request
+from .instrumentacion import medir_pdf
+
+# Cambiar si se modifica el diseño de los PDF, para no servir versiones viejas
+VERSION_PLANTILLAS = 1
+
+_bloqueo = threading.Lock()
+
+
+def clave(tipo, datos):
+    contenido = json.dumps({'tipo': tipo, 'version': VERSION_PLANTILLAS, 'datos': datos},
+                           sort_keys=True, default=str)
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def _directorio():
+    directorio = current_app.config.get('PDF_CACHE_DIR') or os.path.join(current_app.instance_path, 'pdf_cache')
+    os.makedirs(directorio, exist_ok=True)
+    return directorio
+
+
+def _ruta(tipo, id_documento, hash_documento):
+    return os.path.join(_directorio(), f'{tipo}_{id_documento}_{hash_documento}.pdf')
+
+
+def obtener(tipo, id_documento, hash_documento):
+    """Bytes del PDF en caché o None. Marca el archivo como recién usado (LRU por mtime)."""
+    ruta = _ruta(tipo, id_documento, hash_documento)
+    try:
+        with open(ruta, 'rb') as f:
+            contenido = f.read()
+        os.utime(ruta)
+        return contenido
+    except OSError:
+        return None
+
+
+def guardar(tipo, id_documento, hash_documento, contenido):
+    ruta = _ruta(tipo, id_documento, hash_documento)
+    temporal = f'{ruta}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(temporal, 'wb') as f:
+        f.write(contenido)
+    os.replace(temporal, ruta) # Atómico: otro proceso nunca lee un archivo a medias
+
+    with _bloqueo:
+        # Versiones anteriores del mismo documento ya no se van a pedir
+        for vieja in glob.glob(os.path.join(_directorio(), f'{tipo}_{id_documento}_*.pdf')):
+            if vieja != ruta:
+                _borrar(vieja)
+        _recortar()
+
+
+def invalidar(tipo, id_documento):
+    """Borra todas las versiones en caché de un documento."""
+    for ruta in glob.glob(os.path.join(_directorio(), f'{tipo}_{id_documento}_*.pdf')):
+        _borrar(ruta)
+
+
+def _borrar(ruta):
+    try:
+        os.remove(ruta)
+    except OSError:
+        pass
+
+
+def _recortar():
+    """Elimina los archivos menos usados hasta quedar bajo PDF_CACHE_MAX_BYTES."""
+    maximo = current_app.config.get('PDF_CACHE_MAX_BYTES', 200 * 1024 * 1024)
+    archivos = []
+    total = 0
+    for entrada in os.scandir(_directorio()):
+        if entrada.name.endswith('.pdf'):
+            info = entrada.stat()
+            archivos.append((info.st_mtime, info.st_size, entrada.path))
+            total += info.st_size
+    if total <= maximo:
+        return
+    for _, tamano, ruta in sorted(archivos):
+        _borrar(ruta)
+        total -= tamano
+        if total <= maximo:
+            break
+
+
+def obtener_o_renderizar(tipo, id_documento, hash_documento, datos, render):
+    """Bytes del PDF desde la caché, o renderizados (y guardados) si no están."""
+    activo = current_app.config.get('PDF_CACHE_ACTIVO', True)
+    contenido = obtener(tipo, id_documento, hash_documento) if activo else None
+    if contenido is None:
+        with medir_pdf(tipo):
+            contenido = render(datos)
+        if activo:
+            guardar(tipo, id_documento, hash_documento, contenido)
+    return contenido
+
+
+def servir_pdf(tipo, id_documento, datos, render, nombre_archivo):
+    """Respuesta con el PDF: 304 si el navegador ya lo tiene, desde disco si está en caché,
+    o renderizado (y guardado) si no."""
+    hash_documento = clave(tipo, datos)
+
+    if hash_documento in request.if_none_match:
+        response = make_response('', 304)
+    else:
+        response = make_response(obtener_o_renderizar(tipo, id_documento, hash_documento, datos, render))
+        response.headers['Content-Type'] = 'application/pdf'
+        response.headers['Content-Disposition'] = f'inline; filename={nombre_archivo}'
+
+    response.set_etag(hash_documento)
+    # Cada apertura revalida con If-None-Match: así nunca se muestra un PDF desactualizado
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
@@ -0,0 +1,323 @@
+"""Documentos PDF de la automotora.
+
+Cada documento se arma en dos pasos:
+    datos_*(objeto)  -> dict con exactamente los campos que se imprimen
+    render_*(datos)  -> bytes del PDF
+
+Separar los datos permite identificar un documento por su contenido (caché en
+app/pdf_cache.py) y renderizarlo sin acceso a la base de datos. El logo y los
+textos legales fijos vienen de app/plantillas_pdf.py.
+"""
+from datetime import datetime
+from .plantillas_pdf import (Documento, FUENTE, TEXTO_LEGAL_VENTA, CONDICIONES_RESERVA, ACEPTACION_RESERVA,
+                             DECLARACION_DUENO, OFERTAS_CONSIGNACION, COMISION_CONSIGNACION, LAVADO_CONSIGNACION)
+
+
+def _dinero(valor):
+    return "${:,.0f}".format(valor).replace(',', '.')
+
+
+class PDF(Documento):
+    def header(self):
+        self.logo(10, 8, 33)
+        self.set_font(FUENTE, 'B', 15)
+        self.cell(80)
+        self.cell(30, 10, 'Nota de Venta', 0, 0, 'C')
+        self.ln(20)
+
+    def footer(self):
+        self.set_y(-15)
+        self.set_font(FUENTE, 'I', 8)
+        self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
+        self.cell(0, 10, 'Automotora Gonzalez | Gracias por su compra.', 0, 0, 'R')
+
+
+# --- NOTA DE VENTA ---
+def datos_nota_venta(nota):
+    cliente = nota.cliente
+    vehiculo = nota.vehiculo
+    return {
+        'id': nota.id,
+        'fecha_venta': nota.fecha_venta.strftime('%d-%m-%Y'),
+        'estado': nota.estado,
+        'monto_final': nota.monto_final,
+        'monto_reserva': nota.monto_reserva or 0,
+        'dias_vigencia': nota.dias_vigencia or 0,
+        'observaciones': nota.observaciones,
+        'metodo_pago': nota.pago.metodo_pago,
+        # --- VARIABLES PROTEGIDAS ---
+        'nombre_cliente': f"{cliente.nombre} {cliente.apellido}" if cliente else "Cliente Borrado",
+        'rut_cliente': cliente.rut_formateado() if cliente else "N/A",
+        'telefono_cliente': cliente.telefono if cliente else "N/A",
+        'direccion_cliente': f"{cliente.direccion}, {cliente.ciudad}" if cliente else "N/A",
+        'vendedor_nombre': nota.vendedor.name,
+        'vendedor_email': nota.vendedor.email,
+        'patente': vehiculo.patente,
+        'marca': vehiculo.marca,
+        'modelo': vehiculo.modelo,
+        'ano': vehiculo.ano,
+        'chasis_n': vehiculo.chasis_n,
+        'motor_n': vehiculo.motor_n,
+    }
+
+
+def render_nota_venta(d):
+    pdf = PDF()
+    dibujar_nota_venta(pdf, d)
+    return bytes(pdf.output())
+
+
+def dibujar_nota_venta(pdf, d):
+    """Agrega la nota (1 o 2 páginas) al documento; permite juntar varias en un solo PDF."""
+    pdf.add_page()
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.cell(0, 10, f"Folio: #{d['id']}", 0, 1)
+    pdf.set_font(FUENTE, '', 12)
+    pdf.cell(0, 10, f"Fecha de Venta: {d['fecha_venta']}", 0, 1)
+    pdf.ln(5)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.set_fill_color(230, 245, 230)
+    pdf.cell(95, 10, 'Datos del Cliente', 1, 0, 'C', fill=True)
+    pdf.cell(95, 10, 'Datos del Vendedor', 1, 1, 'C', fill=True)
+
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(95, 7, f"Nombre: {d['nombre_cliente']}", 1, 0)
+    pdf.cell(95, 7, f"Nombre: {d['vendedor_nombre']}", 1, 1)
+    pdf.cell(95, 7, f"RUT: {d['rut_cliente']}", 1, 0)
+    pdf.cell(95, 7, f"Email: {d['vendedor_email']}", 1, 1)
+    pdf.cell(95, 7, f"Telefono: {d['telefono_cliente']}", 1, 0)
+    pdf.cell(95, 7, "", 1, 1)
+    pdf.cell(0, 7, f"Direccion: {d['direccion_cliente']}", 1, 1)
+    pdf.ln(5)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.cell(0, 10, 'Detalles del Vehiculo', 1, 1, 'C', fill=True)
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(95, 7, f"Patente: {d['patente']}", 1, 0)
+    pdf.cell(95, 7, f"Marca / Modelo: {d['marca']} {d['modelo']}", 1, 1)
+    pdf.cell(95, 7, f"Ano: {d['ano']}", 1, 0)
+    pdf.cell(95, 7, f"N Chasis: {d['chasis_n']}", 1, 1)
+    pdf.cell(95, 7, f"N Motor: {d['motor_n']}", 1, 0)
+    pdf.cell(95, 7, "", 1, 1)
+    pdf.ln(5)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.cell(0, 10, 'Condiciones de la Venta', 1, 1, 'C', fill=True)
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(0, 7, f"Metodo de Pago: {d['metodo_pago'].capitalize()}", 1, 1)
+
+    x = pdf.get_x()
+    y = pdf.get_y()
+    pdf.rect(x, y, 190, 30)
+    pdf.set_xy(x + 2, y + 2)
+    pdf.multi_cell(186, 5, f"Observaciones: {d['observaciones'] or 'Sin observaciones.'}", 0)
+
+    pdf.set_xy(x, y + 30)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    monto_reserva = d['monto_reserva']
+    saldo_pendiente = d['monto_final'] - monto_reserva
+    monto_formateado = _dinero(d['monto_final'])
+    monto_res_formateado = _dinero(monto_reserva)
+    saldo_formateado = _dinero(saldo_pendiente)
+
+    if d['estado'] == 'reservada':
+        pdf.cell(0, 8, f"Monto Total Vehiculo: {monto_formateado}", 1, 1, 'R')
+        pdf.cell(0, 8, f"Abono de Reserva: {monto_res_formateado}", 1, 1, 'R')
+        pdf.cell(0, 8, f"Saldo Pendiente a Pagar: {saldo_formateado}", 1, 1, 'R')
+    elif d['estado'] == 'completada' and monto_reserva > 0:
+        pdf.cell(0, 8, f"Monto Total Vehiculo: {monto_formateado}", 1, 1, 'R')
+        pdf.cell(0, 8, f"Abono Previo de Reserva: {monto_res_formateado}", 1, 1, 'R')
+        pdf.cell(0, 8, f"Total Pagado en este Acto: {saldo_formateado}", 1, 1, 'R')
+    else:
+        pdf.cell(0, 8, f"Monto Final Pagado: {monto_formateado}", 1, 1, 'R')
+
+    pdf.ln(5)
+    pdf.bloque(TEXTO_LEGAL_VENTA)
+
+    pdf.ln(15)
+    pdf.set_font(FUENTE, 'B', 10)
+    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
+    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
+    pdf.cell(90, 5, "Firma Cliente", 0, 0, 'C')
+    pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
+
+    if d['estado'] == 'reservada':
+        pdf.add_page()
+        pdf.set_font(FUENTE, 'B', 14)
+        pdf.cell(0, 10, 'CONDICIONES DE LA RESERVA', 0, 1, 'C')
+        pdf.ln(5)
+
+        for condicion in CONDICIONES_RESERVA:
+            pdf.bloque(condicion, dias_vigencia=d['dias_vigencia'])
+            pdf.ln(3)
+
+        pdf.ln(5)
+        pdf.set_font(FUENTE, 'B', 12)
+        pdf.cell(0, 8, 'ACEPTACION', 0, 1, 'L')
+        pdf.bloque(ACEPTACION_RESERVA)
+
+        pdf.ln(35)
+        pdf.set_font(FUENTE, 'B', 11)
+        pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
+        pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
+        pdf.cell(90, 5, "Firma Cliente", 0, 0, 'C')
+        pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
+
+
+# --- COMPROBANTE DE DEVOLUCIÓN ---
+def datos_devolucion(nota):
+    cliente = nota.cliente
+    vehiculo = nota.vehiculo
+    return {
+        'id': nota.id,
+        'fecha_emision': datetime.now().strftime('%d-%m-%Y'),
+        'monto_reserva': nota.monto_reserva or 0,
+        # PROTECCIÓN: Variables seguras
+        'nombre_cliente': f"{cliente.nombre} {cliente.apellido}" if cliente else "Cliente Borrado",
+        'rut_cliente': cliente.rut_formateado() if cliente else "N/A",
+        'marca_modelo': f"{vehiculo.marca} {vehiculo.modelo}" if vehiculo else "N/A",
+        'patente': vehiculo.patente if vehiculo else "N/A",
+    }
+
+
+def render_devolucion(d):
+    pdf = PDF()
+    pdf.add_page()
+
+    pdf.set_font(FUENTE, 'B', 16)
+    pdf.cell(0, 10, 'COMPROBANTE DE DEVOLUCION DE RESERVA', 0, 1, 'C')
+    pdf.ln(10)
+
+    pdf.set_font(FUENTE, '', 12)
+    pdf.cell(0, 8, f"Folio Original: #{d['id']}", 0, 1)
+    pdf.cell(0, 8, f"Fecha de Emision: {d['fecha_emision']}", 0, 1)
+    pdf.ln(5)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.cell(0, 10, 'Datos del Cliente y Vehiculo', 1, 1, 'C', fill=True)
+    pdf.set_font(FUENTE, '', 11)
+
+    pdf.cell(0, 8, f"Cliente: {d['nombre_cliente']} (RUT: {d['rut_cliente']})", 1, 1)
+    pdf.cell(0, 8, f"Vehiculo: {d['marca_modelo']} (Patente: {d['patente']})", 1, 1)
+    pdf.ln(5)
+
+    pdf.set_font(FUENTE, 'B', 12)
+    pdf.cell(0, 10, 'Detalle de la Devolucion', 1, 1, 'C', fill=True)
+    pdf.set_font(FUENTE, '', 11)
+
+    texto_devolucion = (
+        f"Mediante el presente documento, Automotora Gonzalez deja constancia de la anulacion de la reserva "
+        f"correspondiente al folio #{d['id']}.\n\n"
+        f"Se realiza la devolucion integra del dinero abonado en concepto de reserva por un monto de "
+        f"{_dinero(d['monto_reserva'])}, liberando a ambas partes de cualquier obligacion futura respecto a "
+        f"la compra de este vehiculo."
+    )
+    pdf.multi_cell(0, 8, texto_devolucion, 1)
+    pdf.ln(20)
+
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
+    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
+    pdf.cell(90, 5, "Firma Cliente (Recibi Conforme)", 0, 0, 'C')
+    pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
+
+    return bytes(pdf.output())
+
+
+# --- CONTRATO DE CONSIGNACIÓN ---
+def datos_consignacion(vehiculo):
+    propietario = vehiculo.propietario
+    return {
+        'propietario_nombre': f"{propietario.nombre} {propietario.apellido}",
+        'propietario_rut': propietario.rut_formateado(),
+        'propietario_direccion': f"{propietario.direccion}, {propietario.ciudad}",
+        'propietario_telefono': propietario.telefono,
+        'marca': vehiculo.marca,
+        'modelo': vehiculo.modelo,
+        'ano': vehiculo.ano,
+        'color': vehiculo.color,
+        'patente': vehiculo.patente,
+        'kilometraje': vehiculo.kilometraje or 0,
+        'chasis_n': vehiculo.chasis_n,
+        'motor_n': vehiculo.motor_n,
+        'precio_acordado': vehiculo.precio_acordado or 0,
+    }
+
+
+def render_consignacion(d):
+    pdf = Documento()
+    pdf.add_page()
+
+    # Reducimos los márgenes automáticos para asegurar que quepa en 1 hoja
+    pdf.set_auto_page_break(auto=True, margin=10)
+
+    # LOGO
+    pdf.logo(10, 8, 30) # Logo un poco más pequeño para no empujar el texto
+
+    # TÍTULO (Centrado y ajustado al espacio del logo)
+    pdf.set_y(15)
+    pdf.set_font(FUENTE, 'B', 14)
+    pdf.cell(0, 8, 'CONTRATO DE CONSIGNACION DE VEHICULO', 0, 1, 'C')
+
+    # Espacio extra después del título/logo
+    pdf.ln(12)
+
+    # I. IDENTIFICACIÓN
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(0, 6, 'I. IDENTIFICACION', 0, 1)
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(0, 5, f"Nombre completo: {d['propietario_nombre']}", 0, 1)
+    pdf.cell(0, 5, f"RUT: {d['propietario_rut']}", 0, 1)
+    pdf.cell(0, 5, f"Direccion: {d['propietario_direccion']}", 0, 1)
+    pdf.cell(0, 5, f"Numero de celular: {d['propietario_telefono']}", 0, 1)
+    pdf.ln(1)
+    pdf.bloque(DECLARACION_DUENO)
+    pdf.ln(4)
+
+    # II. IDENTIFICACIÓN DEL VEHÍCULO
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(0, 6, 'II. IDENTIFICACION DEL VEHICULO', 0, 1)
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(0, 5, f"Marca: {d['marca']}", 0, 1)
+    pdf.cell(0, 5, f"Modelo: {d['modelo']}", 0, 1)
+    pdf.cell(0, 5, f"Ano: {d['ano']}", 0, 1)
+    pdf.cell(0, 5, f"Color: {d['color']}", 0, 1)
+    pdf.cell(0, 5, f"Patente: {d['patente']}", 0, 1)
+    pdf.cell(0, 5, f"Kilometraje: {d['kilometraje']} km", 0, 1)
+    pdf.cell(0, 5, f"N Chasis (VIN): {d['chasis_n']}", 0, 1)
+    pdf.cell(0, 5, f"N Motor: {d['motor_n']}", 0, 1)
+    pdf.ln(4)
+
+    # III. PRECIO SOLICITADO
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(0, 6, 'III. PRECIO SOLICITADO', 0, 1)
+    pdf.set_font(FUENTE, '', 10)
+    pdf.cell(0, 6, f"Precio solicitado por el vehiculo: {_dinero(d['precio_acordado'])}", 0, 1)
+    pdf.bloque(OFERTAS_CONSIGNACION)
+    pdf.ln(4)
+
+    # IV. COMISIÓN
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(0, 6, 'IV. COMISION DE LA AUTOMOTORA', 0, 1)
+    pdf.bloque(COMISION_CONSIGNACION)
+    pdf.ln(4)
+
+    # V. PAGO POR LAVADO Y MANTENCIÓN
+    pdf.set_font(FUENTE, 'B', 11)
+    pdf.cell(0, 6, 'V. PAGO POR LAVADO Y MANTENCION', 0, 1)
+    pdf.bloque(LAVADO_CONSIGNACION)
+
+    # FIRMAS
+    pdf.ln(6)
+    pdf.set_font(FUENTE, 'B', 10)
+    pdf.cell(0, 5, "Firmas:", 0, 1)
+    pdf.ln(12) # Espacio para que firmen a mano
+    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
+    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
+    pdf.cell(90, 5, "PROPIETARIO", 0, 0, 'C')
+    pdf.cell(90, 5, "AUTOMOTORA", 0, 1, 'C')
+
+    return bytes(pdf.output())
@@ -0,0 +1,112 @@
+"""Base común de los documentos PDF: recursos precargados y textos fijos.
+
+El logo se decodifica una sola vez por proceso (worker de gunicorn o proceso
+del pool de exportación) y cada documento nuevo recibe una copia de la imagen
+ya procesada, en vez de volver a leer y comprimir el PNG en cada página.
+La precarga usa funciones internas de fpdf2 (versión fijada en
+requirements.txt); si faltan, los documentos cargan el logo como antes.
+
+Los textos legales que no cambian entre documentos están definidos una sola
+vez como bloques (`Bloque`) con su fuente y alto de línea; los campos
+variables van entre llaves y se llenan al dibujar.
+"""
+import functools
+import os
+from collections import namedtuple
+from fpdf import FPDF
+try:
+    from fpdf.image_datastructures import ImageCache
+    from fpdf.image_parsing import preload_image
+except ImportError: # otra versión de fpdf2: sin precarga
+    ImageCache = preload_image = None
+
+LOGO_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'img', 'logo.png')
+HAY_LOGO = os.path.exists(LOGO_PATH)
+
+# 'Arial' no existe como fuente base del PDF: fpdf2 la sustituye por Helvetica
+# en cada set_font (con aviso de deprecación). Se usa Helvetica directamente.
+FUENTE = 'helvetica'
+
+# False vuelve al comportamiento anterior; `flask medir-pdf` mide ambos
+PRECARGAR = True
+
+
+@functools.lru_cache(maxsize=None)
+def _logo():
+    """ImageCache con el logo ya procesado, o None si no hay logo o no se puede precargar."""
+    if not HAY_LOGO or preload_image is None:
+        return None
+    cache = ImageCache()
+    preload_image(cache, LOGO_PATH)
+    return cache
+
+
+class Documento(FPDF):
+    """FPDF con el logo precargado y utilidades para los bloques de texto."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        logo = _logo() if PRECARGAR else None
+        if logo is not None:
+            # Copia por documento: fpdf2 cuenta los usos de cada imagen para decidir si la incluye
+            for nombre, info in logo.images.items():
+                copia = type(info)(info)
+                copia['usages'] = 0
+                self.image_cache.images[nombre] = copia
+            self.image_cache.icc_profiles.update(logo.icc_profiles)
+
+    def logo(self, x, y, w):
+        if HAY_LOGO:
+            self.image(LOGO_PATH, x, y, w)
+
+    def bloque(self, bloque, **campos):
+        self.set_font(FUENTE, bloque.estilo, bloque.tamano)
+        self.multi_cell(0, bloque.alto, bloque.texto.format(**campos) if campos else bloque.texto)
+
+
+class Bloque(namedtuple('Bloque', 'estilo tamano alto texto')):
+    """Párrafo fijo: estilo y tamaño de fuente, alto de línea y texto."""
+
+
+# --- NOTA DE VENTA ---
+TEXTO_LEGAL_VENTA = Bloque('', 9, 4, (
+    "El vehiculo es usado y se hace entrega en este acto, en las condiciones mecanicas y de carroceria en que se "
+    "encuentra y es conocido por el comprador recibiendolo este conforme, por tanto no acoge a ningun reclamo "
+    "posterior. Ademas ha sido completamente revisado por el comprador o un mecanico de su confianza, liberando "
+    "de toda responsabilidad a Automotora Gonzalez ya que esta actua solo como comisionista. Los costos de "
+    "transferencia son de cargo exclusivo del comprador y la documentacion debe efectuarse dentro de los 30 dias "
+    "de la adquisicion y PARA CONFORMIDAD FIRMAN este recibo."))
+
+CONDICIONES_RESERVA = [
+    Bloque('', 11, 6, "1. La reserva tendra una vigencia de {dias_vigencia} dias corridos desde la fecha de firma "
+                      "del presente documento."),
+    Bloque('', 11, 6, "2. Durante el periodo de reserva, la automotora se compromete a no ofrecer ni vender el "
+                      "vehiculo a terceros."),
+    Bloque('', 11, 6, "3. En caso de que el cliente desista de la compra por cualquier motivo, o no concrete la "
+                      "operacion dentro del plazo acordado, la suma entregada en reserva NO sera devuelta, quedando "
+                      "a beneficio de la automotora en compensacion por concepto de gastos administrativos, tiempo "
+                      "de publicacion y perdida de oportunidad de venta."),
+    Bloque('', 11, 6, "4. En caso de que la automotora no pueda concretar la venta por causas imputables "
+                      "exclusivamente a ella, el monto de la reserva sera devuelto integramente al cliente."),
+]
+
+ACEPTACION_RESERVA = Bloque('', 11, 6, (
+    "El cliente declara haber revisado el vehiculo y aceptar su estado general, asi como las condiciones "
+    "senaladas en este documento. Firman en senal de conformidad:"))
+
+# --- CONTRATO DE CONSIGNACIÓN ---
+DECLARACION_DUENO = Bloque('', 10, 5, "Declara ser dueno del vehiculo individualizado a continuacion:")
+
+OFERTAS_CONSIGNACION = Bloque('', 10, 5, (
+    "Toda oferta recibida sera comunicada oportunamente para su evaluacion y aprobacion antes de concretar la venta."))
+
+COMISION_CONSIGNACION = Bloque('', 10, 5, (
+    "La comision por gestion de venta sera:\n\n"
+    "  o  $200.000 como comision minima, o\n"
+    "  o  El 3% del valor final de venta,\n\n"
+    "Aplicandose el monto que resulte mayor.\n\n"
+    "La comision sera descontada directamente del valor pagado por el comprador."))
+
+LAVADO_CONSIGNACION = Bloque('', 10, 5, (
+    "Se paga un monto unico de: $20.000\n"
+    "Por concepto de lavado inicial y mantencion diaria de limpieza. Monto no reembolsable."))
@@ -0,0 +1,562 @@
+"""Banco de pruebas de rendimiento sobre un dataset sintético.
+
+    flask sembrar-rendimiento                  crea instance/rendimiento.db con
+                                               clientes, vehículos, notas de venta,
+                                               pagos e historial generados
+    flask medir-rendimiento --salida r.json    recorre las vistas principales con
+                                               el cliente de pruebas de Flask y
+                                               guarda p50/p95, consultas por
+                                               request y RSS máximo en JSON
+    flask medir-rendimiento --comparar base.json
+                                               además compara con una corrida
+                                               anterior y termina con código 1 si
+                                               algún escenario empeoró más que
+                                               --umbral
+    flask medir-concurrencia --hilos 8         varios hilos leyendo a la vez mientras
+                                               otro escribe: requests por segundo,
+                                               errores ("database is locked") y
+                                               espera por el pool de conexiones
+    flask probar-ventas-concurrentes           varios vendedores venden el mismo
+                                               vehículo a la vez: debe ganar uno
+
+Todo corre contra una base SQLite aparte (--db), nunca contra la configurada
+en DATABASE_URL. La generación usa una semilla fija, así dos corridas con los
+mismos parámetros miden exactamente los mismos datos y las mismas URLs.
+"""
+import math
+import os
+import platform
+import random
+import threading
+import time
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, func, insert, select, text
+from app import create_app, db, conexiones
+from config import Config
+from .models import User, Cliente, Vehiculo, Pago, NotaVenta, RegistroHistorial
+from .busqueda import reconstruir_indice, ESTADOS_NOTA
+from .reportes import reconstruir_ventas_diarias
+from .rut import digito_verificador
+from .reservas import vencimiento
+
+try:
+    import resource
+except ImportError: # Windows
+    resource = None
+
+LOTE = 5000
+EMAIL_USUARIO = 'rendimiento@automotora.local'
+
+NOMBRES = ['Juan', 'Maria', 'Pedro', 'Camila', 'Jose', 'Francisca', 'Luis', 'Valentina', 'Carlos', 'Fernanda',
+           'Diego', 'Javiera', 'Andres', 'Catalina', 'Felipe', 'Constanza', 'Jorge', 'Daniela', 'Ricardo', 'Paula']
+APELLIDOS = ['Gonzalez', 'Munoz', 'Rojas', 'Diaz', 'Perez', 'Soto', 'Contreras', 'Silva', 'Martinez', 'Sepulveda',
+             'Morales', 'Rodriguez', 'Lopez', 'Fuentes', 'Hernandez', 'Torres', 'Araya', 'Flores', 'Espinoza', 'Valenzuela']
+CIUDADES = ['Talca', 'Curico', 'Linares', 'Santiago', 'Constitucion', 'San Javier', 'Molina', 'Cauquenes']
+MODELOS = {
+    'Toyota': ['Yaris', 'Corolla', 'Hilux', 'RAV4'], 'Chevrolet': ['Sail', 'Spark', 'Tracker', 'Colorado'],
+    'Kia': ['Morning', 'Rio', 'Sportage', 'Cerato'], 'Hyundai': ['Accent', 'Tucson', 'i10', 'Elantra'],
+    'Nissan': ['Versa', 'March', 'Navara', 'Qashqai'], 'Suzuki': ['Swift', 'Baleno', 'Vitara', 'Jimny'],
+    'Ford': ['Ranger', 'Territory', 'Escape'], 'Mazda': ['2', '3', 'CX-5'], 'Peugeot': ['208', '2008', '3008'],
+}
+COLORES = ['Blanco', 'Gris', 'Negro', 'Rojo', 'Azul', 'Plata']
+METODOS_PAGO = ['contado', 'credito automotriz', 'T. crédito', 'T. débito']
+PESOS_ESTADO = [('completada', 70), ('pendiente', 10), ('anulada', 10), ('reservada', 10)]
+EVENTOS_HISTORIAL = ['Ingreso a inventario', 'Cambio de precio', 'Lavado y preparacion', 'Revision mecanica',
+                     'Publicado en web', 'Vehiculo vendido', 'Reserva registrada', 'Venta anulada']
+CAMPOS_BUSQUEDA = ('todos', 'folio', 'cliente', 'vehiculo', 'estado')
+
+
+def configuracion(ruta, cache_pdf=False, **extra):
+    """Config de la app de pruebas: la base de `ruta` y sin efectos hacia afuera."""
+    return type('ConfigRendimiento', (Config,), dict({
+        'SQLALCHEMY_DATABASE_URI': 'sqlite:///' + os.path.abspath(ruta),
+        'PDF_CACHE_ACTIVO': cache_pdf,
+        'PDF_CACHE_DIR': os.path.join(os.path.dirname(os.path.abspath(ruta)), 'rendimiento_pdf_cache'),
+        'PAGINACION_CURSOR': False,
+        'INSTRUMENTACION': False,
+        'TAREAS_DB': None,
+        'TAREAS_SINCRONICAS': True,
+        'CACHE_BACKEND': 'memoria',
+        'CACHE_DB': None,
+        'RESERVAS_BARRIDO_SEG': 0, # no anular las reservas sembradas durante la medición
+        'MAIL_SUPPRESS_SEND': True,
+    }, **extra))
+
+
+# --- DATOS SINTÉTICOS ---
+def _rut(i):
+    cuerpo = 5000000 + i * 97
+    return f'{cuerpo}{digito_verificador(cuerpo)}'
+
+
+def _patente(i):
+    # Formato BBBB10: cuatro consonantes y dos dígitos, única para i < 18^4 * 100
+    letras = 'BCDFGHJKLPRSTVWXYZ'
+    resto, numero = divmod(i, 100)
+    cuatro = ''
+    for _ in range(4):
+        resto, j = divmod(resto, len(letras))
+        cuatro = letras[j] + cuatro
+    return f'{cuatro}{numero:02d}'
+
+
+def _insertar(tabla, filas):
+    """INSERT en lotes (executemany), sin pasar por la unidad de trabajo del ORM."""
+    lote = []
+    total = 0
+    for fila in filas:
+        lote.append(fila)
+        if len(lote) == LOTE:
+            db.session.execute(insert(tabla), lote)
+            total += len(lote)
+            lote = []
+    if lote:
+        db.session.execute(insert(tabla), lote)
+        total += len(lote)
+    return total
+
+
+def sembrar(clientes, vehiculos, notas, registros, semilla=1, avance=None):
+    """Crea el esquema y lo llena con datos generados. Devuelve las filas por tabla.
+
+    Cada nota usa un vehículo al azar (un mismo vehículo puede tener varias
+    notas, como ocurre con las ventas anuladas) y tiene su propio pago.
+    """
+    avance = avance or (lambda mensaje: None)
+    rng = random.Random(semilla)
+    ahora = datetime.utcnow()
+    hoy = date.today()
+    db.create_all()
+    db.session.execute(text('PRAGMA synchronous = OFF'))
+
+    usuario = User(name='Rendimiento', email=EMAIL_USUARIO)
+    usuario.set_password(os.urandom(16).hex())
+    db.session.add(usuario)
+    vendedores = [User(name=f'Vendedor {i}', email=f'vendedor{i}@automotora.local', password_hash='!')
+                  for i in range(1, 6)]
+    db.session.add_all(vendedores)
+    db.session.flush()
+    ids_vendedores = [usuario.id] + [v.id for v in vendedores]
+
+    conteo = {}
+    avance(f'clientes: {clientes}')
+    conteo['clientes'] = _insertar(Cliente.__table__, ({
+        'rut': _rut(i), 'nombre': rng.choice(NOMBRES), 'apellido': rng.choice(APELLIDOS),
+        'telefono': f'9{rng.randrange(10000000, 99999999)}', 'direccion': f'Calle {rng.randrange(1, 3000)}',
+        'ciudad': rng.choice(CIUDADES), 'created_at': ahora, 'updated_at': ahora,
+    } for i in range(clientes)))
+
+    avance(f'vehiculos: {vehiculos}')
+    marcas = list(MODELOS)
+    estados_vehiculo = {}
+
+    def _vehiculo(i):
+        marca = rng.choice(marcas)
+        consignado = rng.random() < 0.7
+        valor = rng.randrange(3000000, 25000000, 10000)
+        return {
+            'patente': _patente(i), 'marca': marca, 'modelo': rng.choice(MODELOS[marca]),
+            'ano': rng.randrange(2005, hoy.year + 1), 'color': rng.choice(COLORES),
+            'chasis_n': f'CH{i:010d}', 'motor_n': f'MO{i:010d}', 'valor': valor, 'descripcion': None,
+            'estado': 'disponible', 'propietario_rut': _rut(rng.randrange(clientes)) if consignado and clientes else None,
+            'kilometraje': rng.randrange(0, 250000, 100), 'precio_acordado': int(valor * 0.9) if consignado else None,
+            'tipo_adquisicion': 'consignacion' if consignado else 'compra_directa',
+            'costo_compra': 0 if consignado else int(valor * 0.8), 'created_at': ahora, 'updated_at': ahora,
+        }
+    conteo['vehiculos'] = _insertar(Vehiculo.__table__, (_vehiculo(i) for i in range(vehiculos)))
+
+    avance(f'notas de venta y pagos: {notas}')
+    estados, pesos = zip(*PESOS_ESTADO)
+    dias = 3 * 365
+    pagos, filas_notas = [], []
+
+    def _volcar():
+        db.session.execute(insert(Pago.__table__), pagos)
+        db.session.execute(insert(NotaVenta.__table__), filas_notas)
+        pagos.clear()
+        filas_notas.clear()
+
+    for i in range(1, notas + 1):
+        estado = rng.choices(estados, pesos)[0]
+        patente_i = rng.randrange(vehiculos)
+        monto = rng.randrange(3000000, 25000000, 10000)
+        fecha = hoy - timedelta(days=int(dias * rng.random() ** 2)) # más ventas recientes
+        pagos.append({'id': i, 'metodo_pago': rng.choice(METODOS_PAGO), 'detalles': None, 'total': monto,
+                      'created_at': ahora, 'updated_at': ahora})
+        filas_notas.append({
+            'id': i, 'cliente_rut': _rut(rng.randrange(clientes)), 'vehiculo_patente': _patente(patente_i),
+            'user_id': rng.choice(ids_vendedores), 'pago_id': i, 'fecha_venta': fecha, 'monto_final': monto,
+            'estado': estado, 'monto_reserva': 500000 if estado in ('reservada', 'anulada') else None,
+            'dias_vigencia': 5 if estado == 'reservada' else None, 'observaciones': None,
+            'vence_el': vencimiento(estado, fecha, 5),
+            'created_at': ahora, 'updated_at': ahora,
+        })
+        if estado != 'anulada':
+            estados_vehiculo[patente_i] = 'reservado' if estado == 'reservada' else 'vendido'
+        if len(pagos) == LOTE:
+            _volcar()
+    if pagos:
+        _volcar()
+    conteo['pagos'] = conteo['notas_de_venta'] = notas
+
+    for estado in ('vendido', 'reservado'):
+        patentes = [_patente(i) for i, e in estados_vehiculo.items() if e == estado]
+        for inicio in range(0, len(patentes), LOTE):
+            db.session.execute(Vehiculo.__table__.update().where(
+                Vehiculo.patente.in_(patentes[inicio:inicio + LOTE])).values(estado=estado))
+
+    avance(f'registros de historial: {registros}')
+    conteo['registro_historial'] = _insertar(RegistroHistorial.__table__, ({
+        'vehiculo_patente': _patente(rng.randrange(vehiculos)),
+        'fecha': ahora - timedelta(minutes=rng.randrange(dias * 24 * 60)),
+        'descripcion': rng.choice(EVENTOS_HISTORIAL),
+    } for _ in range(registros)))
+    db.session.commit()
+
+    avance('índice de búsqueda y resumen diario')
+    reconstruir_indice()
+    reconstruir_ventas_diarias()
+    db.session.execute(text('ANALYZE'))
+    db.session.commit()
+    return conteo
+
+
+# --- MEDICIÓN ---
+def _percentil(valores, p):
+    """Percentil por rango más cercano (valores ordenados)."""
+    if not valores:
+        return None
+    return valores[max(0, math.ceil(p / 100 * len(valores)) - 1)]
+
+
+def rss_pico_mb():
+    """RSS máximo del proceso hasta ahora, o None donde no hay `resource`."""
+    if resource is None:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa KiB; macOS, bytes
+    return round(pico / (1024 * 1024 if platform.system() == 'Darwin' else 1024), 1)
+
+
+def _muestras(rng, cantidad):
+    """IDs y patentes reales para armar las URLs de cada escenario."""
+    max_id = db.session.scalar(select(func.max(NotaVenta.id))) or 0
+    anuladas = db.session.scalars(select(NotaVenta.id).where(NotaVenta.estado == 'anulada').limit(5000)).all()
+    patentes = db.session.scalars(select(Vehiculo.patente).limit(20000)).all()
+    consignados = db.session.scalars(
+        select(Vehiculo.patente).where(Vehiculo.propietario_rut.isnot(None)).limit(20000)).all()
+    clientes = db.session.execute(select(Cliente.rut, Cliente.apellido).limit(20000)).all()
+    vehiculos = db.session.execute(select(Vehiculo.marca, Vehiculo.modelo).limit(20000)).all()
+    if not (max_id and anuladas and consignados and clientes):
+        raise RuntimeError('La base no tiene datos suficientes; ejecute antes `flask sembrar-rendimiento`.')
+
+    def veces(fabrica):
+        return [fabrica() for _ in range(cantidad)]
+
+    busquedas = {
+        'todos': lambda: rng.choice(vehiculos)[0],
+        'folio': lambda: str(rng.randrange(1, max_id + 1)),
+        'cliente': lambda: rng.choice(clientes)[1] if rng.random() < 0.5 else rng.choice(clientes)[0],
+        'vehiculo': lambda: ' '.join(rng.choice(vehiculos)),
+        'estado': lambda: rng.choice(ESTADOS_NOTA),
+    }
+    escenarios = {
+        'index': veces(lambda: '/index'),
+        'dashboard_ventas_api': veces(lambda: '/api/dashboard/ventas?fecha_inicio={:%Y-%m-%d}&fecha_fin={:%Y-%m-%d}'.format(
+            *_rango(rng))),
+        'notas_venta': veces(lambda: '/notas-venta'),
+    }
+    for campo in CAMPOS_BUSQUEDA:
+        escenarios[f'notas_venta_{campo}'] = veces(
+            lambda: f'/notas-venta?search_field={campo}&q={busquedas[campo]()}')
+    escenarios.update({
+        'clientes': veces(lambda: '/clientes'),
+        'clientes_busqueda': veces(lambda: f'/clientes?q={rng.choice(clientes)[1]}'),
+        'historial_vehiculo': veces(lambda: f'/vehiculos/historial/{rng.choice(patentes)}'),
+        'pdf_nota_venta': veces(lambda: f'/notas-venta/pdf/{rng.randrange(1, max_id + 1)}'),
+        'pdf_devolucion': veces(lambda: f'/notas-venta/pdf-devolucion/{rng.choice(anuladas)}'),
+        'pdf_consignacion': veces(lambda: f'/vehiculos/pdf-consignacion/{rng.choice(consignados)}'),
+    })
+    return escenarios
+
+
+def _rango(rng):
+    # Un mes cualquiera del último año, como al cambiar el rango en el dashboard
+    fin = date.today() - timedelta(days=rng.randrange(365))
+    return fin - timedelta(days=30), fin
+
+
+def medir(app, repeticiones=30, calentamiento=2, semilla=1, solo=None, avance=None):
+    """Recorre los escenarios y devuelve el resultado listo para guardar como JSON."""
+    avance = avance or (lambda mensaje: None)
+    rng = random.Random(semilla)
+    consultas = [0]
+
+    def _contar(*args):
+        consultas[0] += 1
+
+    with app.app_context():
+        usuario = db.session.scalar(select(User).where(User.email == EMAIL_USUARIO))
+        if usuario is None:
+            raise RuntimeError('La base no tiene datos suficientes; ejecute antes `flask sembrar-rendimiento`.')
+        escenarios = _muestras(rng, repeticiones + calentamiento)
+        dataset = {tabla.name: db.session.scalar(select(func.count()).select_from(tabla))
+                   for tabla in (Cliente.__table__, Vehiculo.__table__, NotaVenta.__table__,
+                                 Pago.__table__, RegistroHistorial.__table__)}
+        id_usuario = str(usuario.id)
+        engine = db.engine
+        db.session.remove()
+
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['_user_id'] = id_usuario
+        sesion['_fresh'] = True
+
+    resultados = {}
+    event.listen(engine, 'after_cursor_execute', _contar)
+    try:
+        for nombre, urls in escenarios.items():
+            if solo and not any(nombre.startswith(s) for s in solo):
+                continue
+            avance(nombre)
+            tiempos, total_consultas, errores = [], 0, 0
+            for i, url in enumerate(urls):
+                consultas[0] = 0
+                inicio = time.perf_counter()
+                respuesta = cliente.get(url)
+                respuesta.get_data()
+                duracion = time.perf_counter() - inicio
+                if i < calentamiento:
+                    continue
+                if respuesta.status_code != 200:
+                    errores += 1
+                tiempos.append(duracion * 1000)
+                total_consultas += consultas[0]
+            tiempos.sort()
+            resultados[nombre] = {
+                'n': len(tiempos),
+                'errores': errores,
+                'p50_ms': round(_percentil(tiempos, 50), 2),
+                'p95_ms': round(_percentil(tiempos, 95), 2),
+                'media_ms': round(sum(tiempos) / len(tiempos), 2),
+                'max_ms': round(tiempos[-1], 2),
+                'consultas_por_request': round(total_consultas / len(tiempos), 2),
+                'rss_pico_mb': rss_pico_mb(), # acumulado del proceso al terminar el escenario
+                'ejemplo': urls[-1],
+            }
+    finally:
+        event.remove(engine, 'after_cursor_execute', _contar)
+
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'base': engine.url.database,
+        'cache_pdf': app.config['PDF_CACHE_ACTIVO'],
+        'dataset': dataset,
+        'repeticiones': repeticiones,
+        'semilla': semilla,
+        'rss_pico_mb': rss_pico_mb(),
+        'escenarios': resultados,
+    }
+
+
+def comparar(actual, base, umbral=10.0):
+    """Filas (escenario, métrica, antes, ahora, cambio %, ¿empeoró?) entre dos corridas."""
+    filas = []
+    for nombre, ahora in actual['escenarios'].items():
+        antes = base.get('escenarios', {}).get(nombre)
+        if not antes:
+            continue
+        for metrica in ('p50_ms', 'p95_ms', 'consultas_por_request'):
+            if antes.get(metrica) in (None, 0):
+                continue
+            cambio = (ahora[metrica] - antes[metrica]) / antes[metrica] * 100
+            empeoro = cambio > umbral if metrica != 'consultas_por_request' else ahora[metrica] > antes[metrica]
+            filas.append((nombre, metrica, antes[metrica], ahora[metrica], cambio, empeoro))
+    return filas
+
+
+def medir_concurrencia(app, hilos=8, segundos=10, escrituras=True, semilla=1):
+    """Requests de lectura desde `hilos` hilos a la vez durante `segundos`, con un hilo
+    que además modifica clientes (un commit por cambio) si `escrituras`.
+
+    Valida la configuración del engine: con WAL y busy_timeout no debería haber
+    errores, y la espera por el pool muestra si DB_POOL_SIZE alcanza para los hilos.
+    """
+    rng = random.Random(semilla)
+    with app.app_context():
+        usuario = db.session.scalar(select(User).where(User.email == EMAIL_USUARIO))
+        if usuario is None:
+            raise RuntimeError('La base no tiene datos suficientes; ejecute antes `flask sembrar-rendimiento`.')
+        muestras = _muestras(rng, 200)
+        ruts = db.session.scalars(select(Cliente.rut).limit(1000)).all()
+        id_usuario = str(usuario.id)
+        engine = db.engine
+        db.session.remove()
+    urls = [url for nombre in ('notas_venta_folio', 'clientes_busqueda', 'historial_vehiculo', 'dashboard_ventas_api')
+            for url in muestras[nombre]]
+
+    fin = time.perf_counter() + segundos
+    tiempos, errores, escritas = [], [], [0]
+    bloqueo = threading.Lock()
+
+    def lector(indice):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['_user_id'] = id_usuario
+            sesion['_fresh'] = True
+        propio = random.Random(semilla + indice)
+        while time.perf_counter() < fin:
+            inicio = time.perf_counter()
+            try:
+                respuesta = cliente.get(propio.choice(urls))
+                respuesta.get_data()
+                error = None if respuesta.status_code == 200 else f'HTTP {respuesta.status_code}'
+            except Exception as e: # se cuenta y se sigue midiendo
+                error = f'{type(e).__name__}: {e}'
+            duracion = (time.perf_counter() - inicio) * 1000
+            with bloqueo:
+                tiempos.append(duracion)
+                if error:
+                    errores.append(error)
+
+    def escritor():
+        propio = random.Random(semilla)
+        with app.app_context():
+            while time.perf_counter() < fin:
+                try:
+                    cliente = db.session.get(Cliente, propio.choice(ruts))
+                    cliente.telefono = f'+569{propio.randrange(10 ** 8):08d}'
+                    db.session.commit()
+                    escritas[0] += 1
+                except Exception as e:
+                    db.session.rollback()
+                    with bloqueo:
+                        errores.append(f'escritura {type(e).__name__}: {e}')
+            db.session.remove()
+
+    trabajos = [threading.Thread(target=lector, args=(i,)) for i in range(hilos)]
+    if escrituras:
+        trabajos.append(threading.Thread(target=escritor))
+    inicio = time.perf_counter()
+    for t in trabajos:
+        t.start()
+    for t in trabajos:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    tiempos.sort()
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'base': engine.url.database,
+        'hilos': hilos,
+        'segundos': round(duracion, 1),
+        'requests': len(tiempos),
+        'requests_por_segundo': round(len(tiempos) / duracion, 1),
+        'p50_ms': round(_percentil(tiempos, 50) or 0, 2),
+        'p95_ms': round(_percentil(tiempos, 95) or 0, 2),
+        'escrituras': escritas[0],
+        'errores': len(errores),
+        'ejemplos_error': sorted(set(errores))[:5],
+        'pool': conexiones.metricas(engine),
+        'journal_mode': _journal_mode(engine),
+    }
+
+
+def carrera_de_ventas(app, vehiculos=4, hilos=8, semilla=1):
+    """`hilos` vendedores intentan vender a la vez cada uno de `vehiculos` vehículos disponibles.
+
+    Todos los POST a /notas-venta/crear salen juntos (threading.Barrier). Por
+    vehículo debe quedar exactamente una nota nueva y el vehículo vendido; los
+    demás intentos tienen que volver al formulario con el error de validación,
+    nunca con un 500 ni una segunda nota.
+    """
+    rng = random.Random(semilla)
+    with app.app_context():
+        usuario = db.session.scalar(select(User).where(User.email == EMAIL_USUARIO))
+        patentes = db.session.scalars(select(Vehiculo.patente).where(Vehiculo.estado == 'disponible')
+                                      .order_by(Vehiculo.patente).limit(vehiculos)).all()
+        ruts = db.session.scalars(select(Cliente.rut).limit(100)).all()
+        if usuario is None or len(patentes) < vehiculos or not ruts:
+            raise RuntimeError('La base no tiene vehículos disponibles suficientes.')
+        notas_antes = dict(db.session.execute(select(NotaVenta.vehiculo_patente, func.count())
+                                              .where(NotaVenta.vehiculo_patente.in_(patentes))
+                                              .group_by(NotaVenta.vehiculo_patente)).all())
+        id_usuario = str(usuario.id)
+        db.session.remove()
+
+    intentos = [(patente, rng.choice(ruts)) for patente in patentes for _ in range(hilos)]
+    largada = threading.Barrier(len(intentos))
+    respuestas, tiempos = [], []
+    bloqueo = threading.Lock()
+
+    def vendedor(patente, rut):
+        cliente = app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['_user_id'] = id_usuario
+            sesion['_fresh'] = True
+        datos = {'cliente_rut': rut, 'vehiculo_patente': patente, 'fecha_venta': date.today().isoformat(),
+                 'monto_final': 9990000, 'metodo_pago': 'contado', 'estado': 'completada',
+                 'monto_reserva': 0, 'dias_vigencia': 0, 'observaciones': ''}
+        largada.wait()
+        inicio = time.perf_counter()
+        try:
+            respuesta = cliente.post('/notas-venta/crear', data=datos)
+            resultado = {302: 'vendida', 200: 'rechazada'}.get(respuesta.status_code, f'HTTP {respuesta.status_code}')
+        except Exception as e:
+            resultado = f'{type(e).__name__}: {e}'
+        with bloqueo:
+            respuestas.append((patente, resultado))
+            tiempos.append((time.perf_counter() - inicio) * 1000)
+
+    trabajos = [threading.Thread(target=vendedor, args=intento) for intento in intentos]
+    inicio = time.perf_counter()
+    for t in trabajos:
+        t.start()
+    for t in trabajos:
+        t.join()
+    duracion = time.perf_counter() - inicio
+
+    with app.app_context():
+        notas_despues = dict(db.session.execute(select(NotaVenta.vehiculo_patente, func.count())
+                                                .where(NotaVenta.vehiculo_patente.in_(patentes))
+                                                .group_by(NotaVenta.vehiculo_patente)).all())
+        estados = dict(db.session.execute(select(Vehiculo.patente, Vehiculo.estado)
+                                          .where(Vehiculo.patente.in_(patentes))).all())
+        engine = db.engine
+        db.session.remove()
+
+    por_vehiculo = {}
+    for patente in patentes:
+        resultados = [r for p, r in respuestas if p == patente]
+        por_vehiculo[patente] = {
+            'vendidas': resultados.count('vendida'),
+            'rechazadas': resultados.count('rechazada'),
+            'errores': len(resultados) - resultados.count('vendida') - resultados.count('rechazada'),
+            'notas_nuevas': notas_despues.get(patente, 0) - notas_antes.get(patente, 0),
+            'estado': estados[patente],
+        }
+    tiempos.sort()
+    return {
+        'fecha': datetime.now().isoformat(timespec='seconds'),
+        'motor': engine.dialect.name,
+        'vehiculos': vehiculos,
+        'hilos_por_vehiculo': hilos,
+        'segundos': round(duracion, 2),
+        'p50_ms': round(_percentil(tiempos, 50) or 0, 2),
+        'p95_ms': round(_percentil(tiempos, 95) or 0, 2),
+        'por_vehiculo': por_vehiculo,
+        'ejemplos_error': sorted({r for _, r in respuestas if r not in ('vendida', 'rechazada')})[:5],
+        'ok': all(v['vendidas'] == 1 and v['notas_nuevas'] == 1 and v['errores'] == 0 and v['estado'] == 'vendido'
+                  for v in por_vehiculo.values()),
+    }
+
+
+def _journal_mode(engine):
+    with engine.connect() as conn:
+        return conn.exec_driver_sql('PRAGMA journal_mode').scalar()
+
+
+def crear_app(ruta, cache_pdf=False, **extra):
+    return create_app(configuracion(ruta, cache_pdf, **extra))
@@ -0,0 +1,231 @@
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import func, case, delete, insert, and_, or_
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from app import db, cache
+from .models import NotaVenta, Vehiculo, VentaDiaria
+
+# Comisión de consignación: 3% del monto final o $200.000 mínimo
+COMISION_PORCENTAJE = 0.03
+COMISION_MINIMA = 200000
+
+
+def ingreso_real_expr():
+    """Expresión SQL con la ganancia real de una nota (requiere join con Vehiculo).
+
+    Equivale al cálculo en Python:
+        compra_directa -> monto_final - costo_compra
+        consignación   -> max(monto_final * 0.03, 200000)
+    Se usa CASE en lugar de GREATEST/MAX para que funcione igual en SQLite y MySQL.
+    """
+    comision = NotaVenta.monto_final * COMISION_PORCENTAJE
+    return case(
+        (Vehiculo.tipo_adquisicion == 'compra_directa',
+         NotaVenta.monto_final - func.coalesce(Vehiculo.costo_compra, 0)),
+        (comision > COMISION_MINIMA, comision),
+        else_=COMISION_MINIMA
+    )
+
+
+def _numero(valor):
+    """Normaliza los resultados de SUM (Decimal en MySQL, float en SQLite) a int/float."""
+    if valor is None:
+        return 0
+    if isinstance(valor, Decimal):
+        valor = float(valor)
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _ahora():
+    """Momento del cálculo (UTC, ISO); viaja en la caché y se usa como Last-Modified de la API."""
+    return datetime.utcnow().replace(microsecond=0).isoformat()
+
+
+# Se invalidan al confirmar cambios en estos modelos (ver app/cache.py)
+cache.depende_de(Vehiculo, 'inventario')
+cache.depende_de(NotaVenta, 'ventas')
+cache.depende_de(VentaDiaria, 'ventas')
+
+
+@cache.memorizar('inventario')
+def resumen_inventario():
+    """Total de vehículos y disponibles en una sola consulta."""
+    total, disponibles = db.session.query(
+        func.count(Vehiculo.patente),
+        func.sum(case((Vehiculo.estado == 'disponible', 1), else_=0))
+    ).one()
+    return {'total_vehiculos': total or 0, 'disponibles': int(disponibles or 0), 'generado': _ahora()}
+
+
+@cache.memorizar('ventas')
+def resumen_ventas(fecha_inicio, fecha_fin):
+    """KPIs y series del dashboard para las ventas completadas del periodo.
+
+    Lee solo la tabla `ventas_diarias`, que tiene a lo sumo una fila por
+    (fecha, tipo de adquisición, marca), así que el costo no depende de
+    cuántas notas haya en el rango.
+    """
+    filas = db.session.query(
+        VentaDiaria.fecha,
+        VentaDiaria.tipo_adquisicion,
+        VentaDiaria.marca,
+        VentaDiaria.cantidad,
+        VentaDiaria.ingreso_real
+    ).filter(
+        VentaDiaria.fecha >= fecha_inicio,
+        VentaDiaria.fecha <= fecha_fin
+    ).order_by(VentaDiaria.fecha).all()
+
+    return dict(_plegar(filas), generado=_ahora())
+
+
+# --- MANTENCIÓN DEL RESUMEN DIARIO ---
+def _consulta_agregada():
+    """SELECT agrupado de ventas completadas con las mismas columnas que VentaDiaria."""
+    tipo = func.coalesce(Vehiculo.tipo_adquisicion, 'consignacion')
+    return db.session.query(
+        NotaVenta.fecha_venta,
+        tipo,
+        Vehiculo.marca,
+        func.count(NotaVenta.id),
+        func.sum(NotaVenta.monto_final),
+        func.sum(ingreso_real_expr())
+    ).join(Vehiculo, NotaVenta.vehiculo_patente == Vehiculo.patente).filter(
+        NotaVenta.estado == 'completada'
+    ).group_by(NotaVenta.fecha_venta, tipo, Vehiculo.marca)
+
+
+def clave_venta(nota, vehiculo=None):
+    """Fila de `ventas_diarias` a la que aporta la nota, o None si no aporta."""
+    vehiculo = vehiculo or nota.vehiculo
+    if nota.estado != 'completada' or vehiculo is None:
+        return None
+    return (nota.fecha_venta, vehiculo.tipo_adquisicion or 'consignacion', vehiculo.marca)
+
+
+def ingreso_real(nota, vehiculo):
+    """El mismo cálculo de ingreso_real_expr() para una nota ya cargada."""
+    if vehiculo.tipo_adquisicion == 'compra_directa':
+        return nota.monto_final - (vehiculo.costo_compra or 0)
+    return max(nota.monto_final * COMISION_PORCENTAJE, COMISION_MINIMA)
+
+
+def aportes_venta(pares):
+    """{clave: (cantidad, monto_total, ingreso_real)} con que aportan a `ventas_diarias` los pares (nota, vehiculo)."""
+    aportes = {}
+    for nota, vehiculo in pares:
+        vehiculo = vehiculo or nota.vehiculo
+        clave = clave_venta(nota, vehiculo)
+        if clave is None:
+            continue
+        cantidad, monto, ingreso = aportes.get(clave, (0, 0, 0))
+        aportes[clave] = (cantidad + 1, monto + (nota.monto_final or 0), ingreso + ingreso_real(nota, vehiculo))
+    return aportes
+
+
+def aportes_vehiculo(vehiculo):
+    """Aportes de las notas completadas del vehículo (ver aportes_venta)."""
+    return aportes_venta((nota, vehiculo) for nota in vehiculo.notas_venta.filter_by(estado='completada'))
+
+
+def _sumar(conn, clave, cantidad, monto, ingreso):
+    """Suma el delta a la fila `clave` en una sola sentencia (INSERT si no existe)."""
+    valores = dict(fecha=clave[0], tipo_adquisicion=clave[1], marca=clave[2],
+                   cantidad=cantidad, monto_total=monto, ingreso_real=ingreso)
+    if conn.dialect.name == 'mysql':
+        sentencia = mysql_insert(VentaDiaria).values(**valores)
+        nuevos = sentencia.inserted
+        return sentencia.on_duplicate_key_update(
+            cantidad=VentaDiaria.cantidad + nuevos.cantidad,
+            monto_total=VentaDiaria.monto_total + nuevos.monto_total,
+            ingreso_real=VentaDiaria.ingreso_real + nuevos.ingreso_real)
+    sentencia = sqlite_insert(VentaDiaria).values(**valores)
+    nuevos = sentencia.excluded
+    return sentencia.on_conflict_do_update(
+        index_elements=['fecha', 'tipo_adquisicion', 'marca'],
+        set_={'cantidad': VentaDiaria.cantidad + nuevos.cantidad,
+              'monto_total': VentaDiaria.monto_total + nuevos.monto_total,
+              'ingreso_real': VentaDiaria.ingreso_real + nuevos.ingreso_real})
+
+
+def actualizar_ventas_diarias(antes, despues):
+    """Aplica a `ventas_diarias` la diferencia entre dos aportes (ver aportes_venta).
+
+    Se llama dentro de la misma transacción que modifica las notas (antes del
+    commit), así el resumen nunca queda desfasado respecto de las notas. Cada
+    fila se actualiza con un upsert que suma el delta en la base (INSERT ... ON
+    DUPLICATE KEY UPDATE en MySQL, ON CONFLICT en SQLite): dos ventas
+    simultáneas del mismo día y marca esperan el bloqueo de la fila y ambas
+    cuentan, en vez de que la última escriba un total calculado sin ver a la
+    otra.
+    """
+    cero = (0, 0, 0)
+    claves = sorted(set(antes) | set(despues)) # mismo orden en toda transacción: sin deadlocks entre filas
+    conn = db.session.connection()
+    tocadas = []
+    for clave in claves:
+        delta = tuple(d - a for a, d in zip(antes.get(clave, cero), despues.get(clave, cero)))
+        if any(delta):
+            db.session.execute(_sumar(conn, clave, *delta))
+            tocadas.append(clave)
+    if tocadas:
+        # Filas que quedaron sin ventas. Un OR de igualdades (y no un IN de tuplas,
+        # que SQLite resuelve recorriendo la tabla) busca cada fila por la clave
+        db.session.execute(delete(VentaDiaria).where(
+            or_(*(and_(VentaDiaria.fecha == fecha, VentaDiaria.tipo_adquisicion == tipo, VentaDiaria.marca == marca)
+                  for fecha, tipo, marca in tocadas)),
+            VentaDiaria.cantidad <= 0), execution_options={'synchronize_session': False})
+
+
+def reconstruir_ventas_diarias():
+    """Vacía y vuelve a poblar `ventas_diarias` con un INSERT ... SELECT."""
+    db.session.query(VentaDiaria).delete()
+    db.session.execute(insert(VentaDiaria).from_select(
+        ['fecha', 'tipo_adquisicion', 'marca', 'cantidad', 'monto_total', 'ingreso_real'],
+        _consulta_agregada().statement
+    ))
+    db.session.commit()
+    return db.session.query(func.count()).select_from(VentaDiaria).scalar()
+
+
+def _plegar(filas):
+    """Convierte filas (fecha, tipo, marca, cantidad, ingreso) en el payload del dashboard."""
+    vendidos = 0
+    ingreso_real_total = 0
+    ventas_por_fecha = {}
+    ingresos_por_fecha = {}
+    ventas_por_adquisicion = {'consignacion': 0, 'compra_directa': 0}
+    marcas_vendidas = {}
+
+    for fecha, tipo, marca, cantidad, ingreso in filas:
+        ingreso = _numero(ingreso)
+        cantidad = int(cantidad)
+        if isinstance(fecha, str):
+            fecha = datetime.strptime(fecha, '%Y-%m-%d').date()
+        fecha_str = fecha.strftime('%d-%m-%Y')
+
+        vendidos += cantidad
+        ingreso_real_total += ingreso
+        ventas_por_fecha[fecha_str] = ventas_por_fecha.get(fecha_str, 0) + cantidad
+        ingresos_por_fecha[fecha_str] = ingresos_por_fecha.get(fecha_str, 0) + ingreso
+        ventas_por_adquisicion[tipo] = ventas_por_adquisicion.get(tipo, 0) + cantidad
+        marcas_vendidas[marca] = marcas_vendidas.get(marca, 0) + cantidad
+
+    # Ordenar datos de fechas cronológicamente
+    fechas_ordenadas = sorted(ventas_por_fecha.keys(), key=lambda x: datetime.strptime(x, '%d-%m-%Y'))
+
+    return {
+        'vendidos': vendidos,
+        'ingreso_real_total': ingreso_real_total,
+        'ingreso_formateado': "${:,.0f}".format(ingreso_real_total).replace(',', '.'),
+        'fechas_labels': fechas_ordenadas,
+        'grafico_ventas_data': [ventas_por_fecha[f] for f in fechas_ordenadas],
+        'grafico_ingresos_data': [ingresos_por_fecha[f] for f in fechas_ordenadas],
+        'marcas_labels': list(marcas_vendidas.keys()),
+        'marcas_data': list(marcas_vendidas.values()),
+        'adquisicion_labels': ['Consignación', 'Compra Directa'],
+        'adquisicion_data': [ventas_por_adquisicion.get('consignacion', 0), ventas_por_adquisicion.get('compra_directa', 0)],
+    }
@@ -0,0 +1,156 @@
+"""Vencimiento de las reservas (notas de venta en estado 'reservada').
+
+Una reserva vale dias_vigencia días corridos desde fecha_venta. La nota guarda
+esa fecha en vence_el (la calcula la sesión al guardar la nota; queda vacía si
+la nota no es una reserva o no tiene días de vigencia), así las vencidas salen
+de una sola consulta sobre el índice (estado, vence_el).
+
+    flask vencer-reservas
+
+anula las reservas con vence_el anterior a hoy, deja disponible el vehículo
+(si sigue 'reservado' y no tiene otra reserva vigente) y anota ambos cambios
+en la bitácora (ver app/eventos.py). Trabaja de a LOTE notas por transacción,
+con sentencias masivas (que incrementan la columna version, como lo haría el
+ORM).
+
+Además cada worker lo encola en la cola de tareas cada RESERVAS_BARRIDO_SEG
+segundos (0 lo desactiva, p. ej. si se prefiere un cron con el comando). El
+barrido es idempotente: que dos workers lo hagan a la vez no duplica nada.
+"""
+import time
+from datetime import date, datetime, timedelta
+from flask import current_app
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+from app import db, cola
+from .conexiones import iniciar_escritura
+from .eventos import CAMBIO_NOTA, REPUBLICADO, evento
+from .models import NotaVenta, RegistroHistorial, Vehiculo
+from .tareas import tarea
+
+LOTE = 500
+
+
+def vencimiento(estado, fecha_venta, dias_vigencia):
+    """Último día de vigencia de la reserva; None si la nota no vence."""
+    if estado != 'reservada' or not fecha_venta or not dias_vigencia:
+        return None
+    return fecha_venta + timedelta(days=dias_vigencia)
+
+
+@event.listens_for(Session, 'before_flush')
+def _calcular_vencimiento(session, flush_context, instances):
+    for obj in session.new | session.dirty:
+        if isinstance(obj, NotaVenta):
+            obj.vence_el = vencimiento(obj.estado, obj.fecha_venta, obj.dias_vigencia)
+
+
+# --- BARRIDO ---
+def _vencidas(hoy):
+    return (NotaVenta.estado == 'reservada', NotaVenta.vence_el < hoy)
+
+
+def consulta_vencidas(hoy, limite=LOTE):
+    """Las próximas `limite` reservas vencidas, recorriendo el índice (estado, vence_el)."""
+    return select(NotaVenta.id, NotaVenta.vehiculo_patente, NotaVenta.vence_el).where(
+        *_vencidas(hoy)).order_by(NotaVenta.vence_el, NotaVenta.id).limit(limite)
+
+
+def contar_vencidas(hoy=None):
+    return db.session.scalar(select(func.count()).select_from(NotaVenta).where(*_vencidas(hoy or date.today())))
+
+
+def _reclamar(vencidas):
+    """Las notas del lote que siguen 'reservada', bloqueadas hasta el commit.
+
+    El lote se leyó sin bloquear: otro barrido pudo anularlas entretanto. En
+    MySQL, FOR UPDATE SKIP LOCKED salta las que otro barrido tiene tomadas; en
+    SQLite, BEGIN IMMEDIATE hace esperar al otro escritor y la lectura ve lo
+    que ya confirmó.
+    """
+    iniciar_escritura(db.session)
+    return db.session.execute(
+        select(NotaVenta.id, NotaVenta.vehiculo_patente, NotaVenta.vence_el)
+        .where(NotaVenta.id.in_([n.id for n in vencidas]), NotaVenta.estado == 'reservada')
+        .order_by(NotaVenta.id).with_for_update(skip_locked=True)
+    ).all()
+
+
+def _anular_lote(vencidas):
+    """Anula las notas del lote que nadie anuló antes; devuelve (notas, vehículos liberados)."""
+    reclamadas = _reclamar(vencidas)
+    if not reclamadas:
+        db.session.commit()
+        return 0, 0
+    ids = [n.id for n in reclamadas]
+    patentes = {n.vehiculo_patente for n in reclamadas}
+    sin_sincronizar = {'synchronize_session': False}
+
+    db.session.execute(update(NotaVenta).where(NotaVenta.id.in_(ids))
+                       .values(estado='anulada', updated_at=datetime.utcnow(), version=NotaVenta.version + 1),
+                       execution_options=sin_sincronizar)
+
+    # Un vehículo que ya se vendió, o que tiene otra reserva vigente, no se toca
+    otra_reserva = select(NotaVenta.vehiculo_patente).where(
+        NotaVenta.estado == 'reservada', NotaVenta.vehiculo_patente.in_(patentes))
+    liberados = set(db.session.scalars(select(Vehiculo.patente).where(
+        Vehiculo.patente.in_(patentes), Vehiculo.estado == 'reservado', Vehiculo.patente.not_in(otra_reserva))))
+    if liberados:
+        db.session.execute(update(Vehiculo).where(Vehiculo.patente.in_(liberados), Vehiculo.estado == 'reservado')
+                           .values(estado='disponible', version=Vehiculo.version + 1), execution_options=sin_sincronizar)
+
+    ahora = datetime.now()
+    db.session.execute(insert(RegistroHistorial), [
+        *(evento(n.vehiculo_patente, CAMBIO_NOTA, ahora, nota=n.id, de='reservada', a='anulada',
+                 vencio_el=n.vence_el.isoformat()) for n in reclamadas),
+        *(evento(patente, REPUBLICADO, ahora, de='reservado', a='disponible') for patente in sorted(liberados)),
+    ])
+    db.session.commit()
+    return len(reclamadas), len(liberados)
+
+
+def vencer_reservas(hoy=None, lote=LOTE, avance=None):
+    """Anula las reservas vencidas antes de `hoy`, de a `lote` por transacción.
+
+    Devuelve un dict con las notas anuladas, los vehículos liberados y los lotes.
+    Si otro barrido tomó todo el lote, lo deja seguir a él.
+    """
+    hoy = hoy or date.today()
+    avance = avance or (lambda conteo: None)
+    conteo = {'notas': 0, 'vehiculos': 0, 'lotes': 0}
+    while True:
+        vencidas = db.session.execute(consulta_vencidas(hoy, lote)).all()
+        if not vencidas:
+            return conteo
+        notas, vehiculos = _anular_lote(vencidas)
+        if not notas:
+            return conteo
+        conteo['notas'] += notas
+        conteo['vehiculos'] += vehiculos
+        conteo['lotes'] += 1
+        avance(conteo)
+
+
+@tarea('vencer_reservas')
+def _vencer_reservas_tarea(datos):
+    conteo = vencer_reservas()
+    if conteo['notas']:
+        current_app.logger.info('Reservas vencidas: %s notas anuladas, %s vehículos liberados.',
+                                conteo['notas'], conteo['vehiculos'])
+
+
+# --- BARRIDO PERIÓDICO ---
+def init_app(app):
+    """Encola el barrido al primer request de cada worker y luego cada RESERVAS_BARRIDO_SEG segundos."""
+    intervalo = app.config.get('RESERVAS_BARRIDO_SEG', 3600)
+    if not intervalo:
+        return
+    ultimo = None # time.monotonic() del último encolado en este proceso
+
+    @app.before_request
+    def _barrido_periodico():
+        nonlocal ultimo
+        ahora = time.monotonic()
+        if ultimo is None or ahora - ultimo > intervalo:
+            ultimo = ahora
+            cola.encolar('vencer_reservas', {})
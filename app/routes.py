@@ -1,99 +1,168 @@
-from flask import render_template, request, flash, redirect, url_for, Blueprint, make_response, abort, current_app
+import hashlib
+import json
+from flask import render_template, request, flash, redirect, url_for, Blueprint, make_response, abort, current_app, Response, stream_with_context, send_from_directory, jsonify
 from flask_login import login_required, current_user
-from app import db
-from sqlalchemy import or_, cast, String, Date, func
+from app import db, cola, conexiones
+from sqlalchemy import Date, func
 from sqlalchemy.exc import IntegrityError
-from fpdf import FPDF
-import os
-from datetime import date, datetime
+from sqlalchemy.orm.exc import StaleDataError
+from datetime import date, datetime, timezone
 from .models import NotaVenta, Cliente, Vehiculo, Pago
-from .forms import NotaVentaForm, ClienteForm, VehiculoForm
-from .models import RegistroHistorial
+from .forms import NotaVentaForm, ClienteForm, VehiculoForm, ImportacionForm
+from .rut import normalizar as normalizar_rut
+from .busqueda import filtro_clientes, filtro_vehiculos, filtro_notas, ESTADOS_NOTA
+from .consultas import nota_con_cliente_y_vehiculo, nota_completa, vehiculo_con_propietario
+from .paginacion import paginar_por_cursor
+from .pdfs import datos_nota_venta, render_nota_venta, datos_devolucion, render_devolucion, datos_consignacion, render_consignacion
+from .pdf_cache import servir_pdf, obtener_o_renderizar, clave as clave_pdf, invalidar as invalidar_pdf
+from .tareas import tarea
+from .exportacion import FORMATOS as FORMATOS_EXPORTACION, zip_notas, pdf_unico
+from .exportacion import FORMATOS_PLANILLA, planilla_csv, planilla_xlsx, planilla_notas, planilla_vehiculos, planilla_clientes
+from . import importacion
+from .autocompletar import sugerir_clientes, sugerir_vehiculos
+from .historial import pagina_historial, eliminar_historial
+from .reportes import resumen_inventario, resumen_ventas, aportes_venta, aportes_vehiculo, actualizar_ventas_diarias
 bp = Blueprint('main', __name__)
 
+# Commit rechazado por la columna version: otra transacción cambió la fila antes
+MENSAJE_CONCURRENCIA = 'Otro usuario modificó este registro al mismo tiempo. No se guardaron los cambios; revise los datos e intente de nuevo.'
+
+MIMETYPES_PLANILLA = {
+    'csv': 'text/csv', # Flask agrega '; charset=utf-8'
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+
+
+def _paginar_por_cursor(query, columnas, per_page, descendente=False, consulta_total=None):
+    """Devuelve una PaginaCursor si el modo cursor está activo, o None para usar paginate()."""
+    if not (current_app.config.get('PAGINACION_CURSOR') or 'cursor' in request.args):
+        return None
+    return paginar_por_cursor(
+        query, columnas,
+        cursor=request.args.get('cursor'),
+        direccion=request.args.get('dir', 'siguiente'),
+        per_page=per_page,
+        descendente=descendente,
+        total=current_app.config.get('PAGINACION_TOTAL', 'exacto'),
+        consulta_total=consulta_total
+    )
+
+
+def _paginar(query, page, per_page, consulta_total):
+    """paginate() (con OFFSET) contando el total sobre `consulta_total` en vez de sobre `query`."""
+    pagina = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+    pagina.total = consulta_total.order_by(None).count()
+    return pagina
+
+
+def _validar_para_escribir(form):
+    """validate_on_submit() dentro de la transacción que luego guarda la nota.
+
+    Abre la transacción de escritura (BEGIN IMMEDIATE en SQLite) antes de que
+    el formulario lea y bloquee sus referencias; si el formulario no es válido
+    la cierra, para no retener el bloqueo mientras se muestra de nuevo.
+    """
+    if not form.is_submitted():
+        return False
+    conexiones.iniciar_escritura(db.session)
+    if form.validate():
+        return True
+    db.session.rollback()
+    return False
+
+
+def _planilla(nombre, columnas, consulta):
+    """Respuesta que envía la planilla (?formato=csv|xlsx) a medida que se genera."""
+    formato = request.args.get('formato', 'csv')
+    if formato not in FORMATOS_PLANILLA:
+        formato = 'csv'
+    generador = planilla_xlsx(columnas, consulta) if formato == 'xlsx' else planilla_csv(columnas, consulta)
+    return Response(stream_with_context(generador), mimetype=MIMETYPES_PLANILLA[formato], headers={
+        'Content-Disposition': f'attachment; filename={nombre}_{date.today():%Y-%m-%d}.{formato}'})
+
+
 # --- DASHBOARD ---
 @bp.route('/')
 @bp.route('/index')
 @login_required
 def index():
     # 1. Configurar Fechas (Por defecto: Mes actual)
+    fecha_inicio, fecha_fin = _rango_dashboard()
+
+    # 2. KPIs Generales Estáticos (Inventario)
+    inventario = resumen_inventario()
+
+    # 3. Ventas completadas del periodo, agregadas en la base de datos.
+    # Al cambiar el rango, la página pide solo /api/dashboard/ventas (ver index.html)
+    ventas = resumen_ventas(fecha_inicio, fecha_fin)
+
+    return render_template('index.html', title='Dashboard',
+                           fecha_inicio=fecha_inicio.strftime('%Y-%m-%d'),
+                           fecha_fin=fecha_fin.strftime('%Y-%m-%d'),
+                           total_vehiculos=inventario['total_vehiculos'],
+                           disponibles=inventario['disponibles'],
+                           ventas=_sin_generado(ventas))
+
+
+def _rango_dashboard():
+    """(fecha_inicio, fecha_fin) de la query string; por defecto el mes en curso. ValueError si no son fechas."""
     hoy = date.today()
-    inicio_mes = hoy.replace(day=1)
-    
-    fecha_inicio_str = request.args.get('fecha_inicio', inicio_mes.strftime('%Y-%m-%d'))
+    fecha_inicio_str = request.args.get('fecha_inicio', hoy.replace(day=1).strftime('%Y-%m-%d'))
     fecha_fin_str = request.args.get('fecha_fin', hoy.strftime('%Y-%m-%d'))
-    
-    fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
-    fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
+    return (datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date(),
+            datetime.strptime(fecha_fin_str, '%Y-%m-%d').date())
 
-    # 2. KPIs Generales Estáticos (Inventario)
-    total_vehiculos = Vehiculo.query.count()
-    disponibles = Vehiculo.query.filter_by(estado='disponible').count()
-    
-    # 3. Datos del periodo seleccionado
-    notas_periodo = NotaVenta.query.filter(
-        NotaVenta.fecha_venta >= fecha_inicio,
-        NotaVenta.fecha_venta <= fecha_fin,
-        NotaVenta.estado == 'completada'
-    ).all()
-    
-    vehiculos_vendidos_periodo = len(notas_periodo)
-    
-    # Variables para los cálculos
-    ingreso_real_total = 0
-    ventas_por_fecha = {}
-    ingresos_por_fecha = {}
-    ventas_por_adquisicion = {'consignacion': 0, 'compra_directa': 0}
-    marcas_vendidas = {}
-
-    # 4. Procesar cada venta completada
-    for nota in notas_periodo:
-        vehiculo = nota.vehiculo
-        if not vehiculo: continue 
-        
-        fecha_str = nota.fecha_venta.strftime('%d-%m-%Y')
-        
-        # CÁLCULO DE GANANCIA REAL
-        ingreso_nota = 0
-        if vehiculo.tipo_adquisicion == 'compra_directa':
-            ingreso_nota = nota.monto_final - (vehiculo.costo_compra or 0)
-        else:
-            # Consignación: 3% o $200.000 mínimo
-            ingreso_nota = max(nota.monto_final * 0.03, 200000)
-        
-        ingreso_real_total += ingreso_nota
-        
-        # Agrupar para los gráficos
-        ventas_por_fecha[fecha_str] = ventas_por_fecha.get(fecha_str, 0) + 1
-        ingresos_por_fecha[fecha_str] = ingresos_por_fecha.get(fecha_str, 0) + ingreso_nota
-        
-        tipo = vehiculo.tipo_adquisicion or 'consignacion'
-        ventas_por_adquisicion[tipo] = ventas_por_adquisicion.get(tipo, 0) + 1
-        
-        marcas_vendidas[vehiculo.marca] = marcas_vendidas.get(vehiculo.marca, 0) + 1
 
-    # Formatear dinero para la vista
-    ingreso_formateado = "${:,.0f}".format(ingreso_real_total).replace(',', '.')
+def _sin_generado(datos):
+    return {k: v for k, v in datos.items() if k != 'generado'}
+
+
+def _json_condicional(datos):
+    """JSON con ETag (hash del contenido) y Last-Modified (momento del cálculo).
+
+    El navegador revalida cada vez (no-cache) y, si los datos no cambiaron,
+    recibe un 304 sin cuerpo.
+    """
+    contenido = _sin_generado(datos)
+    response = jsonify(contenido)
+    response.set_etag(hashlib.sha1(json.dumps(contenido, sort_keys=True).encode()).hexdigest())
+    response.last_modified = datetime.fromisoformat(datos['generado']).replace(tzinfo=timezone.utc)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@bp.route('/api/dashboard/inventario')
+@login_required
+def api_dashboard_inventario():
+    return _json_condicional(resumen_inventario())
+
+
+@bp.route('/api/dashboard/ventas')
+@login_required
+def api_dashboard_ventas():
+    """KPIs y series de los gráficos para el rango ?fecha_inicio=&fecha_fin= (AAAA-MM-DD)."""
+    try:
+        fecha_inicio, fecha_fin = _rango_dashboard()
+    except ValueError:
+        return jsonify(error='Fechas inválidas; use el formato AAAA-MM-DD.'), 400
+    return _json_condicional(resumen_ventas(fecha_inicio, fecha_fin))
+
+
+# --- SUGERENCIAS PARA LA NOTA DE VENTA ---
+@bp.route('/api/autocompletar/clientes')
+@login_required
+def autocompletar_clientes():
+    """Clientes cuyo RUT empieza con ?q= (índice en memoria, ver app/autocompletar.py)."""
+    return jsonify([{'valor': valor, 'texto': texto} for valor, texto in sugerir_clientes(request.args.get('q', ''))])
+
+
+@bp.route('/api/autocompletar/vehiculos')
+@login_required
+def autocompletar_vehiculos():
+    """Vehículos disponibles cuya patente empieza con ?q=."""
+    return jsonify([{'valor': valor, 'texto': texto} for valor, texto in sugerir_vehiculos(request.args.get('q', ''))])
 
-    # Ordenar datos de fechas cronológicamente
-    fechas_ordenadas = sorted(ventas_por_fecha.keys(), key=lambda x: datetime.strptime(x, '%d-%m-%Y'))
-    grafico_ventas_data = [ventas_por_fecha[f] for f in fechas_ordenadas]
-    grafico_ingresos_data = [ingresos_por_fecha[f] for f in fechas_ordenadas]
 
-    return render_template('index.html', title='Dashboard',
-                           fecha_inicio=fecha_inicio_str,
-                           fecha_fin=fecha_fin_str,
-                           total_vehiculos=total_vehiculos,
-                           disponibles=disponibles,
-                           vendidos=vehiculos_vendidos_periodo,
-                           ingreso_formateado=ingreso_formateado,
-                           fechas_labels=fechas_ordenadas,
-                           grafico_ventas_data=grafico_ventas_data,
-                           grafico_ingresos_data=grafico_ingresos_data,
-                           marcas_labels=list(marcas_vendidas.keys()),
-                           marcas_data=list(marcas_vendidas.values()),
-                           adquisicion_labels=['Consignación', 'Compra Directa'],
-                           adquisicion_data=[ventas_por_adquisicion.get('consignacion', 0), ventas_por_adquisicion.get('compra_directa', 0)])
 # --- RUTAS DE NOTAS DE VENTA ---
 @bp.route('/notas-venta')
 @login_required
@@ -106,37 +175,20 @@ def listar_notas_venta():
     if per_page not in [20, 30, 50]:
         per_page = 20
     
-    # Usamos outerjoin para asegurar que siempre se muestren las notas
-    query = NotaVenta.query.outerjoin(Cliente).outerjoin(Vehiculo)
-
+    query = NotaVenta.query
     if search_query:
-        search_term = f"%{search_query}%"
-        
-        if search_field == 'folio':
-            query = query.filter(cast(NotaVenta.id, String).like(search_term))
-        elif search_field == 'cliente':
-            query = query.filter(or_(Cliente.nombre.like(search_term), Cliente.apellido.like(search_term), Cliente.rut.like(search_term)))
-        elif search_field == 'vehiculo':
-            query = query.filter(or_(Vehiculo.marca.like(search_term), Vehiculo.modelo.like(search_term), Vehiculo.patente.like(search_term)))
-        elif search_field == 'estado':
-            query = query.filter(NotaVenta.estado.like(search_term))
-        else:
-            query = query.filter(or_(
-                cast(NotaVenta.id, String).like(search_term),
-                Cliente.nombre.like(search_term),
-                Cliente.apellido.like(search_term),
-                Cliente.rut.like(search_term),
-                Vehiculo.marca.like(search_term),
-                Vehiculo.modelo.like(search_term),
-                Vehiculo.patente.like(search_term),
-                NotaVenta.estado.like(search_term)
-            ))
+        # Índice de texto (ver app/busqueda.py) en lugar de LIKE '%q%'
+        query = query.filter(filtro_notas(search_query, search_field))
+
+    # La página usa outerjoin para asegurar que siempre se muestren las notas, y
+    # esos mismos JOIN cargan cliente y vehículo para la plantilla. Se une por la
+    # relación porque Vehiculo también referencia a Cliente (propietario_rut).
+    # El total se cuenta sobre las notas solas: sin los JOIN lo resuelve un índice.
+    pagina = query.outerjoin(NotaVenta.cliente).outerjoin(NotaVenta.vehiculo).options(*nota_con_cliente_y_vehiculo())
 
     # Ordenamos por el ID de mayor a menor para garantizar la secuencia de ingreso real
-    notas = query.order_by(NotaVenta.id.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    
-    )
+    notas = _paginar_por_cursor(pagina, [NotaVenta.id], per_page, descendente=True, consulta_total=query) or \
+        _paginar(pagina.order_by(NotaVenta.id.desc()), page, per_page, consulta_total=query)
     
     return render_template(
         'notas_venta/listar.html',
@@ -144,24 +196,37 @@ def listar_notas_venta():
         notas=notas, 
         per_page=per_page,
         search_query=search_query,
-        search_field=search_field
+        search_field=search_field,
+        estados=ESTADOS_NOTA,
+        inicio_mes=date.today().replace(day=1).strftime('%Y-%m-%d'),
+        hoy=date.today().strftime('%Y-%m-%d')
     )
 
 
+@bp.route('/notas-venta/exportar')
+@login_required
+def exportar_notas_venta():
+    """Las notas del listado (misma búsqueda) en CSV o XLSX."""
+    search_field = request.args.get('search_field', 'todos')
+    search_query = request.args.get('q', '', type=str)
+    filtros = [filtro_notas(search_query, search_field)] if search_query else []
+    return _planilla('notas_venta', *planilla_notas(*filtros))
+
+
 @bp.route('/notas-venta/crear', methods=['GET', 'POST'])
 @login_required
 def crear_nota_venta():
     form = NotaVentaForm()
-    if form.validate_on_submit():
+    if _validar_para_escribir(form):
         try:
-            vehiculo = Vehiculo.query.get(form.vehiculo_patente.data)
+            vehiculo = form.referencias['vehiculo'] # ya cargado al validar
 
             pago = Pago(metodo_pago=form.metodo_pago.data, total=form.monto_final.data)
             db.session.add(pago)
             db.session.flush()
 
             nota = NotaVenta(
-                cliente_rut=form.cliente_rut.data,
+                cliente_rut=normalizar_rut(form.cliente_rut.data),
                 vehiculo_patente=form.vehiculo_patente.data,
                 user_id=current_user.id,
                 pago_id=pago.id,
@@ -175,19 +240,20 @@ def crear_nota_venta():
             db.session.add(nota)
 
             vehiculo.estado = 'reservado' if form.estado.data == 'reservada' else 'vendido'
-            db.session.add(vehiculo)
-            db.session.flush() # Para obtener el ID de la nota recién creada
-            evento = RegistroHistorial(
-                vehiculo_patente=vehiculo.patente, 
-                descripcion=f"Se creó la Nota de Venta #{nota.id} en estado '{form.estado.data}'."
-            )
-            db.session.add(evento)
+            db.session.add(vehiculo) # la sesión anota la nota y el cambio de estado en la bitácora (ver app/eventos.py)
+            actualizar_ventas_diarias({}, aportes_venta([(nota, vehiculo)]))
             db.session.commit()
-            flash('Nota de venta creada exitosamente.', 'success')
-            return redirect(url_for('main.listar_notas_venta'))
+        except StaleDataError:
+            db.session.rollback()
+            flash(MENSAJE_CONCURRENCIA, 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Ocurrió un error inesperado: {e}', 'danger')
+        else:
+            # Ya guardada: lo que sigue es accesorio y no pasa por el rollback de arriba
+            cola.encolar('pdf_nota_venta', {'id': nota.id})
+            flash('Nota de venta creada exitosamente.', 'success')
+            return redirect(url_for('main.listar_notas_venta'))
     return render_template('notas_venta/crear_editar.html', title='Crear Nota de Venta', form=form)
 
 
@@ -197,14 +263,14 @@ def editar_nota_venta(id):
     nota = db.session.get(NotaVenta, id) or abort(404)
     form = NotaVentaForm(obj=nota, nota_id=nota.id) 
     
-    if form.validate_on_submit():
+    if _validar_para_escribir(form):
         try:
-            vehiculo = Vehiculo.query.get(form.vehiculo_patente.data)
+            vehiculo = form.referencias['vehiculo'] # ya cargado al validar
 
-            # 1. Guardar el estado antiguo
-            estado_antiguo = nota.estado
+            # 1. Guardar el aporte antiguo al resumen diario
+            aporte_antiguo = aportes_venta([(nota, None)])
 
-            nota.cliente_rut = form.cliente_rut.data
+            nota.cliente_rut = normalizar_rut(form.cliente_rut.data)
             nota.vehiculo_patente = form.vehiculo_patente.data
             nota.fecha_venta = form.fecha_venta.data
             nota.monto_final = form.monto_final.data
@@ -227,20 +293,22 @@ def editar_nota_venta(id):
             elif form.estado.data == 'pendiente':
                 vehiculo.estado = 'vendido'
 
-            # 2. Registrar en la bitácora si hubo cambio de estado
-            if estado_antiguo != form.estado.data:
-                evento = RegistroHistorial(
-                    vehiculo_patente=vehiculo.patente, 
-                    descripcion=f"Nota de Venta #{nota.id} cambió de '{estado_antiguo}' a '{form.estado.data}'."
-                )
-                db.session.add(evento)
-
+            # 2. Los cambios de estado quedan en la bitácora al hacer flush (ver app/eventos.py)
+            actualizar_ventas_diarias(aporte_antiguo, aportes_venta([(nota, vehiculo)]))
             db.session.commit()
-            flash('Nota de venta actualizada con éxito.', 'success')
-            return redirect(url_for('main.listar_notas_venta'))
+        except StaleDataError:
+            db.session.rollback()
+            flash(MENSAJE_CONCURRENCIA, 'warning')
         except Exception as e:
             db.session.rollback()
             flash(f'Error al actualizar la nota de venta: {e}', 'danger')
+        else:
+            invalidar_pdf('nota_venta', nota.id)
+            cola.encolar('pdf_nota_venta', {'id': nota.id})
+            flash('Nota de venta actualizada con éxito.', 'success')
+            return redirect(url_for('main.listar_notas_venta'))
+    for error in form.version.errors:
+        flash(error, 'warning')
             
     form.cliente_rut.data = nota.cliente_rut
     form.vehiculo_patente.data = nota.vehiculo_patente
@@ -250,6 +318,7 @@ def editar_nota_venta(id):
     form.observaciones.data = nota.observaciones
     form.monto_reserva.data = nota.monto_reserva
     form.dias_vigencia.data = nota.dias_vigencia
+    form.version.data = nota.version
     if nota.pago:
         form.metodo_pago.data = nota.pago.metodo_pago
         
@@ -263,27 +332,26 @@ def eliminar_nota_venta(id):
     try:
         vehiculo = nota.vehiculo
         pago = nota.pago
+        aporte = aportes_venta([(nota, vehiculo)])
 
         # 1. Liberar el vehículo si existe
         if vehiculo:
-            vehiculo.estado = 'disponible'
-            # Dejar constancia del borrado en el historial
-            evento = RegistroHistorial(
-                vehiculo_patente=vehiculo.patente,
-                descripcion=f"Nota de Venta #{nota.id} fue eliminada. Vehículo vuelve a estado 'disponible'."
-            )
-            db.session.add(evento)
+            vehiculo.estado = 'disponible' # el borrado y el cambio de estado quedan en la bitácora (app/eventos.py)
 
         # 2. Borrar la nota y el pago
         db.session.delete(nota)
         if pago:
             db.session.delete(pago)
-            
+
+        actualizar_ventas_diarias(aporte, {})
         db.session.commit()
-        flash('Nota de venta eliminada. El vehículo ha vuelto a la lista de disponibles.', 'success')
     except Exception as e:
         db.session.rollback()
         flash(f'Error al eliminar la nota de venta: {e}', 'danger')
+    else:
+        invalidar_pdf('nota_venta', id)
+        invalidar_pdf('devolucion', id)
+        flash('Nota de venta eliminada. El vehículo ha vuelto a la lista de disponibles.', 'success')
         
     return redirect(url_for('main.listar_notas_venta'))
 
@@ -295,21 +363,24 @@ def listar_clientes():
     search_query = request.args.get('q', '', type=str)
     query = Cliente.query
     if search_query:
-        search_term = f"%{search_query}%"
-        query = query.filter(or_(
-            Cliente.rut.like(search_term),
-            Cliente.nombre.like(search_term),
-            Cliente.apellido.like(search_term)
-        ))
-    clientes = query.order_by(Cliente.nombre).paginate(page=page, per_page=15)
+        query = query.filter(filtro_clientes(search_query))
+    clientes = _paginar_por_cursor(query, [Cliente.nombre, Cliente.rut], 15) or \
+        query.order_by(Cliente.nombre).paginate(page=page, per_page=15)
     return render_template('listar_clientes.html', title='Listado de Clientes', clientes=clientes, search_query=search_query)
 
+@bp.route('/clientes/exportar')
+@login_required
+def exportar_clientes():
+    search_query = request.args.get('q', '', type=str)
+    filtros = [filtro_clientes(search_query)] if search_query else []
+    return _planilla('clientes', *planilla_clientes(*filtros))
+
 @bp.route('/clientes/crear', methods=['GET', 'POST'])
 @login_required
 def crear_cliente():
     form = ClienteForm()
     if form.validate_on_submit():
-        rut_limpio = form.rut.data.replace(".", "").replace("-", "").lower()
+        rut_limpio = normalizar_rut(form.rut.data)
         cliente = Cliente(
             rut=rut_limpio,
             nombre=form.nombre.data,
@@ -330,7 +401,7 @@ def editar_cliente(rut):
     cliente = Cliente.query.get_or_404(rut)
     form = ClienteForm(original_rut=cliente.rut, obj=cliente)
     if form.validate_on_submit():
-        rut_limpio = form.rut.data.replace(".", "").replace("-", "").lower()
+        rut_limpio = normalizar_rut(form.rut.data)
         cliente.rut = rut_limpio
         cliente.nombre = form.nombre.data
         cliente.apellido = form.apellido.data
@@ -363,13 +434,9 @@ def listar_vehiculos():
     search_query = request.args.get('q', '', type=str)
     query = Vehiculo.query.filter_by(estado='disponible')
     if search_query:
-        search_term = f"%{search_query}%"
-        query = query.filter(or_(
-            Vehiculo.patente.like(search_term),
-            Vehiculo.marca.like(search_term),
-            Vehiculo.modelo.like(search_term)
-        ))
-    vehiculos = query.order_by(Vehiculo.marca).paginate(page=page, per_page=15)
+        query = query.filter(filtro_vehiculos(search_query))
+    vehiculos = _paginar_por_cursor(query, [Vehiculo.marca, Vehiculo.patente], 15) or \
+        query.order_by(Vehiculo.marca).paginate(page=page, per_page=15)
     return render_template('listar_vehiculos.html', title='Listado de Vehículos', vehiculos=vehiculos, search_query=search_query)
 
 @bp.route('/vehiculos/vendidos')
@@ -383,14 +450,11 @@ def listar_vehiculos_vendidos():
 
     # Si hay texto en el buscador, filtrar
     if search:
-        query = query.filter(
-            (Vehiculo.patente.ilike(f'%{search}%')) |
-            (Vehiculo.marca.ilike(f'%{search}%')) |
-            (Vehiculo.modelo.ilike(f'%{search}%'))
-        )
+        query = query.filter(filtro_vehiculos(search))
 
     # Ordenar por fecha de creación (del más reciente al más antiguo)
-    vehiculos = query.order_by(Vehiculo.created_at.desc()).paginate(page=page, per_page=15, error_out=False)
+    vehiculos = _paginar_por_cursor(query, [Vehiculo.created_at, Vehiculo.patente], 15, descendente=True) or \
+        query.order_by(Vehiculo.created_at.desc()).paginate(page=page, per_page=15, error_out=False)
     
     
     # Agregamos search=search al final
@@ -398,6 +462,26 @@ def listar_vehiculos_vendidos():
 
 
 
+@bp.route('/vehiculos/exportar')
+@login_required
+def exportar_vehiculos():
+    """Inventario disponible (misma búsqueda que listar_vehiculos) en CSV o XLSX."""
+    search_query = request.args.get('q', '', type=str)
+    filtros = [Vehiculo.estado == 'disponible']
+    if search_query:
+        filtros.append(filtro_vehiculos(search_query))
+    return _planilla('inventario', *planilla_vehiculos(*filtros))
+
+@bp.route('/vehiculos/vendidos/exportar')
+@login_required
+def exportar_vehiculos_vendidos():
+    search = request.args.get('search', '')
+    filtros = [Vehiculo.estado == 'vendido']
+    if search:
+        filtros.append(filtro_vehiculos(search))
+    return _planilla('vehiculos_vendidos', *planilla_vehiculos(
+        *filtros, orden=[Vehiculo.created_at.desc(), Vehiculo.patente.desc()]))
+
 @bp.route('/vehiculos/relistar/<patente>', methods=['POST'])
 @login_required
 def relistar_vehiculo(patente):
@@ -412,7 +496,7 @@ def relistar_vehiculo(patente):
 def crear_vehiculo():
     form = VehiculoForm()
     if form.validate_on_submit():
-        rut_limpio = form.propietario_rut.data.replace(".", "").replace("-", "").lower()
+        rut_limpio = normalizar_rut(form.propietario_rut.data)
         
         vehiculo = Vehiculo(
             patente=form.patente.data,
@@ -443,7 +527,8 @@ def editar_vehiculo(patente):
     form = VehiculoForm(original_patente=vehiculo.patente, original_chasis_n=vehiculo.chasis_n, original_motor_n=vehiculo.motor_n, obj=vehiculo)
     
     if form.validate_on_submit():
-        rut_limpio = form.propietario_rut.data.replace(".", "").replace("-", "").lower()
+        rut_limpio = normalizar_rut(form.propietario_rut.data)
+        aportes_antiguos = aportes_vehiculo(vehiculo)
         vehiculo.tipo_adquisicion = form.tipo_adquisicion.data
         vehiculo.costo_compra = form.costo_compra.data
         vehiculo.propietario_rut = rut_limpio
@@ -458,11 +543,21 @@ def editar_vehiculo(patente):
         vehiculo.motor_n = form.motor_n.data
         vehiculo.valor = form.valor.data
         vehiculo.descripcion = form.descripcion.data
-        db.session.commit()
+        # Marca, tipo o costo de compra cambian el resumen de sus ventas ya completadas
+        actualizar_ventas_diarias(aportes_antiguos, aportes_vehiculo(vehiculo))
+        try:
+            db.session.commit()
+        except StaleDataError:
+            db.session.rollback()
+            flash(MENSAJE_CONCURRENCIA, 'warning')
+            return redirect(url_for('main.editar_vehiculo', patente=patente))
+        invalidar_pdf('consignacion', patente)
         flash('Vehículo actualizado con éxito.', 'success')
         return redirect(url_for('main.listar_vehiculos'))
         vehiculo.tipo_adquisicion = form.tipo_adquisicion.data
         vehiculo.costo_compra = form.costo_compra.data
+    for error in form.version.errors:
+        flash(error, 'warning')
     return render_template('crear_editar_simple.html', title='Editar Vehículo', form=form)
 
 
@@ -476,13 +571,13 @@ def eliminar_vehiculo(patente):
         return redirect(url_for('main.listar_vehiculos'))
         
     try:
-        # 1. Eliminar todo el historial asociado a este vehículo primero
-        for registro in vehiculo.registros.all():
-            db.session.delete(registro)
-            
+        # 1. Eliminar todo el historial asociado a este vehículo primero (un DELETE por tabla)
+        eliminar_historial(patente)
+
         # 2. Ahora sí, eliminar el vehículo
         db.session.delete(vehiculo)
         db.session.commit()
+        invalidar_pdf('consignacion', patente)
         flash('Vehículo y su historial eliminados con éxito.', 'success')
     except Exception as e:
         db.session.rollback()
@@ -490,323 +585,147 @@ def eliminar_vehiculo(patente):
         
     return redirect(url_for('main.listar_vehiculos'))
 
+# --- IMPORTACIÓN MASIVA ---
+@bp.route('/importar', methods=['GET', 'POST'])
+@login_required
+def importar():
+    form = ImportacionForm(tipo=request.args.get('tipo', 'clientes'))
+    resultado = informe = None
+    if form.validate_on_submit():
+        archivo = form.archivo.data
+        try:
+            filas = importacion.leer(form.tipo.data, archivo.stream, archivo.filename)
+            resultado = importacion.importar(form.tipo.data, filas)
+        except importacion.ErrorImportacion as e:
+            flash(str(e), 'danger')
+        else:
+            if resultado.errores:
+                informe = importacion.guardar_informe(form.tipo.data, resultado)
+                flash(f'Se importaron {resultado.insertadas} de {resultado.filas} filas; '
+                      f'{resultado.rechazadas} tienen errores.', 'warning')
+            else:
+                flash(f'Se importaron {resultado.insertadas} filas.', 'success')
+    return render_template('importar.html', title='Importación Masiva', form=form,
+                           resultado=resultado, informe=informe)
+
+@bp.route('/importar/informe/<nombre>')
+@login_required
+def informe_importacion(nombre):
+    return send_from_directory(importacion.directorio_informes(), nombre, as_attachment=True, mimetype='text/csv')
+
 # --- RUTAS DE PDF ---
-class PDF(FPDF):
-    def header(self):
-        # Ajustado para que encuentre el logo sin problemas
-        logo_path = os.path.join(current_app.static_folder, 'img', 'logo.png')
-        if os.path.exists(logo_path):
-            self.image(logo_path, 10, 8, 33)
-        self.set_font('Arial', 'B', 15)
-        self.cell(80)
-        self.cell(30, 10, 'Nota de Venta', 0, 0, 'C')
-        self.ln(20)
-
-    def footer(self):
-        self.set_y(-15)
-        self.set_font('Arial', 'I', 8)
-        self.cell(0, 10, f'Pagina {self.page_no()}', 0, 0, 'C')
-        self.cell(0, 10, 'Automotora Gonzalez | Gracias por su compra.', 0, 0, 'R')
+@tarea('pdf_nota_venta')
+def prerenderizar_nota_venta(datos):
+    """Deja el PDF de una nota recién creada o editada en la caché, antes de que alguien lo abra."""
+    if not current_app.config.get('PDF_CACHE_ACTIVO', True):
+        return
+    nota = db.session.get(NotaVenta, datos['id'], options=nota_completa())
+    if nota:
+        datos_pdf = datos_nota_venta(nota)
+        obtener_o_renderizar('nota_venta', nota.id, clave_pdf('nota_venta', datos_pdf), datos_pdf, render_nota_venta)
 
 @bp.route('/notas-venta/pdf/<int:id>')
 @login_required
 def generar_pdf(id):
-    nota = db.session.get(NotaVenta, id) or abort(404)
-    
-    pdf = PDF()
-    pdf.add_page()
-    
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, f"Folio: #{nota.id}", 0, 1)
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 10, f"Fecha de Venta: {nota.fecha_venta.strftime('%d-%m-%Y')}", 0, 1)
-    pdf.ln(5)
-
-    pdf.set_font('Arial', 'B', 12)
-    pdf.set_fill_color(230, 245, 230)
-    pdf.cell(95, 10, 'Datos del Cliente', 1, 0, 'C', fill=True)
-    pdf.cell(95, 10, 'Datos del Vendedor', 1, 1, 'C', fill=True)
-    
-    pdf.set_font('Arial', '', 10)
-    
-    # --- VARIABLES PROTEGIDAS ---
-    nombre_cliente = f"{nota.cliente.nombre} {nota.cliente.apellido}" if nota.cliente else "Cliente Borrado"
-    rut_cliente = nota.cliente.rut_formateado() if nota.cliente else "N/A"
-    telefono_cliente = nota.cliente.telefono if nota.cliente else "N/A"
-    direccion_cliente = f"{nota.cliente.direccion}, {nota.cliente.ciudad}" if nota.cliente else "N/A"
-
-    pdf.cell(95, 7, f"Nombre: {nombre_cliente}", 1, 0)
-    pdf.cell(95, 7, f"Nombre: {nota.vendedor.name}", 1, 1)
-    pdf.cell(95, 7, f"RUT: {rut_cliente}", 1, 0)
-    pdf.cell(95, 7, f"Email: {nota.vendedor.email}", 1, 1)
-    pdf.cell(95, 7, f"Telefono: {telefono_cliente}", 1, 0)
-    pdf.cell(95, 7, "", 1, 1) 
-    pdf.cell(0, 7, f"Direccion: {direccion_cliente}", 1, 1)
-    pdf.ln(5)
-
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Detalles del Vehiculo', 1, 1, 'C', fill=True)
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(95, 7, f"Patente: {nota.vehiculo.patente}", 1, 0)
-    pdf.cell(95, 7, f"Marca / Modelo: {nota.vehiculo.marca} {nota.vehiculo.modelo}", 1, 1)
-    pdf.cell(95, 7, f"Ano: {nota.vehiculo.ano}", 1, 0)
-    pdf.cell(95, 7, f"N Chasis: {nota.vehiculo.chasis_n}", 1, 1)
-    pdf.cell(95, 7, f"N Motor: {nota.vehiculo.motor_n}", 1, 0)
-    pdf.cell(95, 7, "", 1, 1)
-    pdf.ln(5)
-
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Condiciones de la Venta', 1, 1, 'C', fill=True)
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 7, f"Metodo de Pago: {nota.pago.metodo_pago.capitalize()}", 1, 1)
-
-    x = pdf.get_x()
-    y = pdf.get_y()
-    pdf.rect(x, y, 190, 30) 
-    pdf.set_xy(x + 2, y + 2)
-    pdf.multi_cell(186, 5, f"Observaciones: {nota.observaciones or 'Sin observaciones.'}", 0)
-    
-    pdf.set_xy(x, y + 30)
+    nota = db.session.get(NotaVenta, id, options=nota_completa()) or abort(404)
+    return servir_pdf('nota_venta', nota.id, datos_nota_venta(nota), render_nota_venta,
+                      f'nota_venta_{nota.id}.pdf')
 
-    pdf.set_font('Arial', 'B', 12) 
-    monto_formateado = "${:,.0f}".format(nota.monto_final).replace(',', '.')
-    monto_reserva = nota.monto_reserva or 0
-    saldo_pendiente = nota.monto_final - monto_reserva
-    
-    monto_res_formateado = "${:,.0f}".format(monto_reserva).replace(',', '.')
-    saldo_formateado = "${:,.0f}".format(saldo_pendiente).replace(',', '.')
-    
-    if nota.estado == 'reservada':
-        pdf.cell(0, 8, f"Monto Total Vehiculo: {monto_formateado}", 1, 1, 'R')
-        pdf.cell(0, 8, f"Abono de Reserva: {monto_res_formateado}", 1, 1, 'R')
-        pdf.cell(0, 8, f"Saldo Pendiente a Pagar: {saldo_formateado}", 1, 1, 'R')
-    elif nota.estado == 'completada' and monto_reserva > 0:
-        pdf.cell(0, 8, f"Monto Total Vehiculo: {monto_formateado}", 1, 1, 'R')
-        pdf.cell(0, 8, f"Abono Previo de Reserva: {monto_res_formateado}", 1, 1, 'R')
-        pdf.cell(0, 8, f"Total Pagado en este Acto: {saldo_formateado}", 1, 1, 'R')
-    else:
-        pdf.cell(0, 8, f"Monto Final Pagado: {monto_formateado}", 1, 1, 'R')
+@bp.route('/notas-venta/exportar-pdf')
+@login_required
+def exportar_notas_pdf():
+    """Todas las notas de un rango de fechas (y estado / búsqueda del listado) en un ZIP o un PDF."""
+    hoy = date.today()
+    fecha_inicio_str = request.args.get('fecha_inicio') or hoy.replace(day=1).strftime('%Y-%m-%d')
+    fecha_fin_str = request.args.get('fecha_fin') or hoy.strftime('%Y-%m-%d')
+    estado = request.args.get('estado', 'todos')
+    formato = request.args.get('formato', 'zip')
+    search_field = request.args.get('search_field', 'todos')
+    search_query = request.args.get('q', '', type=str)
 
-    pdf.ln(5)
-    pdf.set_font('Arial', '', 9)
-    texto_legal = ("El vehiculo es usado y se hace entrega en este acto, en las condiciones mecanicas y de carroceria en que se encuentra y es conocido por el comprador recibiendolo este conforme, por tanto no acoge a ningun reclamo posterior. Ademas ha sido completamente revisado por el comprador o un mecanico de su confianza, liberando de toda responsabilidad a Automotora Gonzalez ya que esta actua solo como comisionista. Los costos de transferencia son de cargo exclusivo del comprador y la documentacion debe efectuarse dentro de los 30 dias de la adquisicion y PARA CONFORMIDAD FIRMAN este recibo.")
-    pdf.multi_cell(0, 4, texto_legal)
-    
-    pdf.ln(15)
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
-    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
-    pdf.cell(90, 5, "Firma Cliente", 0, 0, 'C')
-    pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
-
-    if nota.estado == 'reservada':
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 14)
-        pdf.cell(0, 10, 'CONDICIONES DE LA RESERVA', 0, 1, 'C')
-        pdf.ln(5)
-        
-        pdf.set_font('Arial', '', 11)
-        condiciones = [
-            f"1. La reserva tendra una vigencia de {nota.dias_vigencia or 0} dias corridos desde la fecha de firma del presente documento.",
-            "2. Durante el periodo de reserva, la automotora se compromete a no ofrecer ni vender el vehiculo a terceros.",
-            "3. En caso de que el cliente desista de la compra por cualquier motivo, o no concrete la operacion dentro del plazo acordado, la suma entregada en reserva NO sera devuelta, quedando a beneficio de la automotora en compensacion por concepto de gastos administrativos, tiempo de publicacion y perdida de oportunidad de venta.",
-            "4. En caso de que la automotora no pueda concretar la venta por causas imputables exclusivamente a ella, el monto de la reserva sera devuelto integramente al cliente."
-        ]
-        
-        for condicion in condiciones:
-            pdf.multi_cell(0, 6, condicion)
-            pdf.ln(3)
-            
-        pdf.ln(5)
-        pdf.set_font('Arial', 'B', 12)
-        pdf.cell(0, 8, 'ACEPTACION', 0, 1, 'L')
-        pdf.set_font('Arial', '', 11)
-        pdf.multi_cell(0, 6, "El cliente declara haber revisado el vehiculo y aceptar su estado general, asi como las condiciones senaladas en este documento. Firman en senal de conformidad:")
-        
-        pdf.ln(35)
-        pdf.set_font('Arial', 'B', 11)
-        pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
-        pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
-        pdf.cell(90, 5, "Firma Cliente", 0, 0, 'C')
-        pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
-
-    response = make_response(bytes(pdf.output()))
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'inline; filename=nota_venta_{nota.id}.pdf'
-    return response
+    try:
+        fecha_inicio = datetime.strptime(fecha_inicio_str, '%Y-%m-%d').date()
+        fecha_fin = datetime.strptime(fecha_fin_str, '%Y-%m-%d').date()
+    except ValueError:
+        flash('Rango de fechas inválido.', 'danger')
+        return redirect(url_for('main.listar_notas_venta'))
+    if formato not in FORMATOS_EXPORTACION:
+        formato = 'zip'
+
+    query = NotaVenta.query.filter(NotaVenta.fecha_venta >= fecha_inicio, NotaVenta.fecha_venta <= fecha_fin)
+    if estado in ESTADOS_NOTA:
+        query = query.filter(NotaVenta.estado == estado)
+    if search_query:
+        query = query.filter(filtro_notas(search_query, search_field))
+    ids = [id_nota for (id_nota,) in query.with_entities(NotaVenta.id).order_by(NotaVenta.id)]
+
+    if not ids:
+        flash('No hay notas de venta para exportar con esos filtros.', 'warning')
+        return redirect(url_for('main.listar_notas_venta'))
+
+    nombre = f'notas_venta_{fecha_inicio_str}_{fecha_fin_str}'
+    if formato == 'pdf':
+        maximo = current_app.config.get('PDF_EXPORT_MAX_NOTAS', 500)
+        if len(ids) > maximo:
+            flash(f'Son {len(ids)} notas; el PDF único admite hasta {maximo}. Exporta en ZIP o acota las fechas.', 'warning')
+            return redirect(url_for('main.listar_notas_venta'))
+        response = make_response(pdf_unico(ids))
+        response.headers['Content-Type'] = 'application/pdf'
+        response.headers['Content-Disposition'] = f'attachment; filename={nombre}.pdf'
+        return response
+
+    # El ZIP se envía a medida que se renderiza; stream_with_context mantiene la
+    # sesión de base de datos disponible mientras el generador lee las notas.
+    return Response(stream_with_context(zip_notas(ids)), mimetype='application/zip',
+                    headers={'Content-Disposition': f'attachment; filename={nombre}.zip'})
 
 @bp.route('/notas-venta/pdf-devolucion/<int:id>')
 @login_required
 def generar_pdf_devolucion(id):
-    nota = db.session.get(NotaVenta, id) or abort(404)
+    nota = db.session.get(NotaVenta, id, options=nota_completa()) or abort(404)
     
     if nota.estado != 'anulada':
         flash('Solo se pueden generar comprobantes de devolución para notas anuladas.', 'warning')
         return redirect(url_for('main.listar_notas_venta'))
-        
-    pdf = PDF()
-    pdf.add_page()
-    
-    pdf.set_font('Arial', 'B', 16)
-    pdf.cell(0, 10, 'COMPROBANTE DE DEVOLUCION DE RESERVA', 0, 1, 'C')
-    pdf.ln(10)
-    
-    pdf.set_font('Arial', '', 12)
-    pdf.cell(0, 8, f"Folio Original: #{nota.id}", 0, 1)
-    # CORRECCIÓN: Solo datetime.now()
-    pdf.cell(0, 8, f"Fecha de Emision: {datetime.now().strftime('%d-%m-%Y')}", 0, 1)
-    pdf.ln(5)
-    
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Datos del Cliente y Vehiculo', 1, 1, 'C', fill=True)
-    pdf.set_font('Arial', '', 11)
-
-    # PROTECCIÓN: Variables seguras
-    nombre_cliente = f"{nota.cliente.nombre} {nota.cliente.apellido}" if nota.cliente else "Cliente Borrado"
-    rut_cliente = nota.cliente.rut_formateado() if nota.cliente else "N/A"
-    marca_modelo = f"{nota.vehiculo.marca} {nota.vehiculo.modelo}" if nota.vehiculo else "N/A"
-    patente = nota.vehiculo.patente if nota.vehiculo else "N/A"
-
-    pdf.cell(0, 8, f"Cliente: {nombre_cliente} (RUT: {rut_cliente})", 1, 1)
-    pdf.cell(0, 8, f"Vehiculo: {marca_modelo} (Patente: {patente})", 1, 1)
-    pdf.ln(5)
-    
-    pdf.set_font('Arial', 'B', 12)
-    pdf.cell(0, 10, 'Detalle de la Devolucion', 1, 1, 'C', fill=True)
-    pdf.set_font('Arial', '', 11)
-    
-    monto_res_formateado = "${:,.0f}".format(nota.monto_reserva or 0).replace(',', '.')
-    
-    texto_devolucion = (
-        f"Mediante el presente documento, Automotora Gonzalez deja constancia de la anulacion de la reserva "
-        f"correspondiente al folio #{nota.id}.\n\n"
-        f"Se realiza la devolucion integra del dinero abonado en concepto de reserva por un monto de "
-        f"{monto_res_formateado}, liberando a ambas partes de cualquier obligacion futura respecto a "
-        f"la compra de este vehiculo."
-    )
-    pdf.multi_cell(0, 8, texto_devolucion, 1)
-    pdf.ln(20)
-    
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
-    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
-    pdf.cell(90, 5, "Firma Cliente (Recibi Conforme)", 0, 0, 'C')
-    pdf.cell(90, 5, "Firma Automotora", 0, 1, 'C')
-    
-    response = make_response(bytes(pdf.output()))
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'inline; filename=devolucion_reserva_{nota.id}.pdf'
-    return response
+
+    return servir_pdf('devolucion', nota.id, datos_devolucion(nota), render_devolucion,
+                      f'devolucion_reserva_{nota.id}.pdf')
 
 @bp.route('/vehiculos/pdf-consignacion/<patente>')
 @login_required
 def generar_pdf_consignacion(patente):
-    from fpdf import FPDF
-    from flask import current_app
-    import os
-    
-    vehiculo = Vehiculo.query.get_or_404(patente)
+    vehiculo = Vehiculo.query.options(*vehiculo_con_propietario()).get_or_404(patente)
     
     if not vehiculo.propietario:
         flash('Este vehículo no tiene propietario registrado.', 'warning')
         return redirect(url_for('main.listar_vehiculos'))
 
-    # Iniciamos el PDF
-    pdf = FPDF()
-    pdf.add_page()
-    
-    # Reducimos los márgenes automáticos para asegurar que quepa en 1 hoja
-    pdf.set_auto_page_break(auto=True, margin=10)
-
-    # LOGO
-    logo_path = os.path.join(current_app.static_folder, 'img', 'logo.png') 
-    if os.path.exists(logo_path):
-        pdf.image(logo_path, x=10, y=8, w=30) # Logo un poco más pequeño para no empujar el texto
-    
-    # TÍTULO (Centrado y ajustado al espacio del logo)
-    pdf.set_y(15) 
-    pdf.set_font('Arial', 'B', 14)
-    pdf.cell(0, 8, 'CONTRATO DE CONSIGNACION DE VEHICULO', 0, 1, 'C')
-    
-    # Espacio extra después del título/logo
-    pdf.ln(12)
-
-    # I. IDENTIFICACIÓN
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(0, 6, 'I. IDENTIFICACION', 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 5, f"Nombre completo: {vehiculo.propietario.nombre} {vehiculo.propietario.apellido}", 0, 1)
-    pdf.cell(0, 5, f"RUT: {vehiculo.propietario.rut_formateado()}", 0, 1)
-    pdf.cell(0, 5, f"Direccion: {vehiculo.propietario.direccion}, {vehiculo.propietario.ciudad}", 0, 1)
-    pdf.cell(0, 5, f"Numero de celular: {vehiculo.propietario.telefono}", 0, 1)
-    pdf.ln(1)
-    pdf.multi_cell(0, 5, "Declara ser dueno del vehiculo individualizado a continuacion:")
-    pdf.ln(4)
-
-    # II. IDENTIFICACIÓN DEL VEHÍCULO
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(0, 6, 'II. IDENTIFICACION DEL VEHICULO', 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.cell(0, 5, f"Marca: {vehiculo.marca}", 0, 1)
-    pdf.cell(0, 5, f"Modelo: {vehiculo.modelo}", 0, 1)
-    pdf.cell(0, 5, f"Ano: {vehiculo.ano}", 0, 1)
-    pdf.cell(0, 5, f"Color: {vehiculo.color}", 0, 1)
-    pdf.cell(0, 5, f"Patente: {vehiculo.patente}", 0, 1)
-    pdf.cell(0, 5, f"Kilometraje: {vehiculo.kilometraje or 0} km", 0, 1)
-    pdf.cell(0, 5, f"N Chasis (VIN): {vehiculo.chasis_n}", 0, 1)
-    pdf.cell(0, 5, f"N Motor: {vehiculo.motor_n}", 0, 1)
-    pdf.ln(4)
-
-    # III. PRECIO SOLICITADO
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(0, 6, 'III. PRECIO SOLICITADO', 0, 1)
-    pdf.set_font('Arial', '', 10)
-    precio_formateado = "${:,.0f}".format(vehiculo.precio_acordado or 0).replace(',', '.')
-    pdf.cell(0, 6, f"Precio solicitado por el vehiculo: {precio_formateado}", 0, 1)
-    pdf.multi_cell(0, 5, "Toda oferta recibida sera comunicada oportunamente para su evaluacion y aprobacion antes de concretar la venta.")
-    pdf.ln(4)
-
-    # IV. COMISIÓN
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(0, 6, 'IV. COMISION DE LA AUTOMOTORA', 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.multi_cell(0, 5, "La comision por gestion de venta sera:\n\n"
-                         "  o  $200.000 como comision minima, o\n"
-                         "  o  El 3% del valor final de venta,\n\n"
-                         "Aplicandose el monto que resulte mayor.\n\n"
-                         "La comision sera descontada directamente del valor pagado por el comprador.")
-    pdf.ln(4)
-
-    # V. PAGO POR LAVADO Y MANTENCIÓN
-    pdf.set_font('Arial', 'B', 11)
-    pdf.cell(0, 6, 'V. PAGO POR LAVADO Y MANTENCION', 0, 1)
-    pdf.set_font('Arial', '', 10)
-    pdf.multi_cell(0, 5, "Se paga un monto unico de: $20.000\n"
-                         "Por concepto de lavado inicial y mantencion diaria de limpieza. Monto no reembolsable.")
-    
-    # FIRMAS
-    pdf.ln(6)
-    pdf.set_font('Arial', 'B', 10)
-    pdf.cell(0, 5, "Firmas:", 0, 1)
-    pdf.ln(12) # Espacio para que firmen a mano
-    pdf.cell(90, 5, "___________________________________", 0, 0, 'C')
-    pdf.cell(90, 5, "___________________________________", 0, 1, 'C')
-    pdf.cell(90, 5, "PROPIETARIO", 0, 0, 'C')
-    pdf.cell(90, 5, "AUTOMOTORA", 0, 1, 'C')
-
-    response = make_response(bytes(pdf.output()))
-    response.headers['Content-Type'] = 'application/pdf'
-    response.headers['Content-Disposition'] = f'inline; filename=consignacion_{vehiculo.patente}.pdf'
-    return response
+    return servir_pdf('consignacion', vehiculo.patente, datos_consignacion(vehiculo), render_consignacion,
+                      f'consignacion_{vehiculo.patente}.pdf')
 
 
 @bp.route('/vehiculos/historial/<patente>')
 @login_required
 def historial_vehiculo(patente):
-    vehiculo = Vehiculo.query.get_or_404(patente)
-    registros = vehiculo.registros.all() 
+    vehiculo = Vehiculo.query.options(*vehiculo_con_propietario()).get_or_404(patente)
+    # Una página de la bitácora (ver app/historial.py); las siguientes llegan por la API
+    registros, cursor_siguiente = pagina_historial(patente, request.args.get('cursor'))
     
     # Capturamos de dónde viene (por defecto será 'vehiculos')
     origen = request.args.get('origen', 'vehiculos') 
     
-    return render_template('historial_vehiculo.html', title=f'Historial: {vehiculo.patente}', vehiculo=vehiculo, registros=registros, origen=origen)
\ No newline at end of file
+    return render_template('historial_vehiculo.html', title=f'Historial: {vehiculo.patente}', vehiculo=vehiculo,
+                           registros=registros, cursor_siguiente=cursor_siguiente, origen=origen)
+
+
+@bp.route('/api/vehiculos/<patente>/historial')
+@login_required
+def api_historial_vehiculo(patente):
+    """Página de la bitácora en JSON: ?cursor= viene de cursor_siguiente de la página anterior."""
+    db.get_or_404(Vehiculo, patente)
+    registros, cursor_siguiente = pagina_historial(patente, request.args.get('cursor'))
+    return jsonify({
+        'registros': [{'fecha': r.fecha.strftime('%d-%m-%Y %H:%M'), 'codigo': r.codigo, 'datos': r.datos,
+                       'descripcion': r.descripcion, 'archivado': bool(r.archivado)} for r in registros],
+        'cursor_siguiente': cursor_siguiente,
+    })
\ No newline at end of file
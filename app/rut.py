@@ -0,0 +1,109 @@
+"""RUT chileno: normalización, dígito verificador (módulo 11) y formato.
+
+La base guarda el RUT normalizado: sin puntos ni guion y con la 'k' en
+minúscula ("12345678k"). En pantalla y en los PDF se muestra con formato
+("12.345.678-K" se muestra "12.345.678-k", igual que antes).
+
+API por registro, para formularios y vistas:
+
+    normalizar('12.345.678-5')  -> '123456785'
+    digito_verificador('12345678') -> '5'
+    es_valido('12.345.678-5')   -> True
+    formatear('123456785')      -> '12.345.678-5'
+
+API por lote, para importaciones y reportes (listas de cualquier largo):
+
+    normalizar_lote, validar_lote, formatear_lote
+
+validar_lote usa NumPy si está instalado: los RUT se convierten en una
+matriz de códigos de carácter y la suma ponderada del módulo 11 se calcula
+para todas las filas a la vez. Sin NumPy se usa la misma función por
+registro. Normalizar y formatear son armado de strings, donde NumPy no
+aporta; por lote usan str.translate y comprensiones de lista.
+"""
+from itertools import cycle
+
+try:
+    import numpy as np
+except ImportError: # dependencia opcional
+    np = None
+
+_SEPARADORES = str.maketrans('', '', '.-')
+_DV = '0123456789k'
+_PESOS = (2, 3, 4, 5, 6, 7)
+
+
+# --- POR REGISTRO ---
+def normalizar(rut):
+    """Sin puntos, guion ni espacios en los extremos, y en minúsculas."""
+    return rut.translate(_SEPARADORES).strip().lower()
+
+
+def digito_verificador(cuerpo):
+    """Dígito verificador ('0'-'9' o 'k') de un cuerpo numérico."""
+    suma = sum(int(d) * p for d, p in zip(reversed(str(cuerpo)), cycle(_PESOS)))
+    resto = 11 - suma % 11
+    return '0' if resto == 11 else 'k' if resto == 10 else str(resto)
+
+
+def separar(rut):
+    """(cuerpo, dv) de un RUT normalizado o con formato; None si no tiene la forma de un RUT."""
+    rut = normalizar(rut)
+    if len(rut) < 2 or not (rut[:-1].isascii() and rut[:-1].isdigit()) or rut[-1] not in _DV:
+        return None
+    return rut[:-1], rut[-1]
+
+
+def es_valido(rut):
+    partes = separar(rut)
+    return partes is not None and digito_verificador(partes[0]) == partes[1]
+
+
+def formatear(rut):
+    """'12.345.678-5' a partir de cualquier escritura; si no parece un RUT lo devuelve tal cual."""
+    partes = separar(rut)
+    if partes is None:
+        return rut
+    cuerpo, dv = partes
+    return f'{int(cuerpo):,}'.replace(',', '.') + f'-{dv}'
+
+
+# --- POR LOTE ---
+def normalizar_lote(ruts):
+    return [r.translate(_SEPARADORES).strip().lower() for r in ruts]
+
+
+def formatear_lote(ruts):
+    return [formatear(r) for r in ruts]
+
+
+def validar_lote(ruts, normalizados=False):
+    """Lista de bool, uno por RUT. Con normalizados=True se omite la normalización."""
+    if not normalizados:
+        ruts = normalizar_lote(ruts)
+    if np is None or not ruts:
+        return [es_valido(r) for r in ruts]
+    return _validar_numpy(ruts).tolist()
+
+
+def _validar_numpy(ruts):
+    # Matriz n x ancho de códigos Unicode; las posiciones sobrantes quedan en 0
+    codigos = np.array(ruts, dtype=str)
+    ancho = codigos.dtype.itemsize // 4
+    codigos = codigos.view(np.uint32).reshape(len(ruts), ancho).astype(np.int64)
+    largo = (codigos != 0).sum(axis=1)
+    filas = np.arange(len(ruts))
+    columnas = np.arange(ancho)
+
+    dv = codigos[filas, np.maximum(largo - 1, 0)]
+    en_cuerpo = columnas < (largo - 1)[:, None]
+    digitos = codigos - ord('0')
+    es_digito = (digitos >= 0) & (digitos <= 9)
+
+    # Peso de cada posición según su distancia al dígito verificador: 2, 3, ..., 7, 2, ...
+    pesos = 2 + ((largo - 2)[:, None] - columnas) % 6
+    suma = np.where(en_cuerpo, digitos * pesos, 0).sum(axis=1)
+    resto = 11 - suma % 11
+    esperado = np.where(resto == 11, ord('0'), np.where(resto == 10, ord('k'), ord('0') + resto))
+
+    return (largo >= 2) & (es_digito | ~en_cuerpo).all(axis=1) & (dv == esperado)
@@ -0,0 +1,359 @@
+"""Cola de tareas en segundo plano para correo, PDFs y otros efectos lentos.
+
+    from app import cola
+    cola.encolar('correo', {...})
+
+Los manejadores se registran por nombre con @tarea(nombre) y reciben `datos`,
+un dict serializable a JSON. Un número fijo de hilos (TAREAS_TRABAJADORES)
+atiende la cola, que admite a lo más TAREAS_MAX_PENDIENTES tareas: si está
+llena, encolar() descarta la tarea, lo deja en el log y devuelve False.
+
+Con lote=True el manejador recibe una lista de hasta TAREAS_LOTE `datos` del
+mismo tipo y devuelve una lista del mismo largo con None o la excepción de
+cada uno (así el correo usa una sola conexión SMTP por lote). Las tareas que
+fallan se reintentan con espera exponencial (TAREAS_REINTENTO_SEG, 2x, 4x...)
+hasta TAREAS_MAX_INTENTOS. Con TAREAS_SINCRONICAS la tarea corre dentro de
+encolar(), sin reintentos: si falla queda en el log y encolar() no propaga el
+error.
+
+Por defecto la cola vive en memoria y se pierde si el worker se reinicia. Con
+TAREAS_DB (ruta a un archivo SQLite, aparte de la base principal) las tareas
+se guardan en una tabla y cualquier worker retoma las pendientes, incluidas
+las que un worker caído dejó tomadas por más de TAREAS_BLOQUEO_SEG.
+"""
+import atexit
+import heapq
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from flask import current_app
+
+MANEJADORES = {}
+
+ESPERA_MAXIMA = 1.0 # segundos que un hilo espera tareas antes de volver a revisar
+
+
+def tarea(nombre, lote=False):
+    """Registra la función decorada como manejador de las tareas `nombre`."""
+    def registrar(funcion):
+        MANEJADORES[nombre] = (funcion, lote)
+        return funcion
+    return registrar
+
+
+class _Tarea:
+    __slots__ = ('id', 'nombre', 'datos', 'intentos', 'disponible_en')
+
+    def __init__(self, id, nombre, datos, intentos=0, disponible_en=0.0):
+        self.id = id
+        self.nombre = nombre
+        self.datos = datos
+        self.intentos = intentos
+        self.disponible_en = disponible_en
+
+
+# --- ALMACENAMIENTO ---
+class _Memoria:
+    """Montículo ordenado por hora de disponibilidad (los reintentos quedan más atrás)."""
+
+    def __init__(self, maximo):
+        self._maximo = maximo
+        self._monticulo = []
+        self._secuencia = itertools.count()
+        self._condicion = threading.Condition()
+
+    def poner(self, tarea):
+        with self._condicion:
+            if len(self._monticulo) >= self._maximo:
+                return False
+            self._empujar(tarea)
+            return True
+
+    def _empujar(self, tarea):
+        heapq.heappush(self._monticulo, (tarea.disponible_en, next(self._secuencia), tarea))
+        self._condicion.notify()
+
+    def tomar(self, maximo, espera):
+        """Hasta `maximo` tareas disponibles con el mismo nombre, o [] tras `espera` segundos."""
+        limite = time.monotonic() + espera
+        with self._condicion:
+            while True:
+                ahora = time.time()
+                if self._monticulo and self._monticulo[0][0] <= ahora:
+                    break
+                restante = limite - time.monotonic()
+                if restante <= 0:
+                    return []
+                if self._monticulo:
+                    restante = min(restante, self._monticulo[0][0] - ahora)
+                self._condicion.wait(restante)
+
+            lote = [heapq.heappop(self._monticulo)[2]]
+            otras = []
+            while self._monticulo and self._monticulo[0][0] <= ahora and len(lote) < maximo:
+                entrada = heapq.heappop(self._monticulo)
+                if entrada[2].nombre == lote[0].nombre:
+                    lote.append(entrada[2])
+                else:
+                    otras.append(entrada)
+            for entrada in otras:
+                heapq.heappush(self._monticulo, entrada)
+            return lote
+
+    def terminar(self, tarea):
+        pass
+
+    def reponer(self, tarea, error):
+        with self._condicion:
+            self._empujar(tarea) # Ya estaba contada: no se aplica el máximo
+
+    def fallar(self, tarea, error):
+        pass
+
+    def pendientes(self):
+        with self._condicion:
+            return len(self._monticulo)
+
+
+class _SQLite:
+    """Tabla `tareas` en un archivo SQLite compartido por todos los workers del servidor."""
+
+    def __init__(self, ruta, maximo, bloqueo):
+        self._ruta = ruta
+        self._maximo = maximo
+        self._bloqueo = bloqueo
+        self._local = threading.local()
+        self._condicion = threading.Condition()
+        conn = self._conexion()
+        conn.execute("""CREATE TABLE IF NOT EXISTS tareas (
+            id INTEGER PRIMARY KEY,
+            nombre TEXT NOT NULL,
+            datos TEXT NOT NULL,
+            intentos INTEGER NOT NULL DEFAULT 0,
+            disponible_en REAL NOT NULL,
+            estado TEXT NOT NULL DEFAULT 'pendiente',
+            tomada_en REAL,
+            error TEXT)""")
+        conn.execute('CREATE INDEX IF NOT EXISTS ix_tareas_estado_disponible ON tareas (estado, disponible_en)')
+
+    def _conexion(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            # Una conexión por hilo; autocommit y transacciones explícitas con BEGIN IMMEDIATE
+            conn = sqlite3.connect(self._ruta, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+        return conn
+
+    def poner(self, tarea):
+        conn = self._conexion()
+        if self.pendientes() >= self._maximo:
+            return False
+        conn.execute('INSERT INTO tareas (nombre, datos, disponible_en) VALUES (?, ?, ?)',
+                     (tarea.nombre, json.dumps(tarea.datos), tarea.disponible_en))
+        with self._condicion:
+            self._condicion.notify()
+        return True
+
+    def tomar(self, maximo, espera):
+        conn = self._conexion()
+        ahora = time.time()
+        disponible = ("((estado = 'pendiente' AND disponible_en <= ?) "
+                      "OR (estado = 'tomada' AND tomada_en <= ?))")
+        parametros = (ahora, ahora - self._bloqueo)
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            primera = conn.execute(f'SELECT nombre FROM tareas WHERE {disponible} '
+                                   'ORDER BY disponible_en LIMIT 1', parametros).fetchone()
+            filas = []
+            if primera:
+                filas = conn.execute(f'SELECT id, nombre, datos, intentos FROM tareas WHERE nombre = ? AND {disponible} '
+                                     'ORDER BY disponible_en LIMIT ?', (primera[0], *parametros, maximo)).fetchall()
+                conn.executemany("UPDATE tareas SET estado = 'tomada', tomada_en = ? WHERE id = ?",
+                                 [(ahora, fila[0]) for fila in filas])
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if not filas:
+            # Despierta antes si este proceso encola algo; lo de otros procesos se ve al volver a consultar
+            with self._condicion:
+                self._condicion.wait(espera)
+            return []
+        return [_Tarea(id, nombre, json.loads(datos), intentos) for id, nombre, datos, intentos in filas]
+
+    def terminar(self, tarea):
+        self._conexion().execute('DELETE FROM tareas WHERE id = ?', (tarea.id,))
+
+    def reponer(self, tarea, error):
+        self._conexion().execute(
+            "UPDATE tareas SET estado = 'pendiente', intentos = ?, disponible_en = ?, tomada_en = NULL, error = ? "
+            'WHERE id = ?', (tarea.intentos, tarea.disponible_en, repr(error), tarea.id))
+
+    def fallar(self, tarea, error):
+        # Se conserva para revisarla; `flask tareas-estado` las cuenta
+        self._conexion().execute("UPDATE tareas SET estado = 'fallida', intentos = ?, error = ? WHERE id = ?",
+                                 (tarea.intentos, repr(error), tarea.id))
+
+    def pendientes(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM tareas WHERE estado IN ('pendiente', 'tomada')").fetchone()[0]
+
+    def fallidas(self):
+        return self._conexion().execute("SELECT COUNT(*) FROM tareas WHERE estado = 'fallida'").fetchone()[0]
+
+
+# --- COLA ---
+class _Cola:
+    """Estado de la cola para una aplicación: almacenamiento, hilos y métricas."""
+
+    def __init__(self, app):
+        self.app = app
+        config = app.config
+        self.trabajadores = config.get('TAREAS_TRABAJADORES', 2)
+        self.lote = config.get('TAREAS_LOTE', 20)
+        self.max_intentos = config.get('TAREAS_MAX_INTENTOS', 5)
+        self.reintento_seg = config.get('TAREAS_REINTENTO_SEG', 5)
+        self.sincronica = config.get('TAREAS_SINCRONICAS', False)
+        maximo = config.get('TAREAS_MAX_PENDIENTES', 1000)
+        if config.get('TAREAS_DB'):
+            self.almacen = _SQLite(config['TAREAS_DB'], maximo, config.get('TAREAS_BLOQUEO_SEG', 300))
+        else:
+            self.almacen = _Memoria(maximo)
+        self.contadores = Counter()
+        self.en_curso = 0
+        self._bloqueo = threading.Lock()
+        self._hilos = []
+        self._pid = None
+        self._detenida = threading.Event()
+
+    def iniciar(self):
+        """Arranca los hilos si no están corriendo en este proceso (p. ej. tras un fork de gunicorn)."""
+        if self.sincronica or (self._pid == os.getpid() and self._hilos):
+            return
+        with self._bloqueo:
+            if self._pid == os.getpid() and self._hilos:
+                return
+            self._pid = os.getpid()
+            self._detenida.clear()
+            self._hilos = [threading.Thread(target=self._trabajar, name=f'tareas-{i}', daemon=True)
+                           for i in range(self.trabajadores)]
+            for hilo in self._hilos:
+                hilo.start()
+            atexit.register(self.detener)
+
+    def detener(self, espera=5.0):
+        self._detenida.set()
+        limite = time.monotonic() + espera
+        for hilo in self._hilos:
+            hilo.join(max(0, limite - time.monotonic()))
+        pendientes = self.almacen.pendientes()
+        if pendientes and isinstance(self.almacen, _Memoria):
+            self.app.logger.warning('Cola de tareas detenida con %s tareas en memoria sin procesar.', pendientes)
+
+    def encolar(self, nombre, datos):
+        if nombre not in MANEJADORES:
+            raise KeyError(f'Tarea sin manejador registrado: {nombre}')
+        if self.sincronica:
+            self._ejecutar([_Tarea(None, nombre, datos)])
+            return True
+        self.iniciar()
+        if not self.almacen.poner(_Tarea(None, nombre, datos, 0, time.time())):
+            self._contar('rechazadas')
+            self.app.logger.error('Cola de tareas llena: se descartó una tarea %s.', nombre)
+            return False
+        self._contar('encoladas')
+        return True
+
+    def _contar(self, clave, cantidad=1):
+        with self._bloqueo:
+            self.contadores[clave] += cantidad
+
+    def _trabajar(self):
+        while not self._detenida.is_set():
+            try:
+                lote = self.almacen.tomar(self.lote, ESPERA_MAXIMA)
+                if lote:
+                    self._ejecutar(lote)
+            except Exception:
+                self.app.logger.exception('Error en el hilo de la cola de tareas')
+                time.sleep(ESPERA_MAXIMA)
+
+    def _ejecutar(self, lote):
+        manejador, por_lote = MANEJADORES[lote[0].nombre]
+        with self._bloqueo:
+            self.en_curso += len(lote)
+        try:
+            with self.app.app_context():
+                if por_lote:
+                    try:
+                        errores = list(manejador([t.datos for t in lote]))
+                        if len(errores) != len(lote):
+                            raise RuntimeError(f'el manejador devolvió {len(errores)} resultados para {len(lote)} tareas')
+                    except Exception as e:
+                        errores = [e] * len(lote)
+                else:
+                    errores = []
+                    for t in lote:
+                        try:
+                            manejador(t.datos)
+                            errores.append(None)
+                        except Exception as e:
+                            errores.append(e)
+        finally:
+            with self._bloqueo:
+                self.en_curso -= len(lote)
+
+        for t, error in zip(lote, errores):
+            self._resultado(t, error)
+
+    def _resultado(self, t, error):
+        if error is None:
+            self.almacen.terminar(t)
+            self._contar('completadas')
+            return
+        if self.sincronica:
+            # Sin cola no hay reintento. La tarea es accesoria a lo que la encoló
+            # (un PDF, un correo): su error no debe convertir en error ese request
+            self._contar('fallidas')
+            self.app.logger.error('Tarea %s falló (modo sincrónico): %r', t.nombre, error, exc_info=error)
+            return
+        t.intentos += 1
+        if t.intentos < self.max_intentos:
+            t.disponible_en = time.time() + self.reintento_seg * 2 ** (t.intentos - 1)
+            self.almacen.reponer(t, error)
+            self._contar('reintentos')
+            self.app.logger.warning('Tarea %s falló (intento %s), se reintenta: %r', t.nombre, t.intentos, error)
+        else:
+            self.almacen.fallar(t, error)
+            self._contar('fallidas')
+            self.app.logger.error('Tarea %s descartada tras %s intentos: %r', t.nombre, t.intentos, error)
+
+    def metricas(self):
+        with self._bloqueo:
+            datos = dict(self.contadores)
+            datos['en_curso'] = self.en_curso
+        datos['pendientes'] = self.almacen.pendientes()
+        datos['trabajadores_vivos'] = sum(hilo.is_alive() for hilo in self._hilos) if self._pid == os.getpid() else 0
+        if isinstance(self.almacen, _SQLite):
+            datos['fallidas_guardadas'] = self.almacen.fallidas()
+        return datos
+
+
+class ColaTareas:
+    """Extensión de Flask; el estado de cada aplicación vive en app.extensions['tareas']."""
+
+    def init_app(self, app):
+        app.extensions['tareas'] = _Cola(app)
+        if app.config.get('TAREAS_DB'):
+            # El primer request de un worker nuevo retoma lo que quedó pendiente
+            app.before_request(app.extensions['tareas'].iniciar)
+
+    def encolar(self, nombre, datos=None):
+        return current_app.extensions['tareas'].encolar(nombre, datos or {})
+
+    def metricas(self):
+        return current_app.extensions['tareas'].metricas()
@@ -13,6 +13,9 @@ class Config:
 
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Réplica de solo lectura para los GET (opcional, ver app/conexiones.py)
+    DATABASE_REPLICA_URL = os.environ.get('DATABASE_REPLICA_URL')
+
     # 3. Configuración de Correo
     MAIL_SERVER = os.environ.get('MAIL_SERVER')
     MAIL_PORT = int(os.environ.get('MAIL_PORT') or 25)
@@ -20,3 +23,62 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     ADMINS = ['neronl2es@gmail.com']
+
+    # 4. Listados: paginación por cursor en vez de OFFSET (ver app/paginacion.py)
+    PAGINACION_CURSOR = os.environ.get('PAGINACION_CURSOR') is not None
+    PAGINACION_TOTAL = os.environ.get('PAGINACION_TOTAL') or 'exacto' # exacto | aproximado | ninguno
+
+    # 5. Caché de PDFs (ver app/pdf_cache.py); por defecto en instance/pdf_cache
+    PDF_CACHE_ACTIVO = os.environ.get('PDF_CACHE_DESACTIVADO') is None
+    PDF_CACHE_DIR = os.environ.get('PDF_CACHE_DIR')
+    PDF_CACHE_MAX_BYTES = int(os.environ.get('PDF_CACHE_MAX_MB') or 200) * 1024 * 1024
+
+    # 6. Exportación masiva de notas en PDF (ver app/exportacion.py)
+    PDF_EXPORT_PROCESOS = int(os.environ.get('PDF_EXPORT_PROCESOS') or 0) # 0 = un proceso por CPU
+    PDF_EXPORT_MAX_NOTAS = int(os.environ.get('PDF_EXPORT_MAX_NOTAS') or 500) # tope del PDF único
+
+    # 7. Cola de tareas en segundo plano: correo y PDFs (ver app/tareas.py)
+    TAREAS_TRABAJADORES = int(os.environ.get('TAREAS_TRABAJADORES') or 2)
+    TAREAS_MAX_PENDIENTES = int(os.environ.get('TAREAS_MAX_PENDIENTES') or 1000)
+    TAREAS_LOTE = int(os.environ.get('TAREAS_LOTE') or 20)
+    TAREAS_MAX_INTENTOS = int(os.environ.get('TAREAS_MAX_INTENTOS') or 5)
+    TAREAS_REINTENTO_SEG = float(os.environ.get('TAREAS_REINTENTO_SEG') or 5)
+    TAREAS_DB = os.environ.get('TAREAS_DB') # archivo SQLite; sin definir la cola queda solo en memoria
+    TAREAS_BLOQUEO_SEG = int(os.environ.get('TAREAS_BLOQUEO_SEG') or 300)
+    TAREAS_SINCRONICAS = os.environ.get('TAREAS_SINCRONICAS') is not None # ejecuta en el mismo request (pruebas)
+
+    # 8. Instrumentación por request: /metricas, log de lentos y cProfile (ver app/instrumentacion.py)
+    INSTRUMENTACION = os.environ.get('INSTRUMENTACION') is not None
+    INSTRUMENTACION_LENTO_MS = int(os.environ.get('INSTRUMENTACION_LENTO_MS') or 500)
+    INSTRUMENTACION_TOKEN = os.environ.get('INSTRUMENTACION_TOKEN') # si se define, /metricas lo exige; si no, solo responde a 127.0.0.1
+    INSTRUMENTACION_PERFIL_DIR = os.environ.get('INSTRUMENTACION_PERFIL_DIR') # un .prof por request
+
+    # 9. Importación masiva de clientes y vehículos (ver app/importacion.py)
+    IMPORTACION_LOTE = int(os.environ.get('IMPORTACION_LOTE') or 500) # filas por transacción
+
+    # 10. Caché de corta duración del dashboard y conteos de inventario (ver app/cache.py)
+    CACHE_DB = os.environ.get('CACHE_DB') # archivo SQLite compartido entre workers
+    CACHE_BACKEND = os.environ.get('CACHE_BACKEND') or ('sqlite' if CACHE_DB else 'memoria') # memoria | sqlite | ninguno
+    CACHE_TTL_SEG = int(os.environ.get('CACHE_TTL_SEG') or 30)
+    CACHE_MAX_ENTRADAS = int(os.environ.get('CACHE_MAX_ENTRADAS') or 500)
+
+    # 11. Sugerencias de RUT y patente en la nota de venta (ver app/autocompletar.py)
+    AUTOCOMPLETAR_REFRESCO_SEG = int(os.environ.get('AUTOCOMPLETAR_REFRESCO_SEG') or 300) # recarga completa del índice
+
+    # 12. Pool de conexiones y opciones del engine (ver app/conexiones.py y gunicorn.conf.py)
+    # Por worker: una conexión por hilo de gunicorn más las de la cola de tareas
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE') or int(os.environ.get('GUNICORN_THREADS') or 4) + TAREAS_TRABAJADORES)
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW') or 2)
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT') or 30)
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE') or 280) # menor que el wait_timeout de MySQL
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_SIN_PRE_PING') is None
+    SQLITE_WAL = os.environ.get('SQLITE_SIN_WAL') is None
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS') or 5000)
+    SQLITE_CACHE_MB = int(os.environ.get('SQLITE_CACHE_MB') or 32)
+    DB_REPLICA_PEGAJOSO_SEG = int(os.environ.get('DB_REPLICA_PEGAJOSO_SEG') or 10) # lecturas al primario tras escribir
+
+    # 13. Historial de vehículos (ver app/historial.py)
+    HISTORIAL_ARCHIVAR_DIAS = int(os.environ.get('HISTORIAL_ARCHIVAR_DIAS') or 365) # `flask archivar-historial`
+
+    # 14. Vencimiento de reservas (ver app/reservas.py)
+    RESERVAS_BARRIDO_SEG = int(os.environ.get('RESERVAS_BARRIDO_SEG') or 3600) # 0 = solo con `flask vencer-reservas`
@@ -0,0 +1,37 @@
+"""Configuración de gunicorn: `gunicorn -c gunicorn.conf.py wsgi:app`.
+
+Cada worker es un proceso con su propio pool de conexiones (ver
+app/conexiones.py). config.py dimensiona ese pool con GUNICORN_THREADS, que
+se fija aquí antes de cargar la aplicación, así el pool siempre alcanza para
+todos los hilos del worker.
+"""
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND') or '0.0.0.0:8000'
+workers = int(os.environ.get('WEB_CONCURRENCY') or min(multiprocessing.cpu_count() * 2 + 1, 8))
+threads = int(os.environ.get('GUNICORN_THREADS') or 4)
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.environ.get('GUNICORN_TIMEOUT') or 60)
+
+# Leídas por config.py en cada worker
+os.environ['GUNICORN_THREADS'] = str(threads)
+
+
+def when_ready(server):
+    from config import Config
+    por_worker = Config.DB_POOL_SIZE + Config.DB_MAX_OVERFLOW
+    server.log.info('Pool de base de datos: %s workers x %s conexiones = hasta %s conexiones',
+                    workers, por_worker, workers * por_worker)
+
+
+def post_fork(server, worker):
+    # Con --preload los engines (primario y réplica) se crean en el
+    # proceso maestro: las conexiones heredadas no se pueden compartir entre
+    # procesos, se descartan.
+    if server.cfg.preload_app:
+        from app import db
+        from wsgi import app
+        with app.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
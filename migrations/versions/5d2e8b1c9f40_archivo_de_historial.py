@@ -0,0 +1,32 @@
+"""Tabla registro_historial_archivo para el historial antiguo
+
+Revision ID: 5d2e8b1c9f40
+Revises: 874ad0e953f6
+Create Date: 2026-10-18 12:41:07.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d2e8b1c9f40'
+down_revision = '874ad0e953f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Se llena con `flask archivar-historial` (ver app/historial.py)
+    op.create_table('registro_historial_archivo',
+    sa.Column('vehiculo_patente', sa.String(length=10), nullable=False),
+    sa.Column('fecha', sa.DateTime(), nullable=False),
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('descripcion', sa.String(length=255), nullable=False),
+    sa.PrimaryKeyConstraint('vehiculo_patente', 'fecha', 'id'),
+    sqlite_with_rowid=False
+    )
+
+
+def downgrade():
+    op.drop_table('registro_historial_archivo')
@@ -0,0 +1,51 @@
+"""Tabla ventas_diarias para el dashboard
+
+Revision ID: 7c3e91a4d5b2
+Revises: 2b1afb7f1c29
+Create Date: 2026-10-18 10:12:31.402118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7c3e91a4d5b2'
+down_revision = '2b1afb7f1c29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('ventas_diarias',
+    sa.Column('fecha', sa.Date(), nullable=False),
+    sa.Column('tipo_adquisicion', sa.String(length=50), nullable=False),
+    sa.Column('marca', sa.String(length=50), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.Column('monto_total', sa.BigInteger(), nullable=False),
+    sa.Column('ingreso_real', sa.Numeric(precision=14, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('fecha', 'tipo_adquisicion', 'marca')
+    )
+
+    # Poblar con las ventas existentes (misma regla que app/reportes.py)
+    op.execute("""
+        INSERT INTO ventas_diarias (fecha, tipo_adquisicion, marca, cantidad, monto_total, ingreso_real)
+        SELECT n.fecha_venta,
+               COALESCE(v.tipo_adquisicion, 'consignacion'),
+               v.marca,
+               COUNT(n.id),
+               SUM(n.monto_final),
+               SUM(CASE
+                       WHEN v.tipo_adquisicion = 'compra_directa' THEN n.monto_final - COALESCE(v.costo_compra, 0)
+                       WHEN n.monto_final * 0.03 > 200000 THEN n.monto_final * 0.03
+                       ELSE 200000
+                   END)
+        FROM notas_de_venta n
+        JOIN vehiculos v ON n.vehiculo_patente = v.patente
+        WHERE n.estado = 'completada'
+        GROUP BY n.fecha_venta, COALESCE(v.tipo_adquisicion, 'consignacion'), v.marca
+    """)
+
+
+def downgrade():
+    op.drop_table('ventas_diarias')
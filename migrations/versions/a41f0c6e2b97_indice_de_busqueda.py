@@ -0,0 +1,48 @@
+"""Indice de busqueda de texto (FTS5 en SQLite, FULLTEXT en MySQL)
+
+Revision ID: a41f0c6e2b97
+Revises: 7c3e91a4d5b2
+Create Date: 2026-10-18 11:03:54.218730
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a41f0c6e2b97'
+down_revision = '7c3e91a4d5b2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+
+    if dialecto == 'sqlite':
+        # Tabla virtual mantenida por app/busqueda.py desde los eventos de sesión
+        op.execute(
+            'CREATE VIRTUAL TABLE busqueda_fts USING fts5('
+            'entidad UNINDEXED, clave UNINDEXED, texto, tokenize="unicode61 remove_diacritics 2")'
+        )
+        op.execute(
+            "INSERT INTO busqueda_fts (entidad, clave, texto) "
+            "SELECT 'cliente', rut, rut || ' ' || nombre || ' ' || apellido FROM clientes"
+        )
+        op.execute(
+            "INSERT INTO busqueda_fts (entidad, clave, texto) "
+            "SELECT 'vehiculo', patente, patente || ' ' || marca || ' ' || modelo FROM vehiculos"
+        )
+    elif dialecto == 'mysql':
+        op.create_index('ft_clientes_busqueda', 'clientes', ['rut', 'nombre', 'apellido'], mysql_prefix='FULLTEXT')
+        op.create_index('ft_vehiculos_busqueda', 'vehiculos', ['patente', 'marca', 'modelo'], mysql_prefix='FULLTEXT')
+
+
+def downgrade():
+    dialecto = op.get_bind().dialect.name
+
+    if dialecto == 'sqlite':
+        op.execute('DROP TABLE busqueda_fts')
+    elif dialecto == 'mysql':
+        op.drop_index('ft_vehiculos_busqueda', table_name='vehiculos')
+        op.drop_index('ft_clientes_busqueda', table_name='clientes')
@@ -0,0 +1,32 @@
+"""Columna version en vehiculos y notas_de_venta (concurrencia optimista)
+
+Revision ID: b7d4c19e6a53
+Revises: e8a3f0c27d16
+Create Date: 2026-10-18 15:32:14.906218
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7d4c19e6a53'
+down_revision = 'e8a3f0c27d16'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notas_de_venta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+    with op.batch_alter_table('vehiculos', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('version', sa.Integer(), server_default='1', nullable=False))
+
+
+def downgrade():
+    with op.batch_alter_table('vehiculos', schema=None) as batch_op:
+        batch_op.drop_column('version')
+
+    with op.batch_alter_table('notas_de_venta', schema=None) as batch_op:
+        batch_op.drop_column('version')
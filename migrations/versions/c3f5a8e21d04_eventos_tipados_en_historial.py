@@ -0,0 +1,49 @@
+"""Código y datos JSON en registro_historial (eventos tipados)
+
+Revision ID: c3f5a8e21d04
+Revises: b7d4c19e6a53
+Create Date: 2026-10-18 17:08:51.240913
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3f5a8e21d04'
+down_revision = 'b7d4c19e6a53'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Los registros existentes quedan como texto libre (codigo 0); ver app/eventos.py
+    with op.batch_alter_table('registro_historial', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('codigo', sa.SmallInteger(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('datos', sa.JSON(), nullable=True))
+        batch_op.alter_column('descripcion', existing_type=sa.String(length=255), nullable=True)
+        batch_op.create_index('ix_registro_historial_codigo_fecha', ['codigo', 'fecha'], unique=False)
+
+    with op.batch_alter_table('registro_historial_archivo', schema=None,
+                              table_kwargs={'sqlite_with_rowid': False}) as batch_op:
+        batch_op.add_column(sa.Column('codigo', sa.SmallInteger(), server_default='0', nullable=False))
+        batch_op.add_column(sa.Column('datos', sa.JSON(), nullable=True))
+        batch_op.alter_column('descripcion', existing_type=sa.String(length=255), nullable=True)
+
+
+def downgrade():
+    # Los eventos tipados no tienen descripcion: se pierden al volver atrás
+    op.execute('DELETE FROM registro_historial WHERE codigo <> 0')
+    op.execute('DELETE FROM registro_historial_archivo WHERE codigo <> 0')
+
+    with op.batch_alter_table('registro_historial_archivo', schema=None,
+                              table_kwargs={'sqlite_with_rowid': False}) as batch_op:
+        batch_op.alter_column('descripcion', existing_type=sa.String(length=255), nullable=False)
+        batch_op.drop_column('datos')
+        batch_op.drop_column('codigo')
+
+    with op.batch_alter_table('registro_historial', schema=None) as batch_op:
+        batch_op.drop_index('ix_registro_historial_codigo_fecha')
+        batch_op.alter_column('descripcion', existing_type=sa.String(length=255), nullable=False)
+        batch_op.drop_column('datos')
+        batch_op.drop_column('codigo')
@@ -0,0 +1,49 @@
+"""Claves del indice de busqueda: rowid de cada (entidad, clave) en busqueda_fts
+
+Revision ID: d9b2e4f71a38
+Revises: c3f5a8e21d04
+Create Date: 2026-10-18 19:42:17.503118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd9b2e4f71a38'
+down_revision = 'c3f5a8e21d04'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # FTS5 no indexa entidad ni clave: app/busqueda.py borra las filas por rowid
+    # buscándolo aquí. Se repuebla el índice para que cada fila tenga el suyo.
+    op.execute(
+        'CREATE TABLE busqueda_fts_claves ('
+        'id INTEGER PRIMARY KEY, entidad VARCHAR(10) NOT NULL, clave VARCHAR(10) NOT NULL, '
+        'UNIQUE (entidad, clave))'
+    )
+    op.execute('DELETE FROM busqueda_fts')
+    op.execute(
+        "INSERT INTO busqueda_fts_claves (entidad, clave) "
+        "SELECT 'cliente', rut FROM clientes UNION ALL SELECT 'vehiculo', patente FROM vehiculos"
+    )
+    op.execute(
+        "INSERT INTO busqueda_fts (rowid, entidad, clave, texto) "
+        "SELECT k.id, k.entidad, k.clave, rut || ' ' || nombre || ' ' || apellido "
+        "FROM busqueda_fts_claves k JOIN clientes ON k.entidad = 'cliente' AND k.clave = clientes.rut"
+    )
+    op.execute(
+        "INSERT INTO busqueda_fts (rowid, entidad, clave, texto) "
+        "SELECT k.id, k.entidad, k.clave, patente || ' ' || marca || ' ' || modelo "
+        "FROM busqueda_fts_claves k JOIN vehiculos ON k.entidad = 'vehiculo' AND k.clave = vehiculos.patente"
+    )
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    op.execute('DROP TABLE busqueda_fts_claves')
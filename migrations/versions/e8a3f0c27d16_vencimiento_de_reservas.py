@@ -0,0 +1,41 @@
+"""Columna vence_el e índice para el vencimiento de reservas
+
+Revision ID: e8a3f0c27d16
+Revises: 5d2e8b1c9f40
+Create Date: 2026-10-18 14:05:52.381907
+
+"""
+from datetime import timedelta
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e8a3f0c27d16'
+down_revision = '5d2e8b1c9f40'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('notas_de_venta', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('vence_el', sa.Date(), nullable=True))
+        batch_op.create_index('ix_notas_de_venta_estado_vence_el', ['estado', 'vence_el'], unique=False)
+
+    # Reservas existentes: vence_el = fecha_venta + dias_vigencia (ver app/reservas.py).
+    # La suma de fechas no es igual en SQLite y MySQL; las reservas son pocas, se calcula aquí.
+    conn = op.get_bind()
+    notas = sa.table('notas_de_venta', sa.column('id', sa.Integer), sa.column('estado', sa.String),
+                     sa.column('fecha_venta', sa.Date), sa.column('dias_vigencia', sa.Integer),
+                     sa.column('vence_el', sa.Date))
+    reservas = conn.execute(sa.select(notas.c.id, notas.c.fecha_venta, notas.c.dias_vigencia).where(
+        notas.c.estado == 'reservada', notas.c.dias_vigencia > 0)).all()
+    if reservas:
+        conn.execute(notas.update().where(notas.c.id == sa.bindparam('b_id')).values(vence_el=sa.bindparam('b_vence')),
+                     [{'b_id': id, 'b_vence': fecha + timedelta(days=dias)} for id, fecha, dias in reservas])
+
+
+def downgrade():
+    with op.batch_alter_table('notas_de_venta', schema=None) as batch_op:
+        batch_op.drop_index('ix_notas_de_venta_estado_vence_el')
+        batch_op.drop_column('vence_el')
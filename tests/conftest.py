@@ -0,0 +1,144 @@
+"""Fixtures de las pruebas: una aplicación por prueba sobre SQLite en memoria.
+
+    python -m pytest
+
+Las pruebas que necesitan varias conexiones a la vez (hilos) o los planes de
+ejecución de la base de producción usan la fixture `app_bd`: SQLite en un
+archivo temporal y, si se define PRUEBAS_MYSQL_URL, también MySQL.
+"""
+import os
+import threading
+from datetime import date, timedelta
+import pytest
+from config import Config
+from app import create_app, db
+from app.models import User, Cliente, Vehiculo, Pago, NotaVenta
+from app.rut import digito_verificador
+
+
+
+class ConfigPruebas(Config):
+    TESTING = True
+    WTF_CSRF_ENABLED = False
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    SQLALCHEMY_BINDS = {}
+    DATABASE_REPLICA_URL = None
+    TAREAS_SINCRONICAS = True
+    TAREAS_DB = None
+    CACHE_BACKEND = 'ninguno'
+    CACHE_DB = None
+    PDF_CACHE_ACTIVO = False
+    RESERVAS_BARRIDO_SEG = 0
+    INSTRUMENTACION = False
+
+
+def _crear_app(**config):
+    app = create_app(type('Config', (ConfigPruebas,), config))
+    with app.app_context():
+        db.create_all()
+        usuario = User(name='Vendedor', email='vendedor@automotora.cl')
+        usuario.password_hash = 'sin-clave' # las pruebas inician sesión sin pasar por el formulario
+        db.session.add(usuario)
+        db.session.commit()
+    return app
+
+
+@pytest.fixture
+def app():
+    app = _crear_app()
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture(params=['sqlite', 'mysql'])
+def app_bd(request, tmp_path):
+    """Aplicación sobre una base con conexiones reales, para pruebas con hilos o de planes.
+
+    'sqlite' usa un archivo temporal; 'mysql' necesita PRUEBAS_MYSQL_URL (una
+    base vacía: se crean y borran las tablas) y si no está se omite.
+    """
+    if request.param == 'mysql':
+        url = os.environ.get('PRUEBAS_MYSQL_URL')
+        if not url:
+            pytest.skip('defina PRUEBAS_MYSQL_URL para probar contra MySQL')
+    else:
+        url = f"sqlite:///{tmp_path / 'pruebas.db'}"
+    app = _crear_app(SQLALCHEMY_DATABASE_URI=url)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.drop_all()
+        for engine in db.engines.values():
+            engine.dispose()
+
+
+def iniciar_sesion(cliente_http, user_id=1):
+    with cliente_http.session_transaction() as sesion:
+        sesion['_user_id'] = str(user_id)
+        sesion['_fresh'] = True
+    return cliente_http
+
+
+@pytest.fixture
+def cliente(app):
+    return iniciar_sesion(app.test_client())
+
+
+def rut(i):
+    """RUT válido y normalizado número i."""
+    cuerpo = 10000000 + i
+    return f'{cuerpo}{digito_verificador(cuerpo)}'
+
+
+def sembrar(notas=0, vehiculos=None, inicio=0, estado_nota='completada', fecha=date(2026, 1, 1)):
+    """Por cada vehículo un cliente (su propietario) y por cada nota un pago.
+
+    `vehiculos` es por defecto uno por nota; `inicio` permite sembrar en tandas
+    sin repetir claves. Los vehículos impares quedan vendidos.
+    """
+    vehiculos = notas if vehiculos is None else vehiculos
+    patentes = []
+    for i in range(inicio, inicio + vehiculos):
+        db.session.add(Cliente(rut=rut(i), nombre=f'Cliente{i:04d}', apellido='Rojas', telefono='912345678',
+                               direccion='Calle 1', ciudad='Talca'))
+        patentes.append(f'AB{i:04d}')
+        db.session.add(Vehiculo(patente=patentes[-1], marca=('Toyota', 'Kia', 'Ford')[i % 3], modelo='Modelo',
+                                ano=2020, chasis_n=f'CH{i}', motor_n=f'MO{i}', valor=5000000, kilometraje=1000,
+                                tipo_adquisicion=('consignacion', 'compra_directa')[i % 2], costo_compra=1000000,
+                                propietario_rut=rut(i), estado=('disponible', 'vendido')[i % 2]))
+    db.session.flush()
+    for i in range(notas):
+        pago = Pago(metodo_pago='contado', total=6000000)
+        db.session.add(pago)
+        db.session.flush()
+        db.session.add(NotaVenta(cliente_rut=rut(inicio + i % vehiculos), vehiculo_patente=patentes[i % vehiculos],
+                                 user_id=1, pago_id=pago.id, fecha_venta=fecha + timedelta(days=i % 30),
+                                 monto_final=6000000, estado=estado_nota))
+    db.session.commit()
+    return patentes
+
+
+def vender_en_paralelo(app, intentos, fecha=date(2026, 1, 1)):
+    """Un POST a /notas-venta/crear por cada (patente, rut) de `intentos`, todos a la vez.
+
+    Devuelve la respuesta de cada intento, en el mismo orden.
+    """
+    largada = threading.Barrier(len(intentos))
+    respuestas = [None] * len(intentos)
+
+    def vendedor(i, patente, rut_cliente):
+        cliente_http = iniciar_sesion(app.test_client())
+        datos = {'cliente_rut': rut_cliente, 'vehiculo_patente': patente, 'fecha_venta': fecha.isoformat(),
+                 'monto_final': 9990000, 'metodo_pago': 'contado', 'estado': 'completada',
+                 'monto_reserva': 0, 'dias_vigencia': 0, 'observaciones': ''}
+        largada.wait()
+        respuestas[i] = cliente_http.post('/notas-venta/crear', data=datos)
+
+    hilos = [threading.Thread(target=vendedor, args=(i, *intento)) for i, intento in enumerate(intentos)]
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    return respuestas
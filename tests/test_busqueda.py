@@ -0,0 +1,69 @@
+"""El índice FTS5 sigue a clientes y vehículos, y solo se toca cuando cambia su texto."""
+import pytest
+from sqlalchemy import event, select, text
+from app import db
+from app.busqueda import TABLA_CLAVES, TABLA_FTS, filtro_clientes, filtro_vehiculos, reconstruir_indice
+from app.models import Cliente, Vehiculo
+from conftest import rut, sembrar
+
+
+@pytest.fixture
+def indice(app):
+    sembrar(vehiculos=6)
+    reconstruir_indice()
+    return app
+
+
+def vehiculos(q):
+    return set(db.session.scalars(select(Vehiculo.patente).where(filtro_vehiculos(q))))
+
+
+def clientes(q):
+    return set(db.session.scalars(select(Cliente.rut).where(filtro_clientes(q))))
+
+
+def filas_del_indice():
+    """(entidad, clave) de busqueda_fts, comprobando que cada fila tiene el rowid de su clave."""
+    filas = db.session.execute(text(
+        f'SELECT f.entidad, f.clave, k.entidad, k.clave FROM {TABLA_FTS} f LEFT JOIN {TABLA_CLAVES} k ON k.id = f.rowid'
+    )).all()
+    assert all(f[:2] == f[2:] for f in filas)
+    assert db.session.scalar(text(f'SELECT count(*) FROM {TABLA_CLAVES}')) == len(filas)
+    return sorted(f[:2] for f in filas)
+
+
+def test_editar_el_texto_reemplaza_la_fila(indice):
+    db.session.get(Vehiculo, 'AB0000').marca = 'Mazda'
+    db.session.get(Cliente, rut(1)).rut = rut(99) # la clave primaria también se puede editar
+    db.session.commit()
+
+    assert vehiculos('mazda') == {'AB0000'}
+    assert 'AB0000' not in vehiculos('toyota')
+    assert clientes(rut(99)) == {rut(99)}
+    assert clientes(rut(1)) == set()
+    assert len(filas_del_indice()) == 12
+
+
+def test_altas_y_bajas(indice, cliente):
+    assert cliente.post('/vehiculos/eliminar/AB0002').status_code == 302
+    db.session.add(Cliente(rut=rut(50), nombre='Ramona', apellido='Soto', telefono='9', direccion='C', ciudad='Talca'))
+    db.session.commit()
+
+    assert vehiculos('AB0002') == set()
+    assert clientes('ramona') == {rut(50)}
+    assert ('vehiculo', 'AB0002') not in filas_del_indice()
+    assert len(filas_del_indice()) == 12
+
+
+def test_cambiar_el_estado_no_toca_el_indice(indice):
+    sentencias = []
+    escuchar = lambda conn, cursor, sql, *args: sentencias.append(sql)
+    event.listen(db.engine, 'before_cursor_execute', escuchar)
+    try:
+        db.session.get(Vehiculo, 'AB0000').estado = 'vendido'
+        db.session.commit()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', escuchar)
+
+    assert sentencias
+    assert not [sql for sql in sentencias if TABLA_FTS in sql]
@@ -0,0 +1,39 @@
+import csv
+import io
+import pytest
+from openpyxl import load_workbook
+from app import db
+from app.models import Cliente
+from conftest import rut, sembrar
+
+PELIGROSOS = ['=HYPERLINK("http://evil","x")', '+56 9 1234', '-2+3', '@SUM(A1)', '\tTab', '\rRetorno']
+
+
+def sembrar_nombres(nombres):
+    for i, nombre in enumerate(nombres):
+        db.session.add(Cliente(rut=rut(i), nombre=nombre, apellido='Soto', telefono='9', direccion='C', ciudad='Talca'))
+    db.session.commit()
+
+
+@pytest.mark.parametrize('url', ['/notas-venta/exportar', '/clientes/exportar', '/vehiculos/exportar'])
+def test_csv_declara_el_charset_una_sola_vez(app, cliente, url):
+    sembrar(notas=2)
+    respuesta = cliente.get(url + '?formato=csv')
+    assert respuesta.headers['Content-Type'] == 'text/csv; charset=utf-8'
+    assert respuesta.get_data(as_text=True).startswith('\ufeff') # BOM para Excel
+
+
+def test_csv_antepone_un_apostrofo_a_lo_que_parece_formula(app, cliente):
+    sembrar_nombres(PELIGROSOS + ['Ana'])
+    texto = cliente.get('/clientes/exportar?formato=csv').get_data(as_text=True).removeprefix('\ufeff')
+    nombres = [fila[1] for fila in csv.reader(io.StringIO(texto, newline=''), delimiter=';')][1:]
+    assert sorted(nombres) == sorted(["'" + n for n in PELIGROSOS] + ['Ana'])
+
+
+def test_xlsx_guarda_lo_que_parece_formula_como_texto(app, cliente):
+    sembrar_nombres(PELIGROSOS + ['Ana'])
+    hoja = load_workbook(io.BytesIO(cliente.get('/clientes/exportar?formato=xlsx').data)).active
+    celdas = [fila[1] for fila in hoja.iter_rows(min_row=2)]
+    assert {c.data_type for c in celdas} == {'s'}
+    # El XML de la planilla normaliza \r a \n
+    assert sorted(c.value for c in celdas) == sorted(n.replace('\r', '\n') for n in PELIGROSOS + ['Ana'])
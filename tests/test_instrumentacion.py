@@ -0,0 +1,16 @@
+from conftest import _crear_app
+
+REMOTO = {'REMOTE_ADDR': '10.0.0.5'}
+
+
+def test_metricas_con_token_exige_el_token():
+    cliente = _crear_app(INSTRUMENTACION=True, INSTRUMENTACION_TOKEN='secreto').test_client()
+    assert cliente.get('/metricas', environ_base=REMOTO).status_code == 403
+    assert cliente.get('/metricas?token=otro', environ_base=REMOTO).status_code == 403
+    assert cliente.get('/metricas', headers={'Authorization': 'Bearer secreto'}, environ_base=REMOTO).status_code == 200
+
+
+def test_metricas_sin_token_solo_responde_a_la_maquina_local():
+    cliente = _crear_app(INSTRUMENTACION=True, INSTRUMENTACION_TOKEN=None).test_client()
+    assert cliente.get('/metricas', environ_base=REMOTO).status_code == 403
+    assert cliente.get('/metricas', environ_base={'REMOTE_ADDR': '127.0.0.1'}).status_code == 200
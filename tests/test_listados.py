@@ -0,0 +1,34 @@
+"""Los listados cargan sus relaciones con la misma página: sin consultas por fila."""
+import pytest
+from sqlalchemy import event
+from app import db
+from conftest import sembrar
+
+
+def contar_sentencias(cliente, url):
+    sentencias = []
+    escuchar = lambda conn, cursor, sql, *args: sentencias.append(sql)
+    event.listen(db.engine, 'before_cursor_execute', escuchar)
+    try:
+        respuesta = cliente.get(url)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', escuchar)
+    assert respuesta.status_code == 200
+    return len(sentencias)
+
+
+@pytest.mark.parametrize('url', [
+    '/notas-venta?per_page=50',
+    '/notas-venta?per_page=50&cursor=',
+    '/vehiculos',
+    '/vehiculos/vendidos',
+    '/clientes',
+])
+def test_sentencias_por_pagina_no_crecen_con_las_filas(app, cliente, url):
+    conteos = []
+    sembradas = 0
+    for total in (3, 20, 60):
+        sembrar(total - sembradas, inicio=sembradas)
+        sembradas = total
+        conteos.append(contar_sentencias(cliente, url))
+    assert conteos[0] == conteos[1] == conteos[2], conteos
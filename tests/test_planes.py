@@ -0,0 +1,194 @@
+"""Planes de ejecución de las consultas frecuentes.
+
+Se piden las páginas como lo hace el navegador, se capturan los SELECT que
+emiten y se les hace EXPLAIN: ninguno debe recorrer una tabla completa ni
+ordenar en una tabla temporal. Así se audita exactamente lo que ejecutan las
+rutas (paginate() con OFFSET y su count(*), el modo cursor, las búsquedas).
+Los formularios que guardan se auditan igual, con todas sus sentencias (las
+escrituras de los eventos de sesión incluidas).
+"""
+from datetime import date, datetime
+import pytest
+from sqlalchemy import event
+from app import db
+from app.busqueda import reconstruir_indice
+from app.eventos import consulta_transiciones
+from app.paginacion import codificar_cursor
+from app.reservas import consulta_vencidas
+from conftest import iniciar_sesion, rut, sembrar
+
+SENTENCIAS_DE_DATOS = ('SELECT', 'INSERT', 'UPDATE', 'DELETE')
+
+# Recorridos completos que se aceptan, por la forma de la sentencia:
+# - una página de notas (ORDER BY id DESC ... LIMIT) recorre la tabla en orden
+#   de rowid y corta al llenar la página: no hay índice mejor para ese orden;
+# - la carga del autocompletado lee todos los clientes una vez por proceso y
+#   luego cada AUTOCOMPLETAR_REFRESCO_SEG (ver app/autocompletar.py);
+# - cargar_referencias (app/consultas.py) parte de una subconsulta de una fila
+#   literal y le une cada referencia por su clave.
+PERMITIDOS = [
+    (lambda sql: 'ORDER BY notas_de_venta.id DESC' in sql and 'LIMIT' in sql, 'SCAN notas_de_venta'),
+    (lambda sql: sql.startswith('SELECT clientes.rut, clientes.nombre, clientes.apellido \nFROM clientes'),
+     'SCAN clientes'),
+    (lambda sql: 'FROM (SELECT ? AS uno) AS anon_1' in sql, 'SCAN anon_1'),
+]
+
+
+def _permitido(sql, problema):
+    return any(problema == permitido and aplica(sql) for aplica, permitido in PERMITIDOS)
+
+
+URLS = [
+    '/',
+    '/api/dashboard/inventario',
+    '/api/dashboard/ventas?fecha_inicio=2026-01-01&fecha_fin=2026-01-31',
+    '/api/autocompletar/clientes?q=100',
+    '/api/autocompletar/vehiculos?q=AB',
+    '/notas-venta',
+    '/notas-venta?page=2',
+    f"/notas-venta?cursor={codificar_cursor([30])}",
+    f"/notas-venta?q={rut(3)}&search_field=cliente",
+    '/notas-venta?q=AB0003&search_field=vehiculo',
+    '/notas-venta?q=completada&search_field=estado',
+    '/clientes',
+    '/clientes?page=2',
+    f"/clientes?cursor={codificar_cursor(['Cliente', rut(5)])}",
+    '/vehiculos',
+    '/vehiculos?page=2',
+    '/vehiculos?q=toyota',
+    f"/vehiculos?cursor={codificar_cursor(['Kia', 'AB0004'])}",
+    '/vehiculos/vendidos',
+    '/vehiculos/vendidos?page=2',
+    '/vehiculos/vendidos?search=kia',
+    f"/vehiculos/vendidos?cursor={codificar_cursor([datetime(2030, 1, 1), 'AB0009'])}",
+    '/vehiculos/historial/AB0003',
+    f"/api/vehiculos/AB0003/historial?cursor={codificar_cursor([datetime(2030, 1, 1), 1000])}",
+]
+
+
+def _explain(conn, prefijo, sql, parametros):
+    return conn.exec_driver_sql(prefijo + sql, parametros)
+
+
+def _problemas_sqlite(conn, sql, parametros):
+    problemas = []
+    for fila in _explain(conn, 'EXPLAIN QUERY PLAN ', sql, parametros):
+        detalle = fila[-1]
+        # "SCAN t USING [COVERING] INDEX" recorre un índice en orden (corta con LIMIT);
+        # "SCAN t" a secas es un recorrido completo de la tabla. En FTS5, "VIRTUAL
+        # TABLE INDEX 0:M..." es un MATCH y "0:=" una fila por rowid; sin ninguno
+        # de los dos ("0:") recorre el índice completo. "CONSTANT ROW" no es una tabla.
+        if 'CONSTANT ROW' in detalle:
+            continue
+        if detalle.startswith('SCAN ') and 'VIRTUAL TABLE INDEX' in detalle:
+            restricciones = detalle.rsplit(':', 1)[-1]
+            if 'M' not in restricciones and '=' not in restricciones:
+                problemas.append(detalle)
+        elif detalle.startswith('SCAN ') and 'INDEX' not in detalle:
+            problemas.append(detalle)
+        if 'USE TEMP B-TREE' in detalle:
+            problemas.append(detalle)
+    return problemas
+
+
+def _problemas_mysql(conn, sql, parametros):
+    problemas = []
+    for fila in _explain(conn, 'EXPLAIN ', sql, parametros).mappings():
+        if fila['type'] == 'ALL':
+            problemas.append(f"SCAN {fila['table']}")
+        if 'filesort' in (fila['Extra'] or ''):
+            problemas.append(f"filesort en {fila['table']}")
+    return problemas
+
+
+def _auditar(sentencias):
+    """[(sql, problemas)] de las sentencias (sql, parámetros) con algún problema."""
+    engine = db.engine
+    revisar = _problemas_mysql if engine.dialect.name == 'mysql' else _problemas_sqlite
+    with engine.connect() as conn:
+        resultado = [(sql, revisar(conn, sql, parametros)) for sql, parametros in sentencias]
+    return [(sql, problemas) for sql, problemas in resultado if problemas]
+
+
+def _capturar(cliente, url, datos=None):
+    """Las sentencias de un GET (solo SELECT) o, con `datos`, de un POST (todas)."""
+    sentencias = []
+    tipos = SENTENCIAS_DE_DATOS if datos is not None else ('SELECT',)
+
+    def capturar(conn, cursor, sql, parametros, contexto, varias):
+        if sql.lstrip().upper().startswith(tipos):
+            sentencias.append((sql, parametros[0] if varias else parametros))
+
+    event.listen(db.engine, 'before_cursor_execute', capturar)
+    try:
+        if datos is None:
+            assert cliente.get(url).status_code == 200
+        else:
+            assert cliente.post(url, data=datos).status_code == 302
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capturar)
+    return sentencias
+
+
+def _compilar(sentencia):
+    """(sql, parámetros) de una sentencia que no pasa por una ruta, como los emitiría el driver."""
+    dialecto = db.engine.dialect
+    compilada = sentencia.compile(dialect=dialecto, compile_kwargs={'render_postcompile': True})
+    parametros = compilada.construct_params()
+    if compilada.positional:
+        parametros = tuple(parametros[nombre] for nombre in compilada.positiontup)
+    return str(compilada), parametros
+
+
+@pytest.fixture
+def base_sembrada(app_bd):
+    sembrar(notas=40, vehiculos=80)
+    reconstruir_indice() # la tabla FTS5 la crea la migración, no create_all()
+    if db.engine.dialect.name == 'sqlite':
+        db.session.execute(db.text('ANALYZE'))
+    else:
+        db.session.execute(db.text('ANALYZE TABLE notas_de_venta, vehiculos, clientes, registro_historial'))
+    db.session.commit()
+    return app_bd
+
+
+@pytest.mark.parametrize('url', URLS)
+def test_las_rutas_no_recorren_tablas_completas(base_sembrada, url):
+    cliente = iniciar_sesion(base_sembrada.test_client())
+    sentencias = _capturar(cliente, url)
+    assert sentencias
+    problemas = [(sql, [p for p in lista if not _permitido(sql, p)]) for sql, lista in _auditar(sentencias)]
+    assert [(sql, lista) for sql, lista in problemas if lista] == []
+
+
+def _vehiculo(patente, **cambios):
+    return dict({'patente': patente, 'tipo_adquisicion': 'compra_directa', 'costo_compra': 1000000,
+                 'propietario_rut': '', 'kilometraje': 1000, 'precio_acordado': 0, 'marca': 'Toyota',
+                 'modelo': 'Modelo', 'ano': 2020, 'color': '', 'chasis_n': f'CH-{patente}',
+                 'motor_n': f'MO-{patente}', 'valor': 5000000, 'descripcion': ''}, **cambios)
+
+
+FORMULARIOS = [
+    ('/notas-venta/crear', {'cliente_rut': rut(0), 'vehiculo_patente': 'AB0002', 'fecha_venta': '2026-01-03',
+                            'monto_final': 5000000, 'metodo_pago': 'contado', 'estado': 'completada'}),
+    ('/vehiculos/crear', _vehiculo('ZZ0001')),
+    ('/vehiculos/editar/AB0004', _vehiculo('AB0004', marca='Mazda', chasis_n='CH4', motor_n='MO4')),
+    ('/vehiculos/editar/AB0006', _vehiculo('ZZ0006', chasis_n='CH6', motor_n='MO6')), # cambia la patente
+]
+
+
+@pytest.mark.parametrize('url, datos', FORMULARIOS, ids=[url for url, _ in FORMULARIOS])
+def test_los_formularios_no_recorren_tablas_completas(base_sembrada, url, datos):
+    cliente = iniciar_sesion(base_sembrada.test_client())
+    sentencias = _capturar(cliente, url, datos)
+    assert sentencias
+    problemas = [(sql, [p for p in lista if not _permitido(sql, p)]) for sql, lista in _auditar(sentencias)]
+    assert [(sql, lista) for sql, lista in problemas if lista] == []
+
+
+@pytest.mark.parametrize('sentencia', [
+    lambda: consulta_vencidas(date(2026, 1, 1)),
+    lambda: consulta_transiciones('AB0003'),
+], ids=['reservas vencidas', 'transiciones de un vehículo'])
+def test_las_consultas_de_tareas_no_recorren_tablas_completas(base_sembrada, sentencia):
+    assert _auditar([_compilar(sentencia())]) == []
@@ -0,0 +1,47 @@
+from datetime import date
+from app import db
+from app.eventos import CAMBIO_NOTA, REPUBLICADO
+from app.models import NotaVenta, RegistroHistorial, Vehiculo
+from app.reservas import _anular_lote, consulta_vencidas, vencer_reservas
+from conftest import sembrar
+
+HOY = date(2026, 3, 1)
+
+
+def _sembrar_reservas(n):
+    patentes = sembrar(notas=n, estado_nota='reservada')
+    for nota in NotaVenta.query:
+        nota.dias_vigencia = 5
+    Vehiculo.query.update({'estado': 'reservado'})
+    db.session.commit()
+    return patentes
+
+
+def _eventos(codigo):
+    return RegistroHistorial.query.filter_by(codigo=codigo).count()
+
+
+def test_un_lote_ya_anulado_por_otro_barrido_no_se_anula_dos_veces(app):
+    patentes = _sembrar_reservas(6)
+    lote = db.session.execute(consulta_vencidas(HOY)).all()
+    versiones = dict(db.session.execute(db.select(NotaVenta.id, NotaVenta.version)).all())
+    db.session.commit()
+
+    assert vencer_reservas(HOY) == {'notas': 6, 'vehiculos': 6, 'lotes': 1}
+    assert _anular_lote(lote) == (0, 0)
+
+    assert _eventos(CAMBIO_NOTA) == 6
+    assert _eventos(REPUBLICADO) == 6
+    assert dict(db.session.execute(db.select(NotaVenta.id, NotaVenta.version).where(NotaVenta.estado == 'anulada'))
+                .all()) == {id: version + 1 for id, version in versiones.items()}
+    assert Vehiculo.query.filter(Vehiculo.patente.in_(patentes), Vehiculo.estado == 'disponible').count() == 6
+
+
+def test_un_lote_en_parte_anulado_solo_cuenta_las_que_quedaban(app):
+    _sembrar_reservas(6)
+    lote = db.session.execute(consulta_vencidas(HOY)).all()
+    db.session.commit()
+
+    assert _anular_lote(lote[:2]) == (2, 2)
+    assert _anular_lote(lote) == (4, 4)
+    assert _eventos(CAMBIO_NOTA) == 6
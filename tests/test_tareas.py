@@ -0,0 +1,46 @@
+import time
+import pytest
+from app.models import NotaVenta
+from app.tareas import MANEJADORES, tarea, _Tarea
+from conftest import _crear_app, rut, sembrar
+
+
+@pytest.fixture
+def cola_en_archivo(tmp_path):
+    app = _crear_app(TAREAS_SINCRONICAS=False, TAREAS_DB=str(tmp_path / 'tareas.db'), TAREAS_MAX_INTENTOS=1)
+    yield app.extensions['tareas']
+    MANEJADORES.pop('prueba_lote', None)
+
+
+def test_un_lote_con_resultados_de_menos_falla_completo(cola_en_archivo):
+    @tarea('prueba_lote', lote=True)
+    def _incompleto(lista):
+        return [None] # una sola respuesta para todo el lote
+
+    for i in range(3):
+        assert cola_en_archivo.almacen.poner(_Tarea(None, 'prueba_lote', {'i': i}, 0, time.time()))
+    lote = cola_en_archivo.almacen.tomar(10, 0)
+    assert len(lote) == 3
+
+    cola_en_archivo._ejecutar(lote)
+
+    # Ninguna queda tomada: con un solo intento, las tres se descartan
+    assert cola_en_archivo.almacen.pendientes() == 0
+    assert cola_en_archivo.almacen.fallidas() == 3
+
+
+def test_una_tarea_sincronica_que_falla_no_deshace_la_venta(app, cliente, monkeypatch):
+    def _falla(datos):
+        raise RuntimeError('sin espacio para el PDF')
+
+    monkeypatch.setitem(MANEJADORES, 'pdf_nota_venta', (_falla, False))
+    patente = sembrar(vehiculos=1)[0]
+    datos = {'cliente_rut': rut(0), 'vehiculo_patente': patente, 'fecha_venta': '2026-01-03',
+             'monto_final': 5000000, 'metodo_pago': 'contado', 'estado': 'completada'}
+
+    respuesta = cliente.post('/notas-venta/crear', data=datos, follow_redirects=True)
+
+    assert respuesta.request.path == '/notas-venta'
+    assert 'Nota de venta creada exitosamente.' in respuesta.get_data(as_text=True)
+    assert NotaVenta.query.filter_by(vehiculo_patente=patente).count() == 1
+    assert app.extensions['tareas'].contadores['fallidas'] == 1
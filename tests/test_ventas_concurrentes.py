@@ -0,0 +1,38 @@
+"""Ventas simultáneas del mismo vehículo: solo una puede quedarse con él."""
+from sqlalchemy import func, select
+from app import db
+from app.forms import NotaVentaForm
+from app.models import NotaVenta, Vehiculo
+from app.routes import _validar_para_escribir
+from conftest import rut, sembrar, vender_en_paralelo
+
+VENDEDORES_POR_VEHICULO = 4
+
+
+def test_cada_vehiculo_se_vende_una_sola_vez(app_bd):
+    disponibles = sembrar(vehiculos=12)[::2]
+    intentos = [(patente, rut(i)) for patente in disponibles for i in range(VENDEDORES_POR_VEHICULO)]
+
+    respuestas = vender_en_paralelo(app_bd, intentos)
+
+    # Con el bloqueo tomado antes de validar, los demás ven el vehículo ya vendido
+    # (no llegan a chocar con la versión al guardar)
+    rechazadas = [r for r in respuestas if r.status_code != 302]
+    assert len(rechazadas) == len(intentos) - len(disponibles)
+    assert all('Este vehículo ya está reservado o vendido.' in r.get_data(as_text=True) for r in rechazadas)
+    db.session.expire_all()
+    ventas = dict(db.session.execute(select(NotaVenta.vehiculo_patente, func.count()).group_by(NotaVenta.vehiculo_patente)).all())
+    assert ventas == dict.fromkeys(disponibles, 1)
+    assert db.session.scalar(select(func.count()).select_from(Vehiculo).where(
+        Vehiculo.patente.in_(disponibles), Vehiculo.estado != 'vendido')) == 0
+
+
+def test_un_formulario_invalido_no_retiene_la_transaccion(app_bd):
+    vendido = sembrar(vehiculos=2)[1]
+    datos = {'cliente_rut': rut(0), 'vehiculo_patente': vendido, 'fecha_venta': '2026-01-03',
+             'monto_final': 5000000, 'metodo_pago': 'contado', 'estado': 'completada'}
+    with app_bd.test_request_context('/notas-venta/crear', method='POST', data=datos):
+        form = NotaVentaForm()
+        assert not _validar_para_escribir(form)
+        assert form.vehiculo_patente.errors
+        assert not db.session().in_transaction()
@@ -0,0 +1,51 @@
+"""El resumen ventas_diarias se mantiene igual a reconstruirlo desde las notas."""
+from datetime import date
+from sqlalchemy import select
+from app import db
+from app.models import NotaVenta, Vehiculo, VentaDiaria
+from app.reportes import reconstruir_ventas_diarias
+from conftest import rut, sembrar, vender_en_paralelo
+
+
+def resumen():
+    db.session.expire_all()
+    return sorted((v.fecha, v.tipo_adquisicion, v.marca, v.cantidad, v.monto_total, round(v.ingreso_real, 2))
+                  for v in db.session.scalars(select(VentaDiaria)))
+
+
+def datos_nota(patente, **cambios):
+    return dict({'cliente_rut': rut(0), 'vehiculo_patente': patente, 'fecha_venta': '2026-01-03',
+                 'monto_final': 5000000, 'metodo_pago': 'contado', 'estado': 'completada',
+                 'monto_reserva': 0, 'dias_vigencia': 0, 'observaciones': ''}, **cambios)
+
+
+def test_crear_editar_y_eliminar_notas_mantienen_el_resumen(app, cliente):
+    patentes = sembrar(notas=6, vehiculos=12)
+    reconstruir_ventas_diarias()
+
+    libre = patentes[6]
+    assert cliente.post('/notas-venta/crear', data=datos_nota(libre)).status_code == 302
+    nota = db.session.scalar(select(NotaVenta).where(NotaVenta.vehiculo_patente == libre))
+    assert cliente.post(f'/notas-venta/editar/{nota.id}', data=datos_nota(
+        libre, monto_final=7000000, fecha_venta='2026-01-05', version=nota.version)).status_code == 302
+    assert cliente.post('/notas-venta/eliminar/1').status_code == 302
+
+    vehiculo = db.session.get(Vehiculo, patentes[1])
+    formulario = {c.name: getattr(vehiculo, c.name) or '' for c in Vehiculo.__table__.columns}
+    formulario.update(marca='Mazda', costo_compra=123, kilometraje=10)
+    assert cliente.post(f'/vehiculos/editar/{vehiculo.patente}', data=formulario).status_code == 302
+
+    incremental = resumen()
+    reconstruir_ventas_diarias()
+    assert incremental == resumen()
+
+
+def test_ventas_simultaneas_del_mismo_dia_y_marca_cuentan_todas(app_bd):
+    # Cada 6 vehículos se repiten marca y tipo: todas las ventas caen en la misma fila del resumen
+    patentes = sembrar(vehiculos=48)[::6]
+    respuestas = vender_en_paralelo(app_bd, [(p, rut(0)) for p in patentes], fecha=date(2026, 2, 1))
+    assert [r.status_code for r in respuestas] == [302] * len(patentes)
+
+    fila = db.session.get(VentaDiaria, (date(2026, 2, 1), 'consignacion', 'Toyota'))
+    assert fila.cantidad == len(patentes)
+    assert fila.monto_total == 9990000 * len(patentes)